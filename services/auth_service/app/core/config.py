@@ -14,17 +14,73 @@ class Settings(BaseSettings):
     POSTGRES_PASSWORD: str = Field(default="postgres")
     POSTGRES_DB: str = Field(default="auth")
     SQLALCHEMY_DATABASE_URI: Optional[str] = Field(default=None)
+    # Connections per worker process; size for the worker's concurrent requests
+    DB_POOL_SIZE: int = Field(default=20)
+    DB_MAX_OVERFLOW: int = Field(default=10)
+    DB_POOL_TIMEOUT: int = Field(default=10)
+    DB_POOL_RECYCLE: int = Field(default=1800)
+    # Table creation on startup: "always", "auto" (only when the models
+    # changed since the last run) or "never" (schema managed by migrations)
+    DB_CREATE_SCHEMA: str = Field(default="auto", pattern="^(always|auto|never)$")
 
     # Redis
     REDIS_URL: str = Field(default="redis://redis:6379")
     REDIS_PASSWORD: Optional[str] = Field(default=None)
 
     # JWT
+    # Access tokens are signed with the private keys in JWT_KEYS_DIR so other
+    # services can verify them from the JWKS. Refresh tokens are only ever
+    # verified here and stay HMAC-signed with REFRESH_SECRET_KEY.
+    JWT_KEYS_DIR: Optional[str] = Field(default=None)
+    JWT_KEY_ALGORITHM: str = Field(default="RS256")
+    JWT_KEY_ACTIVATION_DELAY: int = Field(default=300)
+    JWT_KEY_RELOAD_INTERVAL: int = Field(default=60)
+    # Development only: without key files, sign with a key generated in memory
+    # instead of failing at startup. Each process gets its own key.
+    JWT_EPHEMERAL_KEY: bool = Field(default=False)
+    JWKS_MAX_AGE: int = Field(default=300)
     SECRET_KEY: str = Field(default="secret-key-change-in-production")
     REFRESH_SECRET_KEY: str = Field(default="refresh-secret-key-change-in-production")
     ALGORITHM: str = Field(default="HS256")
     ACCESS_TOKEN_EXPIRE_MINUTES: int = Field(default=30)
     REFRESH_TOKEN_EXPIRE_DAYS: int = Field(default=7)
+    TOKEN_CACHE_SIZE: int = Field(default=10000)
+    # Shared key gateways send to /auth/introspect; unset disables the endpoint
+    INTROSPECTION_KEY: Optional[str] = Field(default=None)
+    INTROSPECTION_MAX_TOKENS: int = Field(default=100)
+    # Bloom filter of revoked sessions and users checked on every request
+    REVOCATION_FILTER_CAPACITY: int = Field(default=100000)
+    REVOCATION_FILTER_ERROR_RATE: float = Field(default=0.001)
+    REVOCATION_FILTER_REBUILD_INTERVAL: int = Field(default=60)
+
+    # User lookup cache: in-process TTL, then Redis (0 disables the Redis tier)
+    USER_CACHE_SIZE: int = Field(default=10000)
+    USER_CACHE_TTL: int = Field(default=30)
+    USER_CACHE_REDIS_TTL: int = Field(default=300)
+
+    # Password hashing. Raising BCRYPT_ROUNDS upgrades stored hashes on login.
+    BCRYPT_ROUNDS: int = Field(default=12)
+    # Hashing threads per worker process, 0 for one per CPU
+    PASSWORD_HASH_WORKERS: int = Field(default=0)
+    PASSWORD_HASH_MAX_PENDING: int = Field(default=64)
+
+    # Failed-login throttling. After the free attempts each failure doubles
+    # the lockout, from LOGIN_LOCKOUT_BASE up to LOGIN_LOCKOUT_MAX seconds.
+    LOGIN_ACCOUNT_ATTEMPTS: int = Field(default=5)
+    LOGIN_IP_ATTEMPTS: int = Field(default=20)
+    LOGIN_LOCKOUT_BASE: float = Field(default=1.0)
+    LOGIN_LOCKOUT_MAX: float = Field(default=900.0)
+    LOGIN_FAILURE_WINDOW: int = Field(default=900)
+
+    # Bulk user import: rows per insert batch, hashing threads (0 for one per
+    # CPU) kept apart from the pool that serves logins
+    IMPORT_BATCH_SIZE: int = Field(default=1000)
+    IMPORT_HASH_WORKERS: int = Field(default=0)
+
+    # Event outbox relay
+    OUTBOX_BATCH_SIZE: int = Field(default=100)
+    OUTBOX_POLL_INTERVAL: float = Field(default=1.0)
+    OUTBOX_MAX_BACKOFF: float = Field(default=30.0)
 
     # Admin
     FIRST_ADMIN_EMAIL: str = Field(default="admin@example.com")
@@ -41,7 +97,7 @@ class Settings(BaseSettings):
     def __init__(self, **values):
         super().__init__(**values)
         self.SQLALCHEMY_DATABASE_URI = (
-            f"postgresql://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
+            f"postgresql+asyncpg://{self.POSTGRES_USER}:{self.POSTGRES_PASSWORD}"
             f"@{self.POSTGRES_SERVER}/{self.POSTGRES_DB}"
         )
 
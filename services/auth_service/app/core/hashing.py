@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+# Hashes with fewer rounds than configured are "deprecated" and get upgraded by
+# verify_and_update on the next successful login
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+
+class PasswordHasher:
+    """Runs password hashing on a bounded thread pool, off the event loop.
+
+    The bcrypt backend releases the GIL while hashing, so the loop keeps
+    serving requests and hashes run in parallel up to ``workers``. Once
+    ``max_pending`` operations are queued or running, further ones are
+    rejected with 503 instead of queueing without bound. With ``wait`` they
+    wait for a slot instead, for batch jobs that would rather go slower than
+    fail halfway.
+    """
+
+    def __init__(
+        self,
+        context: CryptContext,
+        workers: int = 4,
+        max_pending: int = 64,
+        wait: bool = False,
+    ):
+        self.context = context
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = asyncio.Semaphore(max_pending) if wait else None
+        self.pending = 0
+        self.rejected = 0
+        self.completed = {"hash": 0, "verify": 0}
+        self.seconds = {"hash": 0.0, "verify": 0.0}
+        self.wait_seconds = 0.0
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hash"
+        )
+
+    async def _run(self, operation: str, func, *args):
+        if self._slots is not None:
+            async with self._slots:
+                return await self._submit(operation, func, *args)
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many concurrent password operations",
+                headers={"Retry-After": "1"},
+            )
+        return await self._submit(operation, func, *args)
+
+    async def _submit(self, operation: str, func, *args):
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            result = func(*args)
+            return result, started - submitted, time.perf_counter() - started
+
+        self.pending += 1
+        try:
+            result, waited, took = await asyncio.get_running_loop().run_in_executor(
+                self._executor, timed
+            )
+        finally:
+            self.pending -= 1
+        self.completed[operation] += 1
+        self.seconds[operation] += took
+        self.wait_seconds += waited
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run("hash", self.context.hash, password)
+
+    async def verify_and_update(
+        self, password: str, hashed_password: str
+    ) -> Tuple[bool, Optional[str]]:
+        """Check ``password``; also returns a new hash if the stored one is outdated."""
+        return await self._run(
+            "verify", self.context.verify_and_update, password, hashed_password
+        )
+
+    @property
+    def queued(self) -> int:
+        return max(self.pending - self.workers, 0)
+
+
+def register_metrics(hasher: PasswordHasher):
+    metrics.register(
+        "auth_password_hash_queue_depth",
+        "Password operations waiting for a hashing thread",
+        lambda: {"": hasher.queued},
+    )
+    metrics.register(
+        "auth_password_hash_in_flight",
+        "Password operations running on hashing threads",
+        lambda: {"": hasher.pending - hasher.queued},
+    )
+    metrics.register(
+        "auth_password_hash_operations_total",
+        "Completed password operations",
+        lambda: {f'operation="{op}"': n for op, n in hasher.completed.items()},
+        kind="counter",
+    )
+    metrics.register(
+        "auth_password_hash_seconds_total",
+        "Time spent hashing on the pool",
+        lambda: {f'operation="{op}"': s for op, s in hasher.seconds.items()},
+        kind="counter",
+    )
+    metrics.register(
+        "auth_password_hash_wait_seconds_total",
+        "Time password operations spent queued for a thread",
+        lambda: {"": hasher.wait_seconds},
+        kind="counter",
+    )
+    metrics.register(
+        "auth_password_hash_rejected_total",
+        "Password operations rejected because the queue was full",
+        lambda: {"": hasher.rejected},
+        kind="counter",
+    )
+
+
+password_hasher = PasswordHasher(
+    pwd_context,
+    workers=settings.PASSWORD_HASH_WORKERS or os.cpu_count() or 1,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
+register_metrics(password_hasher)
@@ -0,0 +1,192 @@
+"""Asymmetric signing keys for access tokens and their published JWKS.
+
+Keys are PEM files in ``JWT_KEYS_DIR`` named ``<kid>.pem``. Generate a new one
+with::
+
+    python -m app.core.keys generate /path/to/keys
+
+A new key is published in the JWKS straight away but only used for signing
+once it is ``JWT_KEY_ACTIVATION_DELAY`` seconds old, so verifiers holding a
+cached JWKS learn about it before the first token signed with it arrives.
+Delete a retired key file once the last token it signed has expired.
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, NamedTuple, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+from jose import jwk
+
+logger = logging.getLogger(__name__)
+
+ALGORITHMS = ("RS256", "ES256")
+
+
+class SigningKey(NamedTuple):
+    kid: str
+    algorithm: str
+    private_pem: str
+    public_jwk: dict
+    created_at: float
+
+
+def generate_private_pem(algorithm: str = "RS256") -> bytes:
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm == "ES256":
+        key = ec.generate_private_key(ec.SECP256R1())
+    else:
+        raise ValueError(f"Unsupported signing algorithm {algorithm!r}")
+    return key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+
+
+def load_signing_key(kid: str, pem: str, created_at: float) -> SigningKey:
+    private_key = serialization.load_pem_private_key(pem.encode(), password=None)
+    algorithm = "RS256" if isinstance(private_key, rsa.RSAPrivateKey) else "ES256"
+    public_jwk = jwk.construct(pem, algorithm).public_key().to_dict()
+    public_jwk.update({"kid": kid, "use": "sig"})
+    return SigningKey(kid, algorithm, pem, public_jwk, created_at)
+
+
+class KeyRing:
+    """Signing keys loaded from ``keys_dir``, reloaded when the directory changes.
+
+    Loading fails without any key files, unless ``ephemeral`` allows a key
+    generated in memory instead. Tokens signed with it stop verifying on
+    restart and in every other process, so that is only meant for
+    development. A ``lazy`` ring reads its keys on first use instead of on
+    construction.
+    """
+
+    def __init__(
+        self,
+        keys_dir: Optional[str] = None,
+        algorithm: str = "RS256",
+        activation_delay: float = 300,
+        reload_interval: float = 60,
+        lazy: bool = False,
+        ephemeral: bool = False,
+    ):
+        self.keys_dir = keys_dir
+        self.algorithm = algorithm
+        self.activation_delay = activation_delay
+        self.reload_interval = reload_interval
+        self.ephemeral = ephemeral
+        self.keys: Dict[str, SigningKey] = {}
+        self.jwks = b'{"keys": []}'
+        self.etag = ""
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._checked_at = 0.0
+        if not lazy:
+            self.reload()
+
+    def _scan(self) -> Dict[str, float]:
+        if not self.keys_dir or not os.path.isdir(self.keys_dir):
+            return {}
+        return {
+            name[:-4]: os.path.getmtime(os.path.join(self.keys_dir, name))
+            for name in os.listdir(self.keys_dir)
+            if name.endswith(".pem")
+        }
+
+    def reload(self, force: bool = False) -> bool:
+        """Re-read the keys directory if it changed. Returns True if it did."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            files = self._scan()
+            fingerprint = tuple(sorted(files.items()))
+            if fingerprint == self._fingerprint and not force:
+                return False
+
+            keys = {}
+            for kid, mtime in files.items():
+                path = os.path.join(self.keys_dir, f"{kid}.pem")
+                try:
+                    with open(path) as f:
+                        keys[kid] = load_signing_key(kid, f.read(), mtime)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Skipping signing key {path}: {e}")
+            if not keys:
+                keys = self.keys or self._ephemeral()
+
+            self._fingerprint = fingerprint
+            self.keys = keys
+            self.jwks = json.dumps(
+                {"keys": [key.public_jwk for key in keys.values()]}
+            ).encode()
+            self.etag = '"%s"' % hashlib.sha256(self.jwks).hexdigest()[:16]
+        logger.info(f"Loaded signing keys: {', '.join(sorted(keys))}")
+        return True
+
+    def _ephemeral(self) -> Dict[str, SigningKey]:
+        if not self.ephemeral:
+            raise RuntimeError(
+                f"No signing keys in JWT_KEYS_DIR ({self.keys_dir}); add one with "
+                "`python -m app.core.keys generate`, or set JWT_EPHEMERAL_KEY "
+                "for development"
+            )
+        logger.warning(
+            "JWT_KEYS_DIR has no signing keys; using an in-memory key that "
+            "will not survive a restart"
+        )
+        kid = uuid.uuid4().hex[:16]
+        pem = generate_private_pem(self.algorithm).decode()
+        # Backdated so it is active immediately
+        return {kid: load_signing_key(kid, pem, 0.0)}
+
+    def reload_if_due(self):
+        if (
+            self._fingerprint is None
+            or time.monotonic() - self._checked_at >= self.reload_interval
+        ):
+            self.reload()
+
+    def signing_key(self) -> SigningKey:
+        """The newest key old enough to be active, else the oldest key."""
+        self.reload_if_due()
+        keys = sorted(self.keys.values(), key=lambda key: (key.created_at, key.kid))
+        cutoff = time.time() - self.activation_delay
+        active = [key for key in keys if key.created_at <= cutoff]
+        return active[-1] if active else keys[0]
+
+    def public_key(self, kid: Optional[str]) -> Optional[SigningKey]:
+        # kid comes from an unverified header and can be any JSON value
+        if not isinstance(kid, str):
+            return None
+        self.reload_if_due()
+        return self.keys.get(kid)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage JWT signing keys")
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate = commands.add_parser("generate", help="Add a new signing key")
+    generate.add_argument("keys_dir")
+    generate.add_argument("--algorithm", choices=ALGORITHMS, default="RS256")
+    args = parser.parse_args()
+
+    os.makedirs(args.keys_dir, exist_ok=True)
+    kid = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    path = os.path.join(args.keys_dir, f"{kid}.pem")
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(generate_private_pem(args.algorithm))
+    print(f"Wrote {path}")
+
+
+if __name__ == "__main__":
+    main()
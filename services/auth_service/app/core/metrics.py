@@ -0,0 +1,27 @@
+from typing import Callable, Dict, List
+
+# Name -> (help text, type, callable returning {label string: value})
+_collectors: Dict[str, tuple] = {}
+
+
+def register(
+    name: str, help_text: str, collect: Callable[[], Dict[str, float]], kind="gauge"
+):
+    """Expose ``collect()`` on ``/metrics`` as the metric ``name``.
+
+    ``collect`` returns a mapping of Prometheus label strings (``""`` for an
+    unlabelled sample) to values, and is called on every scrape.
+    """
+    _collectors[name] = (help_text, kind, collect)
+
+
+def render() -> str:
+    """All registered metrics in Prometheus text exposition format."""
+    lines: List[str] = []
+    for name, (help_text, kind, collect) in _collectors.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in collect().items():
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{name}{suffix} {value:g}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from typing import Optional
+
+import redis.asyncio as redis
+from app import models
+from app.core import metrics
+from app.core.config import settings
+from app.core.redis import async_redis
+from app.database import SessionLocal
+from pydantic import BaseModel
+from sqlalchemy import delete, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+logger = logging.getLogger(__name__)
+
+# Database and Redis outages. asyncpg raises a bare OSError, such as
+# ConnectionRefusedError or socket.gaierror, when Postgres can't be reached
+CONNECTION_ERRORS = (redis.RedisError, SQLAlchemyError, OSError)
+
+
+def add_event(db: AsyncSession, channel: str, event: BaseModel):
+    """Queue ``event`` for publication when ``db``'s transaction commits."""
+    db.add(models.OutboxEvent(channel=channel, payload=event.model_dump_json()))
+
+
+class OutboxRelay:
+    """Publishes committed outbox events to Redis in pipelined batches.
+
+    Rows are locked with SKIP LOCKED, published and deleted in one
+    transaction, so instances share the work and an event is only removed
+    once Redis has it. A crash between the two can publish a batch twice, so
+    delivery is at least once. Failed batches stay in the table and are
+    retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        client: redis.Redis,
+        batch_size: int = 100,
+        poll_interval: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self.session_factory = session_factory
+        self.client = client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self.published = 0
+        self.failures = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def notify(self):
+        """Relay new events now instead of at the next poll."""
+        self._wakeup.set()
+
+    async def relay_batch(self) -> int:
+        async with self.session_factory() as db:
+            events = (
+                await db.scalars(
+                    select(models.OutboxEvent)
+                    .order_by(models.OutboxEvent.id)
+                    .limit(self.batch_size)
+                    .with_for_update(skip_locked=True)
+                )
+            ).all()
+            if not events:
+                return 0
+            pipe = self.client.pipeline(transaction=False)
+            for event in events:
+                pipe.publish(event.channel, event.payload)
+            await pipe.execute()
+            await db.execute(
+                delete(models.OutboxEvent).where(
+                    models.OutboxEvent.id.in_([event.id for event in events])
+                )
+            )
+            await db.commit()
+        self.published += len(events)
+        return len(events)
+
+    async def _run(self):
+        backoff = self.poll_interval
+        while True:
+            self._wakeup.clear()
+            try:
+                relayed = await self.relay_batch()
+            except Exception as e:
+                # Anything else is a bug, but the relay must keep running or
+                # events pile up until the process restarts
+                self.failures += 1
+                message = f"Outbox relay failed, retrying in {backoff}s: {e}"
+                if isinstance(e, CONNECTION_ERRORS):
+                    logger.warning(message)
+                else:
+                    logger.exception(message)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.poll_interval
+            if relayed < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        if self._task is None:
+            # Bound to the running loop on first use
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def register_metrics(relay: OutboxRelay):
+    metrics.register(
+        "auth_outbox_published_total",
+        "Outbox events published to Redis",
+        lambda: {"": relay.published},
+        kind="counter",
+    )
+    metrics.register(
+        "auth_outbox_failures_total",
+        "Outbox batches that failed and were retried",
+        lambda: {"": relay.failures},
+        kind="counter",
+    )
+
+
+outbox_relay = OutboxRelay(
+    SessionLocal,
+    async_redis,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+    max_backoff=settings.OUTBOX_MAX_BACKOFF,
+)
+register_metrics(outbox_relay)
@@ -3,8 +3,8 @@ import logging
 from typing import Optional
 
 import redis
+import redis.asyncio
 from app.core.config import settings
-from pydantic import BaseModel
 
 logger = logging.getLogger(__name__)
 
@@ -30,18 +30,6 @@ class RedisClient:
             self._client.close()
             logger.info("Redis connection closed")
 
-    async def publish_event(self, channel: str, event: BaseModel):
-        if not self._client:
-            await self.connect()
-
-        try:
-            payload = event.json()
-            self._client.publish(channel, payload)
-            logger.debug(f"Published event to {channel}: {payload}")
-        except Exception as e:
-            logger.error(f"Failed to publish event: {str(e)}")
-            raise
-
     async def get(self, key: str) -> Optional[str]:
         if not self._client:
             await self.connect()
@@ -55,3 +43,12 @@ class RedisClient:
 
 # Global redis client instance
 redis_client = RedisClient()
+
+# Shared asyncio client for lookups on the request path. Timeouts are short so a
+# struggling Redis fails requests fast instead of stalling them.
+async_redis = redis.asyncio.Redis.from_url(
+    settings.REDIS_URL,
+    decode_responses=True,
+    socket_timeout=0.5,
+    socket_connect_timeout=0.5,
+)
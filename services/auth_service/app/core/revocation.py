@@ -0,0 +1,186 @@
+"""Revocation of access tokens before they expire.
+
+Revoked sessions (``sid:<id>``) and users (``sub:<email>``) are kept in a
+Redis sorted set scored by the time of revocation; a token is revoked if one
+of its keys was revoked at or after the token's ``iat``. Every verifier holds
+a Bloom filter of the set's members, kept current over pub/sub, so the check
+for a token that was never revoked is a few in-memory bit tests. Only filter
+hits look up the set in Redis: false positives, and keys revoked before the
+token was issued.
+
+Entries older than the longest access-token lifetime can no longer match a
+live token, so the filter is rebuilt from the trimmed set every
+``rebuild_interval`` seconds and doesn't fill up.
+"""
+
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Iterable, Optional
+
+import redis.asyncio as redis
+from app.core import metrics
+from app.core.config import settings
+from app.core.redis import async_redis
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = "auth:revoked"
+REVOKED_CHANNEL = "auth:revoke"
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, key: str):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(key)
+        )
+
+
+class RevocationList:
+    def __init__(
+        self,
+        client: redis.Redis,
+        max_token_age: int,
+        capacity: int = 100000,
+        error_rate: float = 0.001,
+        rebuild_interval: float = 60,
+    ):
+        self.max_token_age = max_token_age
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self.checks = {"filter_miss": 0, "revoked": 0, "lookup_miss": 0}
+        self._redis = client
+        self._filter = BloomFilter(capacity, error_rate)
+        self._listener: Optional[asyncio.Task] = None
+
+    @property
+    def entries(self) -> int:
+        return self._filter.count
+
+    async def revoke(self, key: str):
+        """Revoke every token carrying ``key`` that was issued until now."""
+        self._filter.add(key)
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.zadd(REVOKED_KEY, {key: time.time()}, gt=True)
+            pipe.publish(REVOKED_CHANNEL, key)
+            await pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"Revoking {key} failed: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Revocation list unavailable",
+            )
+
+    async def is_revoked(self, keys: Iterable[str], issued_at: float) -> bool:
+        candidates = [key for key in keys if key in self._filter]
+        if not candidates:
+            self.checks["filter_miss"] += 1
+            return False
+        try:
+            revoked_at = await self._redis.zmscore(REVOKED_KEY, candidates)
+        except redis.RedisError as e:
+            # A filter hit is most likely a real revocation, so fail closed
+            logger.error(f"Revocation lookup failed: {e}")
+            self.checks["revoked"] += 1
+            return True
+        if any(score is not None and score >= issued_at for score in revoked_at):
+            self.checks["revoked"] += 1
+            return True
+        self.checks["lookup_miss"] += 1
+        return False
+
+    async def rebuild(self):
+        """Drop entries no live token can match and refill the filter."""
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zremrangebyscore(REVOKED_KEY, "-inf", time.time() - self.max_token_age)
+        pipe.zrange(REVOKED_KEY, 0, -1)
+        _, keys = await pipe.execute()
+        rebuilt = BloomFilter(max(self.capacity, len(keys)), self.error_rate)
+        for key in keys:
+            rebuilt.add(key)
+        self._filter = rebuilt
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(REVOKED_CHANNEL)
+                # Revocations published while unsubscribed are in the set
+                await self.rebuild()
+                rebuilt_at = time.monotonic()
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is not None:
+                        self._filter.add(message["data"])
+                    if time.monotonic() - rebuilt_at >= self.rebuild_interval:
+                        await self.rebuild()
+                        rebuilt_at = time.monotonic()
+            except redis.RedisError as e:
+                logger.warning(f"Revocation listener error: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.reset()
+
+    def start(self):
+        """Follow revocations published by other instances."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+
+def register_metrics(revocations: RevocationList):
+    metrics.register(
+        "auth_revocation_checks_total",
+        "Access-token revocation checks by outcome",
+        lambda: {f'result="{r}"': n for r, n in revocations.checks.items()},
+        kind="counter",
+    )
+    metrics.register(
+        "auth_revocation_filter_entries",
+        "Revocations in the local filter",
+        lambda: {"": revocations.entries},
+    )
+
+
+revocation_list = RevocationList(
+    async_redis,
+    # A minute of leeway for clock skew between instances
+    max_token_age=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60 + 60,
+    capacity=settings.REVOCATION_FILTER_CAPACITY,
+    error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+    rebuild_interval=settings.REVOCATION_FILTER_REBUILD_INTERVAL,
+)
+register_metrics(revocation_list)
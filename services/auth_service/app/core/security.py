@@ -1,27 +1,46 @@
 import hashlib
 import hmac
 import secrets
+import time
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional
 
 from app import crud, schemas
 from app.core.config import settings
+from app.core.hashing import pwd_context
+from app.core.keys import KeyRing
+from app.core.revocation import revocation_list
+from app.core.token_cache import TokenCache, register_metrics
+from app.core.user_cache import user_cache
 from app.database import get_db
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+token_cache = TokenCache(maxsize=settings.TOKEN_CACHE_SIZE)
+register_metrics(token_cache)
+
+key_ring = KeyRing(
+    keys_dir=settings.JWT_KEYS_DIR,
+    algorithm=settings.JWT_KEY_ALGORITHM,
+    activation_delay=settings.JWT_KEY_ACTIVATION_DELAY,
+    reload_interval=settings.JWT_KEY_RELOAD_INTERVAL,
+    ephemeral=settings.JWT_EPHEMERAL_KEY,
+    # Loaded off the event loop during startup, not on import
+    lazy=True,
+)
 
 
 class TokenPayload(BaseModel):
     sub: Optional[str] = None
     exp: Optional[int] = None
+    iat: Optional[float] = None
+    sid: Optional[str] = None
+    roles: List[str] = []
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -38,8 +57,28 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    to_encode.update({"exp": expire, "iat": time.time()})
+    key = key_ring.signing_key()
+    return jwt.encode(
+        to_encode, key.private_pem, algorithm=key.algorithm, headers={"kid": key.kid}
+    )
+
+
+async def create_user_access_token(db: AsyncSession, user, session_id: str) -> str:
+    """Access token for ``user`` carrying their role names.
+
+    Roles are resolved here, at login and refresh, so protected routes can
+    authorize from the token alone. Role changes apply from the next refresh.
+    The session id lets logging out revoke the token before it expires.
+    """
+    return create_access_token(
+        data={
+            "sub": user.email,
+            "sid": session_id,
+            "roles": await crud.get_user_role_names(db, user.id),
+        },
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
 
 
 def create_refresh_token(data: dict) -> str:
@@ -51,21 +90,58 @@ def create_refresh_token(data: dict) -> str:
     )
 
 
-def verify_token(token: str, secret_key: str) -> Optional[str]:
-    try:
-        payload = jwt.decode(token, secret_key, algorithms=[settings.ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+def decode_token(token: str, secret_key: Optional[str] = None) -> Optional[dict]:
+    """Verify ``token`` and return its claims, or None if it is invalid.
+
+    Access tokens are verified against the public key named by their ``kid``
+    header; pass ``secret_key`` for HMAC-signed refresh tokens. Verified claims
+    are cached until ``exp``, so repeat requests with the same token skip
+    signature verification and claim parsing.
+    """
+    if secret_key is None:
+        try:
+            key = key_ring.public_key(jwt.get_unverified_header(token).get("kid"))
+        except (JWTError, TypeError):
+            return None
+        if key is None:
+            # Unknown or retired key, even if the claims are still cached
             return None
-        token_data = TokenPayload(**payload)
-        if (
-            token_data.exp
-            and datetime.fromtimestamp(token_data.exp) < datetime.utcnow()
-        ):
+        namespace = f"kid:{key.kid}"
+    else:
+        namespace = secret_key
+    claims = token_cache.get(token, namespace=namespace)
+    if claims is not None:
+        return claims
+    try:
+        if secret_key is None:
+            payload = jwt.decode(token, key.public_jwk, algorithms=[key.algorithm])
+        else:
+            payload = jwt.decode(token, secret_key, algorithms=[settings.ALGORITHM])
+        if payload.get("sub") is None:
             return None
-    except JWTError:
+        TokenPayload(**payload)
+    except (JWTError, ValidationError):
+        return None
+    token_cache.set(token, payload, namespace=namespace)
+    return payload
+
+
+def verify_token(token: str, secret_key: Optional[str] = None) -> Optional[str]:
+    claims = decode_token(token, secret_key)
+    return claims["sub"] if claims else None
+
+
+async def verify_access_token(token: str) -> Optional[dict]:
+    """Claims of an access token that is valid and hasn't been revoked."""
+    claims = decode_token(token)
+    if claims is None:
+        return None
+    keys = [f"sub:{claims['sub']}"]
+    if claims.get("sid"):
+        keys.append(f"sid:{claims['sid']}")
+    if await revocation_list.is_revoked(keys, claims.get("iat", 0)):
         return None
-    return email
+    return claims
 
 
 def generate_csrf_token() -> str:
@@ -76,30 +152,88 @@ def verify_csrf_token(token: str, csrf_token: str) -> bool:
     return hmac.compare_digest(token, csrf_token)
 
 
+# pyotp is only needed by accounts with 2FA, so it is imported on first use
 def generate_totp_secret() -> str:
+    import pyotp
+
     return pyotp.random_base32()
 
 
-def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> schemas.UserOut:
+def verify_totp(secret: str, code: str) -> bool:
+    import pyotp
+
+    return pyotp.TOTP(secret).verify(code)
+
+
+def totp_provisioning_uri(secret: str, email: str) -> str:
+    import pyotp
+
+    return pyotp.TOTP(secret).provisioning_uri(
+        name=email, issuer_name=settings.PROJECT_NAME
+    )
+
+
+async def get_cached_user(db: AsyncSession, email: str) -> Optional[schemas.CachedUser]:
+    """Authorization fields for ``email`` from the user cache, else the database."""
+    user = await user_cache.get(email)
+    if user is not None:
+        return user
+    db_user = await crud.get_user_by_email(db, email=email)
+    if db_user is None:
+        return None
+    return await user_cache.set(db_user)
+
+
+async def get_cached_users(
+    db: AsyncSession, emails: List[str]
+) -> Dict[str, schemas.CachedUser]:
+    """Like ``get_cached_user`` for many users, with one query for all misses."""
+    users = await user_cache.get_many(emails)
+    missing = [email for email in set(emails) if email not in users]
+    for user in await user_cache.set_many(await crud.get_users_by_emails(db, missing)):
+        users[user.email] = user
+    return users
+
+
+async def introspect_tokens(
+    db: AsyncSession, tokens: List[str]
+) -> List[schemas.TokenIntrospection]:
+    """Whether each access token is valid, unrevoked and of an active user."""
+    claims = [await verify_access_token(token) for token in tokens]
+    users = await get_cached_users(db, [c["sub"] for c in claims if c is not None])
+    results = []
+    for token_claims in claims:
+        user = users.get(token_claims["sub"]) if token_claims else None
+        if user is None or not user.is_active:
+            results.append(schemas.TokenIntrospection(active=False))
+            continue
+        results.append(
+            schemas.TokenIntrospection(
+                active=True,
+                sub=user.email,
+                user_id=user.id,
+                roles=token_claims.get("roles", []),
+                sid=token_claims.get("sid"),
+                exp=token_claims["exp"],
+                iat=token_claims.get("iat"),
+            )
+        )
+    return results
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> schemas.CachedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-        token_data = TokenPayload(**payload)
-    except JWTError:
+    claims = await verify_access_token(token)
+    if claims is None:
         raise credentials_exception
 
-    user = crud.get_user_by_email(db, email=email)
+    user = await get_cached_user(db, claims["sub"])
     if user is None:
         raise credentials_exception
     return user
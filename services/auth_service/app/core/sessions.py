@@ -0,0 +1,130 @@
+"""Refresh-token sessions kept in Redis.
+
+Every login starts a session family. Each refresh rotates it: the presented
+refresh token must be the family's current one and is replaced by a new one.
+Presenting an older token from the family means it was copied, so the whole
+family is revoked. Families expire with Redis TTLs, and every user has a
+generation counter that revokes all of their families with a single INCR.
+"""
+
+import logging
+import secrets
+from enum import Enum
+from typing import Tuple
+
+import redis.asyncio as redis
+from app.core.config import settings
+from app.core.redis import async_redis
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: session family hash, KEYS[2]: the user's generation counter
+# ARGV: first token id, ttl
+CREATE_SCRIPT = """
+local generation = redis.call('GET', KEYS[2]) or '0'
+redis.call('HSET', KEYS[1], 'current', ARGV[1], 'generation', generation)
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return 1
+"""
+
+# KEYS as above. ARGV: presented token id, next token id, ttl
+# Returns 1 if rotated, 0 if the family is gone or revoked, -1 on reuse
+ROTATE_SCRIPT = """
+local family = redis.call('HMGET', KEYS[1], 'current', 'generation')
+if not family[1] then
+    return 0
+end
+if family[2] ~= (redis.call('GET', KEYS[2]) or '0') then
+    redis.call('DEL', KEYS[1])
+    return 0
+end
+if family[1] ~= ARGV[1] then
+    redis.call('DEL', KEYS[1])
+    return -1
+end
+redis.call('HSET', KEYS[1], 'current', ARGV[2])
+redis.call('EXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+class Rotation(Enum):
+    ROTATED = 1
+    INVALID = 0
+    REUSED = -1
+
+
+def new_token_id() -> str:
+    return secrets.token_urlsafe(16)
+
+
+def _family_key(email: str, family: str) -> str:
+    # Hash-tagged on the user so both keys of a script share a cluster slot
+    return f"auth:session:{{{email}}}:{family}"
+
+
+def _generation_key(email: str) -> str:
+    return f"auth:session_generation:{{{email}}}"
+
+
+def _unavailable(error: Exception) -> HTTPException:
+    logger.error(f"Session store unavailable: {error}")
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Session store unavailable",
+    )
+
+
+class SessionStore:
+    def __init__(self, client: redis.Redis, ttl: int):
+        self.client = client
+        self.ttl = ttl
+        self._create = client.register_script(CREATE_SCRIPT)
+        self._rotate = client.register_script(ROTATE_SCRIPT)
+
+    async def _call(self, script, keys, args):
+        try:
+            return await script(keys=keys, args=args, client=self.client)
+        except redis.RedisError as e:
+            raise _unavailable(e)
+
+    async def create(self, email: str) -> Tuple[str, str]:
+        """Start a session family; returns its id and the first token id."""
+        family, token_id = new_token_id(), new_token_id()
+        await self._call(
+            self._create,
+            [_family_key(email, family), _generation_key(email)],
+            [token_id, self.ttl],
+        )
+        return family, token_id
+
+    async def rotate(
+        self, email: str, family: str, token_id: str, next_token_id: str
+    ) -> Rotation:
+        result = await self._call(
+            self._rotate,
+            [_family_key(email, family), _generation_key(email)],
+            [token_id, next_token_id, self.ttl],
+        )
+        if result == Rotation.REUSED.value:
+            logger.warning(f"Refresh token reuse for {email}; session revoked")
+        return Rotation(result)
+
+    async def revoke(self, email: str, family: str):
+        try:
+            await self.client.delete(_family_key(email, family))
+        except redis.RedisError as e:
+            raise _unavailable(e)
+
+    async def revoke_all(self, email: str):
+        """Invalidate every session of ``email`` at once."""
+        try:
+            await self.client.incr(_generation_key(email))
+        except redis.RedisError as e:
+            raise _unavailable(e)
+
+
+session_store = SessionStore(
+    async_redis, ttl=settings.REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600
+)
@@ -0,0 +1,79 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core import metrics
+
+
+class TokenCache:
+    """Bounded LRU of verified token claims, keyed by token digest.
+
+    Entries are only returned until the token's ``exp`` so a cached token
+    never outlives its signature. The raw token is never stored.
+    """
+
+    def __init__(self, maxsize: int = 10000):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, bytes], Tuple[dict, float]]" = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _key(token: str, namespace: str) -> Tuple[str, bytes]:
+        return namespace, hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str, namespace: str = "") -> Optional[dict]:
+        key = self._key(token, namespace)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        claims, expires_at = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return claims
+
+    def set(self, token: str, claims: dict, namespace: str = ""):
+        exp = claims.get("exp")
+        if exp is None or self.maxsize <= 0:
+            return
+        self._entries[self._key(token, namespace)] = (claims, float(exp))
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+def register_metrics(cache: TokenCache):
+    metrics.register(
+        "auth_token_cache_lookups_total",
+        "Token verification cache lookups by result",
+        lambda: {'result="hit"': cache.hits, 'result="miss"': cache.misses},
+        kind="counter",
+    )
+    metrics.register(
+        "auth_token_cache_entries",
+        "Verified tokens currently cached",
+        lambda: {"": len(cache)},
+    )
+    metrics.register(
+        "auth_token_cache_hit_rate",
+        "Token cache hit rate",
+        lambda: {"": cache.hit_rate},
+    )
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio as redis
+from app import schemas
+from app.core import metrics
+from app.core.config import settings
+from app.core.redis import async_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "auth:user:"
+INVALIDATE_CHANNEL = "auth:user:invalidate"
+
+
+class UserCache:
+    """Two-tier cache of the user fields needed to authorize a request.
+
+    Lookups check a short-lived in-process LRU, then Redis, and callers fall
+    back to the database on a miss. ``invalidate`` deletes the Redis entry and
+    publishes the email so every instance drops its local copy. Redis errors
+    are treated as misses, so an outage only costs the database query.
+    """
+
+    def __init__(
+        self,
+        client: Optional[redis.Redis] = None,
+        maxsize: int = 10000,
+        local_ttl: float = 30,
+        redis_ttl: int = 300,
+    ):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.hits = {"local": 0, "redis": 0}
+        self.misses = 0
+        # Expected to decode responses to str
+        self._redis = client
+        self._local: "OrderedDict[str, Tuple[schemas.CachedUser, float]]" = (
+            OrderedDict()
+        )
+        self._listener: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+    def _get_local(self, email: str) -> Optional[schemas.CachedUser]:
+        entry = self._local.get(email)
+        if entry is None:
+            return None
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._local[email]
+            return None
+        self._local.move_to_end(email)
+        return user
+
+    def _set_local(self, user: schemas.CachedUser):
+        if self.maxsize <= 0:
+            return
+        self._local[user.email] = (user, time.monotonic() + self.local_ttl)
+        self._local.move_to_end(user.email)
+        if len(self._local) > self.maxsize:
+            self._local.popitem(last=False)
+
+    async def get(self, email: str) -> Optional[schemas.CachedUser]:
+        user = self._get_local(email)
+        if user is not None:
+            self.hits["local"] += 1
+            return user
+        if self._redis is not None:
+            try:
+                payload = await self._redis.get(KEY_PREFIX + email)
+            except redis.RedisError as e:
+                logger.warning(f"User cache lookup failed: {e}")
+                payload = None
+            if payload is not None:
+                user = schemas.CachedUser.model_validate_json(payload)
+                self._set_local(user)
+                self.hits["redis"] += 1
+                return user
+        self.misses += 1
+        return None
+
+    async def get_many(self, emails: Iterable[str]) -> Dict[str, schemas.CachedUser]:
+        """Cached users among ``emails``, looking up Redis in one round trip."""
+        found = {}
+        remote = []
+        for email in set(emails):
+            user = self._get_local(email)
+            if user is not None:
+                self.hits["local"] += 1
+                found[email] = user
+            else:
+                remote.append(email)
+        if remote and self._redis is not None:
+            try:
+                payloads = await self._redis.mget([KEY_PREFIX + e for e in remote])
+            except redis.RedisError as e:
+                logger.warning(f"User cache lookup failed: {e}")
+                payloads = [None] * len(remote)
+            for email, payload in zip(remote, payloads):
+                if payload is not None:
+                    user = schemas.CachedUser.model_validate_json(payload)
+                    self._set_local(user)
+                    self.hits["redis"] += 1
+                    found[email] = user
+        self.misses += sum(email not in found for email in remote)
+        return found
+
+    async def set(self, db_user) -> schemas.CachedUser:
+        """Cache the authorization fields of a ``models.User`` row."""
+        return (await self.set_many([db_user]))[0]
+
+    async def set_many(self, db_users) -> List[schemas.CachedUser]:
+        users = [
+            schemas.CachedUser(
+                id=db_user.id,
+                email=db_user.email,
+                is_active=db_user.is_active,
+                created_at=db_user.created_at,
+                has_totp=bool(db_user.totp_secret),
+            )
+            for db_user in db_users
+        ]
+        for user in users:
+            self._set_local(user)
+        if self._redis is not None and users:
+            try:
+                pipe = self._redis.pipeline(transaction=False)
+                for user in users:
+                    pipe.set(
+                        KEY_PREFIX + user.email,
+                        user.model_dump_json(),
+                        ex=self.redis_ttl,
+                    )
+                await pipe.execute()
+            except redis.RedisError as e:
+                logger.warning(f"User cache write failed: {e}")
+        return users
+
+    async def invalidate(self, email: str):
+        self._local.pop(email, None)
+        if self._redis is None:
+            return
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.delete(KEY_PREFIX + email)
+            pipe.publish(INVALIDATE_CHANNEL, email)
+            await pipe.execute()
+        except redis.RedisError as e:
+            # Other instances fall back on local_ttl to expire their copy
+            logger.error(f"User cache invalidation failed for {email}: {e}")
+
+    async def _listen(self):
+        while True:
+            pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(INVALIDATE_CHANNEL)
+                while True:
+                    # A timeout here, unlike listen(), isn't bound by the
+                    # client's short socket_timeout
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=1.0
+                    )
+                    if message is not None:
+                        self._local.pop(message["data"], None)
+            except redis.RedisError as e:
+                logger.warning(f"User cache invalidation listener error: {e}")
+                await asyncio.sleep(1.0)
+            finally:
+                await pubsub.reset()
+
+    def start(self):
+        """Listen for invalidations published by other instances."""
+        if self._redis is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def clear(self):
+        self._local.clear()
+
+
+def register_metrics(cache: UserCache):
+    metrics.register(
+        "auth_user_cache_lookups_total",
+        "User cache lookups by tier that answered",
+        lambda: {
+            'result="local"': cache.hits["local"],
+            'result="redis"': cache.hits["redis"],
+            'result="miss"': cache.misses,
+        },
+        kind="counter",
+    )
+    metrics.register(
+        "auth_user_cache_entries",
+        "Users currently cached in process",
+        lambda: {"": len(cache)},
+    )
+
+
+user_cache = UserCache(
+    client=async_redis if settings.USER_CACHE_REDIS_TTL > 0 else None,
+    maxsize=settings.USER_CACHE_SIZE,
+    local_ttl=settings.USER_CACHE_TTL,
+    redis_ttl=settings.USER_CACHE_REDIS_TTL,
+)
+register_metrics(user_cache)
@@ -1,86 +1,280 @@
 from datetime import datetime, timedelta
+from itertools import groupby
+from typing import AsyncIterator, Dict, List, Optional
 
 from app import models, schemas
-from app.core.security import get_password_hash
-from sqlalchemy.orm import Session
+from app.core.hashing import password_hasher
+from app.core.outbox import add_event, outbox_relay
+from app.core.user_cache import user_cache
+from sqlalchemy import Select, Text, cast, func, insert, literal, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
 
 
-def get_user(db: Session, user_id: int):
-    return db.query(models.User).filter(models.User.id == user_id).first()
+async def get_user(db: AsyncSession, user_id: int):
+    return await db.get(models.User, user_id)
 
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(models.User).filter(models.User.email == email).first()
+async def get_user_by_email(db: AsyncSession, email: str):
+    return await db.scalar(select(models.User).where(models.User.email == email))
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+async def get_users_by_emails(db: AsyncSession, emails: List[str]):
+    if not emails:
+        return []
+    return (
+        await db.scalars(select(models.User).where(models.User.email.in_(emails)))
+    ).all()
+
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await password_hasher.hash(user.password)
     db_user = models.User(email=user.email, password=hashed_password, is_active=True)
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.flush()
+    add_event(
+        db,
+        "user:created",
+        schemas.EventUserCreated(
+            user_id=db_user.id, email=db_user.email, timestamp=datetime.utcnow()
+        ),
+    )
+    await db.commit()
+    outbox_relay.notify()
     return db_user
 
 
-def update_user_totp_secret(db: Session, user_id: int, totp_secret: str):
-    db_user = get_user(db, user_id)
+async def update_user(db: AsyncSession, user_id: int, **fields):
+    db_user = await get_user(db, user_id)
     if not db_user:
         return None
-    db_user.totp_secret = totp_secret
-    db.commit()
-    db.refresh(db_user)
+    for name, value in fields.items():
+        setattr(db_user, name, value)
+    await db.commit()
+    await user_cache.invalidate(db_user.email)
     return db_user
 
 
-def create_session(db: Session, user_id: int, refresh_token: str, expires_at: datetime):
-    db_session = models.Session(
-        user_id=user_id,
-        refresh_token=refresh_token,
-        expires_at=expires_at,
-        is_active=True,
-    )
-    db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
-    return db_session
+async def update_user_totp_secret(db: AsyncSession, user_id: int, totp_secret: str):
+    return await update_user(db, user_id, totp_secret=totp_secret)
 
 
-def get_session(db: Session, refresh_token: str):
+async def set_user_active(db: AsyncSession, user_id: int, is_active: bool):
+    return await update_user(db, user_id, is_active=is_active)
+
+
+def _seed_admin_statement(email: str, hashed_password: str, now: datetime):
+    """One Postgres statement creating whichever of the admin role and user
+    are missing, assigning the role to a newly created user."""
+    role_insert = pg_insert(models.Role).values(
+        name="admin", description="Administrator role", created_at=now
+    )
+    role = (
+        role_insert.on_conflict_do_update(
+            index_elements=[models.Role.name],
+            # A no-op update, so the existing role's id is returned too
+            set_={"name": role_insert.excluded.name},
+        )
+        .returning(models.Role.id)
+        .cte("admin_role")
+    )
+    user = (
+        pg_insert(models.User)
+        .values(
+            email=email,
+            password=hashed_password,
+            is_active=True,
+            created_at=now,
+            updated_at=now,
+        )
+        .on_conflict_do_nothing(index_elements=[models.User.email])
+        .returning(models.User.id, models.User.email)
+        .cte("admin_user")
+    )
+    event = (
+        insert(models.OutboxEvent)
+        .from_select(
+            ["channel", "payload", "created_at"],
+            select(
+                literal("user:created"),
+                cast(
+                    func.json_build_object(
+                        "user_id",
+                        user.c.id,
+                        "email",
+                        user.c.email,
+                        "timestamp",
+                        now.isoformat(),
+                    ),
+                    Text,
+                ),
+                literal(now),
+            ),
+        )
+        .cte("admin_event")
+    )
     return (
-        db.query(models.Session)
-        .filter(
-            models.Session.refresh_token == refresh_token,
-            models.Session.is_active == True,
-            models.Session.expires_at > datetime.utcnow(),
+        insert(models.UserRole)
+        .from_select(
+            ["user_id", "role_id", "created_at"],
+            select(user.c.id, role.c.id, literal(now)),
         )
-        .first()
+        .add_cte(event)
     )
 
 
-def revoke_session(db: Session, refresh_token: str):
-    db_session = get_session(db, refresh_token)
-    if db_session:
-        db_session.is_active = False
-        db.commit()
-        return True
-    return False
+async def seed_admin(db: AsyncSession, email: str, password: str) -> bool:
+    """Create the admin role and the first admin unless they exist.
 
+    Once seeded this is a single query. Returns whether anything was created.
+    """
+    role_exists, user_exists = (
+        await db.execute(
+            select(
+                select(models.Role.id).where(models.Role.name == "admin").exists(),
+                select(models.User.id).where(models.User.email == email).exists(),
+            )
+        )
+    ).one()
+    if role_exists and user_exists:
+        return False
 
-def revoke_all_sessions(db: Session, user_id: int):
-    db.query(models.Session).filter(
-        models.Session.user_id == user_id, models.Session.is_active == True
-    ).update({"is_active": False})
-    db.commit()
+    hashed_password = await password_hasher.hash(password)
+    if db.bind.dialect.name == "postgresql":
+        await db.execute(
+            _seed_admin_statement(email, hashed_password, datetime.utcnow())
+        )
+        await db.commit()
+    else:
+        role = await get_role_by_name(db, "admin")
+        if not role:
+            role = models.Role(name="admin", description="Administrator role")
+            db.add(role)
+        if not user_exists:
+            user = models.User(email=email, password=hashed_password, is_active=True)
+            db.add(user)
+            await db.flush()
+            db.add(models.UserRole(user_id=user.id, role_id=role.id))
+            add_event(
+                db,
+                "user:created",
+                schemas.EventUserCreated(
+                    user_id=user.id, email=email, timestamp=datetime.utcnow()
+                ),
+            )
+        await db.commit()
+    outbox_relay.notify()
     return True
 
 
-def get_role_by_name(db: Session, name: str):
-    return db.query(models.Role).filter(models.Role.name == name).first()
+async def get_role_by_name(db: AsyncSession, name: str):
+    return await db.scalar(select(models.Role).where(models.Role.name == name))
 
 
-def assign_role_to_user(db: Session, user_id: int, role_id: int):
+async def assign_role_to_user(db: AsyncSession, user_id: int, role_id: int):
     db_user_role = models.UserRole(user_id=user_id, role_id=role_id)
     db.add(db_user_role)
-    db.commit()
-    db.refresh(db_user_role)
+    await db.commit()
     return db_user_role
+
+
+async def get_user_role_names(db: AsyncSession, user_id: int) -> List[str]:
+    rows = await db.scalars(
+        select(models.Role.name)
+        .join(models.UserRole, models.UserRole.role_id == models.Role.id)
+        .where(models.UserRole.user_id == user_id)
+    )
+    return sorted(rows)
+
+
+def _select_users(is_active: Optional[bool], role: Optional[str]) -> Select:
+    query = select(
+        models.User.id,
+        models.User.email,
+        models.User.is_active,
+        models.User.created_at,
+    )
+    if is_active is not None:
+        query = query.where(models.User.is_active == is_active)
+    if role is not None:
+        query = query.where(
+            select(models.UserRole.id)
+            .join(models.Role, models.Role.id == models.UserRole.role_id)
+            .where(models.UserRole.user_id == models.User.id, models.Role.name == role)
+            .exists()
+        )
+    return query.order_by(models.User.id)
+
+
+async def get_users_page(
+    db: AsyncSession,
+    after_id: int = 0,
+    limit: int = 100,
+    is_active: Optional[bool] = None,
+    role: Optional[str] = None,
+) -> List[schemas.UserWithRoles]:
+    """Up to ``limit`` users with ids above ``after_id``, in id order."""
+    rows = (
+        await db.execute(
+            _select_users(is_active, role).where(models.User.id > after_id).limit(limit)
+        )
+    ).all()
+    roles: Dict[int, List[str]] = {row.id: [] for row in rows}
+    if roles:
+        assignments = await db.execute(
+            select(models.UserRole.user_id, models.Role.name)
+            .join(models.Role, models.Role.id == models.UserRole.role_id)
+            .where(models.UserRole.user_id.in_(roles))
+        )
+        for user_id, name in assignments:
+            roles[user_id].append(name)
+    return [
+        schemas.UserWithRoles(**row._mapping, roles=sorted(roles[row.id]))
+        for row in rows
+    ]
+
+
+async def stream_users(
+    db: AsyncSession,
+    is_active: Optional[bool] = None,
+    role: Optional[str] = None,
+    chunk_size: int = 1000,
+) -> AsyncIterator[List[schemas.UserWithRoles]]:
+    """Every matching user in id order, read through a server-side cursor."""
+    users = _select_users(is_active, role).subquery()
+    query = (
+        select(users, models.Role.name.label("role"))
+        .outerjoin(models.UserRole, models.UserRole.user_id == users.c.id)
+        .outerjoin(models.Role, models.Role.id == models.UserRole.role_id)
+        .order_by(users.c.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    result = await db.stream(query)
+    # A user's role rows can straddle two partitions; hold the last user back
+    pending = []
+    async for partition in result.partitions():
+        pending.extend(partition)
+        last_id = pending[-1].id
+        chunk = []
+        for user_id, rows in groupby(pending, key=lambda row: row.id):
+            rows = list(rows)
+            if user_id == last_id:
+                pending = rows
+                break
+            chunk.append(_user_with_roles(rows))
+        if chunk:
+            yield chunk
+    if pending:
+        yield [_user_with_roles(pending)]
+
+
+def _user_with_roles(rows) -> schemas.UserWithRoles:
+    first = rows[0]
+    # Rows come from the users table; don't re-validate every email
+    return schemas.UserWithRoles.model_construct(
+        id=first.id,
+        email=first.email,
+        is_active=first.is_active,
+        created_at=first.created_at,
+        roles=sorted(row.role for row in rows if row.role is not None),
+    )
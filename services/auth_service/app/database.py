@@ -1,28 +1,75 @@
-from contextlib import contextmanager
+import hashlib
+from typing import Optional
 
 from app.core.config import settings
-from sqlalchemy import create_engine
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import Column, String, Table, delete, insert, select
+from sqlalchemy.engine import Dialect
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import (AsyncConnection, AsyncEngine, AsyncSession,
+                                    async_sessionmaker, create_async_engine)
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.schema import CreateIndex, CreateTable
 
-engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True, pool_size=20, max_overflow=10
+engine = create_async_engine(
+    settings.SQLALCHEMY_DATABASE_URI,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    # Recycling replaces pre-ping, which cost a round trip on every checkout
+    pool_recycle=settings.DB_POOL_RECYCLE,
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit, so writes don't need a refresh round trip
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 Base = declarative_base()
 
+# Fingerprint of the schema create_all last ran for
+schema_version = Table(
+    "auth_schema_version", Base.metadata, Column("version", String, primary_key=True)
+)
+
 
-def get_db():
+async def get_db():
     """Dependency that provides a database session."""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 
-def init_db():
-    """Initialize database tables"""
-    Base.metadata.create_all(bind=engine)
+def schema_fingerprint(dialect: Dialect) -> str:
+    """Hash of the DDL for every table and index the models define."""
+    statements = []
+    for table in Base.metadata.sorted_tables:
+        statements.append(str(CreateTable(table).compile(dialect=dialect)))
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            statements.append(str(CreateIndex(index).compile(dialect=dialect)))
+    return hashlib.sha256("\n".join(statements).encode()).hexdigest()[:16]
+
+
+async def _stored_schema_version(conn: AsyncConnection) -> Optional[str]:
+    try:
+        return await conn.scalar(select(schema_version.c.version))
+    except DBAPIError:
+        # No marker table yet
+        await conn.rollback()
+        return None
+
+
+async def init_db(mode: str = "always", bind: AsyncEngine = engine) -> bool:
+    """Create missing tables. Returns whether ``create_all`` ran.
+
+    ``always`` runs it on every start, ``auto`` only when the models' schema
+    fingerprint differs from the one stored by the last run, and ``never``
+    leaves the schema to migrations.
+    """
+    if mode == "never":
+        return False
+    async with bind.connect() as conn:
+        version = schema_fingerprint(conn.dialect)
+        if mode == "auto" and await _stored_schema_version(conn) == version:
+            return False
+    async with bind.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(delete(schema_version))
+        await conn.execute(insert(schema_version).values(version=version))
+    return True
@@ -1,39 +1,39 @@
-from app import crud, models, schemas
-from app.core.config import settings
-from app.core.security import verify_token
+from app import schemas
+from app.core.security import (TokenPayload, get_cached_user,
+                               verify_access_token)
 from app.database import get_db
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
-) -> models.User:
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> schemas.CachedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        email = verify_token(token, settings.SECRET_KEY)
-        if email is None:
+        claims = await verify_access_token(token)
+        if claims is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = crud.get_user_by_email(db, email=email)
+    user = await get_cached_user(db, claims["sub"])
     if user is None:
         raise credentials_exception
     return user
 
 
 async def get_current_active_user(
-    current_user: models.User = Depends(get_current_user),
-) -> models.User:
+    current_user: schemas.CachedUser = Depends(get_current_user),
+) -> schemas.CachedUser:
     if not current_user.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
@@ -41,28 +41,34 @@ async def get_current_active_user(
     return current_user
 
 
-async def verify_role(role_name: str, user: models.User = Depends(get_current_user)):
-    db = next(get_db())
-    user_roles = (
-        db.query(models.UserRole).filter(models.UserRole.user_id == user.id).all()
-    )
+async def get_token_claims(token: str = Depends(oauth2_scheme)) -> TokenPayload:
+    """Verified access-token claims, without touching the database."""
+    claims = await verify_access_token(token)
+    if claims is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return TokenPayload(**claims)
 
-    role_ids = [ur.role_id for ur in user_roles]
-    required_role = db.query(models.Role).filter(models.Role.name == role_name).first()
 
-    if not required_role or required_role.id not in role_ids:
+def verify_role(role_name: str, claims: TokenPayload) -> TokenPayload:
+    if role_name not in claims.roles:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail=f"Requires {role_name} role"
         )
-    return user
+    return claims
 
 
-async def get_admin_user(user: models.User = Depends(get_current_user)) -> models.User:
-    return await verify_role("admin", user)
+async def get_admin_user(
+    claims: TokenPayload = Depends(get_token_claims),
+) -> TokenPayload:
+    return verify_role("admin", claims)
 
 
 def RoleChecker(role_name: str):
-    def role_checker(user: models.User = Depends(get_current_user)) -> models.User:
-        return verify_role(role_name, user)
+    def role_checker(claims: TokenPayload = Depends(get_token_claims)) -> TokenPayload:
+        return verify_role(role_name, claims)
 
     return role_checker
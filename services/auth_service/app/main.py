@@ -1,21 +1,25 @@
+import asyncio
 import logging
+import time
 from contextlib import asynccontextmanager
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 
-import pyotp
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import ValidationError
 
+from .core import metrics
 from .core.config import settings
+from .core.outbox import outbox_relay
 from .core.redis import redis_client
-from .crud import (assign_role_to_user, create_user, get_role_by_name,
-                   get_user_by_email)
-from .database import Base, engine, get_db
-from .models import Role, User
-from .routers import auth
+from .core.revocation import revocation_list
+from .core.security import key_ring
+from .core.user_cache import user_cache
+from .crud import seed_admin
+from .database import SessionLocal, engine, init_db
+from .routers import admin, auth, jwks
 from .schemas import TokenData
 
 # Configure logging
@@ -23,39 +27,68 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+# Seconds spent in each startup phase of this process
+startup_seconds: Dict[str, float] = {}
+metrics.register(
+    "auth_startup_seconds",
+    "Time spent in each phase of the last startup",
+    lambda: {f'phase="{phase}"': took for phase, took in startup_seconds.items()},
+)
+
+
+async def timed(phase: str, awaitable):
+    started = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        startup_seconds[phase] = time.perf_counter() - started
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting auth service")
+    started = time.perf_counter()
+
+    # Signing keys are read on a thread while the database is prepared; startup
+    # fails without any
+    keys = asyncio.create_task(
+        timed("keys", asyncio.to_thread(key_ring.reload_if_due))
+    )
 
-    # Create database tables
-    Base.metadata.create_all(bind=engine)
+    # Create database tables unless the stored schema version matches
+    if not await timed("schema", init_db(settings.DB_CREATE_SCHEMA)):
+        logger.info("Database schema is current")
 
     # Seed initial admin user if not exists
-    db = next(get_db())
-    try:
-        admin_role = get_role_by_name(db, "admin")
-        if not admin_role:
-            admin_role = Role(name="admin", description="Administrator role")
-            db.add(admin_role)
-            db.commit()
-
-        admin_user = get_user_by_email(db, settings.FIRST_ADMIN_EMAIL)
-        if not admin_user:
-            admin_user = create_user(
-                db,
-                email=settings.FIRST_ADMIN_EMAIL,
-                password=settings.FIRST_ADMIN_PASSWORD,
-            )
-            assign_role_to_user(db, admin_user.id, admin_role.id)
+    async with SessionLocal() as db:
+        if await timed(
+            "seed",
+            seed_admin(db, settings.FIRST_ADMIN_EMAIL, settings.FIRST_ADMIN_PASSWORD),
+        ):
             logger.info("Created initial admin user")
-    finally:
-        db.close()
+    await keys
+
+    user_cache.start()
+    revocation_list.start()
+    outbox_relay.start()
+
+    startup_seconds["total"] = time.perf_counter() - started
+    phases = ", ".join(
+        f"{phase} {took * 1000:.0f}ms"
+        for phase, took in startup_seconds.items()
+        if phase != "total"
+    )
+    logger.info(f"Started in {startup_seconds['total'] * 1000:.0f}ms ({phases})")
 
     yield
 
     # Shutdown
+    await outbox_relay.stop()
+    await revocation_list.stop()
+    await user_cache.stop()
     await redis_client.close()
+    await engine.dispose()
     logger.info("Auth service stopped")
 
 
@@ -161,11 +194,16 @@ async def http_exception_handler(request: Request, exc: HTTPException):
     if hasattr(exc, "headers") and exc.headers and "error-code" in exc.headers:
         content["error_code"] = exc.headers["error-code"]
 
-    return JSONResponse(status_code=exc.status_code, content=content)
+    # Keep Retry-After, WWW-Authenticate and the like
+    return JSONResponse(
+        status_code=exc.status_code, content=content, headers=exc.headers
+    )
 
 
 # Include routers with version prefix
 app.include_router(auth.router, prefix="/api/v1")
+app.include_router(admin.router, prefix="/api/v1")
+app.include_router(jwks.router)
 
 
 @app.get("/")
@@ -176,3 +214,8 @@ def root():
 @app.get("/health")
 def health():
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return metrics.render()
@@ -1,6 +1,7 @@
 from datetime import datetime
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Integer, String,
+                        Text)
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -17,23 +18,9 @@ class User(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
-    sessions = relationship("Session", back_populates="user")
     roles = relationship("UserRole", back_populates="user")
 
 
-class Session(Base):
-    __tablename__ = "sessions"
-
-    id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    refresh_token = Column(String, unique=True, index=True)
-    expires_at = Column(DateTime)
-    is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-
-    user = relationship("User", back_populates="sessions")
-
-
 class Role(Base):
     __tablename__ = "roles"
 
@@ -49,9 +36,20 @@ class UserRole(Base):
     __tablename__ = "user_roles"
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"))
-    role_id = Column(Integer, ForeignKey("roles.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    role_id = Column(Integer, ForeignKey("roles.id"), index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
 
     user = relationship("User", back_populates="roles")
     role = relationship("Role", back_populates="users")
+
+
+class OutboxEvent(Base):
+    """An event committed with the change it describes, awaiting publication."""
+
+    __tablename__ = "outbox_events"
+
+    id = Column(Integer, primary_key=True)
+    channel = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -0,0 +1,84 @@
+from typing import Optional
+
+from app import crud, schemas
+from app.database import SessionLocal, get_db
+from app.deps import get_admin_user
+from app.user_import import UserImporter, iter_lines, parse_records
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+router = APIRouter(
+    prefix="/admin", tags=["admin"], dependencies=[Depends(get_admin_user)]
+)
+
+
+@router.post(
+    "/users/import",
+    response_model=schemas.ImportReport,
+    summary="Import users",
+    description="Creates users from a CSV or NDJSON request body, streamed and "
+    "inserted in batches. Rows that fail are reported by line number without "
+    "stopping the import",
+    responses={
+        200: {"description": "Import finished, possibly with failed rows"},
+        401: {"description": "Unauthorized"},
+        403: {"description": "Requires admin role"},
+    },
+)
+async def import_users(
+    request: Request,
+    format: str = Query(default="csv", pattern="^(csv|ndjson)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    records = parse_records(iter_lines(request.stream()), format)
+    return await UserImporter(db).run(records)
+
+
+@router.get(
+    "/users",
+    response_model=schemas.UserPage,
+    summary="List users",
+    description="Users in id order, optionally filtered by active flag and role. "
+    "Pass the returned next_after as after to get the following page",
+    responses={
+        401: {"description": "Unauthorized"},
+        403: {"description": "Requires admin role"},
+    },
+)
+async def list_users(
+    after: int = Query(
+        default=0, ge=0, description="Last user id of the previous page"
+    ),
+    limit: int = Query(default=100, ge=1, le=1000),
+    is_active: Optional[bool] = None,
+    role: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    # One extra row tells whether there is a next page
+    users = await crud.get_users_page(db, after, limit + 1, is_active, role)
+    if len(users) > limit:
+        return schemas.UserPage(users=users[:limit], next_after=users[limit - 1].id)
+    return schemas.UserPage(users=users)
+
+
+@router.get(
+    "/users/export",
+    summary="Export users",
+    description="Every matching user as NDJSON, streamed from a server-side "
+    "cursor in id order",
+    response_class=StreamingResponse,
+    responses={
+        200: {"content": {"application/x-ndjson": {}}},
+        401: {"description": "Unauthorized"},
+        403: {"description": "Requires admin role"},
+    },
+)
+async def export_users(is_active: Optional[bool] = None, role: Optional[str] = None):
+    async def lines():
+        # Request-scoped sessions close before a streamed body is sent
+        async with SessionLocal() as db:
+            async for chunk in crud.stream_users(db, is_active, role):
+                yield "".join(user.model_dump_json() + "\n" for user in chunk)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
@@ -1,22 +1,49 @@
-from datetime import datetime, timedelta
+import hmac
+from datetime import datetime
+from typing import Optional
 
-import pyotp
 from app import crud, models, schemas
 from app.core.config import settings
-from app.core.redis import redis_client
-from app.core.security import (create_access_token, create_refresh_token,
-                               get_current_user, get_password_hash,
-                               verify_password, verify_token)
+from app.core.hashing import password_hasher
+from app.core.login_shield import login_shield
+from app.core.outbox import add_event, outbox_relay
+from app.core.revocation import revocation_list
+from app.core.security import (create_refresh_token, create_user_access_token,
+                               decode_token, generate_totp_secret,
+                               get_current_user, introspect_tokens,
+                               totp_provisioning_uri, verify_totp)
+from app.core.sessions import Rotation, new_token_id, session_store
 from app.database import get_db
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 
+async def issue_tokens(db: AsyncSession, user) -> dict:
+    """Start a new session family for ``user`` and return its first tokens."""
+    family, token_id = await session_store.create(user.email)
+    return {
+        "access_token": await create_user_access_token(db, user, family),
+        "refresh_token": create_refresh_token(
+            data={"sub": user.email, "sid": family, "jti": token_id}
+        ),
+        "token_type": "bearer",
+    }
+
+
+def decode_refresh_token(refresh_token: str) -> dict:
+    claims = decode_token(refresh_token, settings.REFRESH_SECRET_KEY)
+    if not claims or not claims.get("sid") or not claims.get("jti"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
+        )
+    return claims
+
+
 @router.post(
     "/register",
     response_model=schemas.UserOut,
@@ -28,27 +55,18 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
         422: {"description": "Validation error"},
     },
 )
-async def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(
+    user_in: schemas.UserCreate, db: AsyncSession = Depends(get_db)
+):
     # Check if user already exists
-    db_user = crud.get_user_by_email(db, email=user_in.email)
+    db_user = await crud.get_user_by_email(db, email=user_in.email)
     if db_user:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered"
         )
 
-    # Hash password and create user
-    hashed_password = get_password_hash(user_in.password)
-    user = crud.create_user(
-        db, user=schemas.UserCreate(email=user_in.email, password=hashed_password)
-    )
-
-    # Publish user created event
-    event = schemas.EventUserCreated(
-        user_id=user.id, email=user.email, timestamp=datetime.utcnow()
-    )
-    await redis_client.publish_event("user:created", event)
-
-    return user
+    # Also queues the user:created event
+    return await crud.create_user(db, user=user_in)
 
 
 @router.post(
@@ -60,13 +78,26 @@ async def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_d
         200: {"description": "Authentication successful"},
         401: {"description": "Invalid credentials"},
         403: {"description": "2FA verification required"},
+        429: {"description": "Too many failed login attempts"},
     },
 )
 async def login(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    request: Request,
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not verify_password(form_data.password, user.password):
+    client_ip = request.client.host if request.client else "unknown"
+    # Rejects locked accounts and IPs before any hashing
+    await login_shield.check(form_data.username, client_ip)
+
+    user = await crud.get_user_by_email(db, email=form_data.username)
+    valid, new_hash = False, None
+    if user:
+        valid, new_hash = await password_hasher.verify_and_update(
+            form_data.password, user.password
+        )
+    if not valid:
+        await login_shield.record_failure(form_data.username, client_ip)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -94,69 +125,112 @@ async def login(
             )
 
         # Verify TOTP code
-        totp = pyotp.TOTP(user.totp_secret)
-        if not totp.verify(totp_code):
+        if not verify_totp(user.totp_secret, totp_code):
+            await login_shield.record_failure(form_data.username, client_ip)
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid 2FA code"
             )
 
-    # Generate tokens
-    access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
-    refresh_token = create_refresh_token(data={"sub": user.email})
+    await login_shield.record_success(form_data.username)
+
+    # Upgrade a hash made with an outdated cost while the password is at hand
+    if new_hash:
+        user.password = new_hash
 
     # Publish login event
     event = schemas.EventUserLogin(
         user_id=user.id, email=user.email, timestamp=datetime.utcnow()
     )
-    await redis_client.publish_event("user:login", event)
+    add_event(db, "user:login", event)
+    await db.commit()
+    outbox_relay.notify()
 
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-    }
+    # Generate tokens
+    return await issue_tokens(db, user)
 
 
 @router.post(
     "/refresh",
     response_model=schemas.Token,
     summary="Refresh access token",
-    description="Generates a new access token using a valid refresh token",
+    description="Exchanges a refresh token for a new access token and a new "
+    "refresh token. Each refresh token can be used once; reusing one revokes "
+    "its session",
     responses={
         200: {"description": "Token refreshed successfully"},
-        401: {"description": "Invalid refresh token"},
+        401: {"description": "Invalid refresh token or reuse detected"},
+        503: {"description": "Session store unavailable"},
     },
 )
 async def refresh_token(
-    refresh_token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    refresh_token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
 ):
-    email = verify_token(refresh_token)
-    if not email:
+    claims = decode_refresh_token(refresh_token)
+    email, family = claims["sub"], claims["sid"]
+
+    next_token_id = new_token_id()
+    rotation = await session_store.rotate(email, family, claims["jti"], next_token_id)
+    if rotation is Rotation.REUSED:
+        # Access tokens already issued to the session are as suspect
+        await revocation_list.revoke(f"sid:{family}")
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Refresh token reuse detected",
+        )
+    if rotation is not Rotation.ROTATED:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
         )
 
-    user = crud.get_user_by_email(db, email=email)
+    user = await crud.get_user_by_email(db, email=email)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    new_access_token = create_access_token(
-        data={"sub": user.email},
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
+    new_access_token = await create_user_access_token(db, user, family)
 
     return {
         "access_token": new_access_token,
-        "refresh_token": refresh_token,
+        "refresh_token": create_refresh_token(
+            data={"sub": email, "sid": family, "jti": next_token_id}
+        ),
         "token_type": "bearer",
     }
 
 
+@router.post(
+    "/logout",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Log out",
+    description="Revokes the session of the given refresh token and the access "
+    "tokens issued to it",
+    responses={
+        204: {"description": "Session revoked"},
+        401: {"description": "Invalid refresh token"},
+    },
+)
+async def logout(refresh_token: str = Depends(oauth2_scheme)):
+    claims = decode_refresh_token(refresh_token)
+    await session_store.revoke(claims["sub"], claims["sid"])
+    await revocation_list.revoke(f"sid:{claims['sid']}")
+
+
+@router.post(
+    "/logout-all",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Log out everywhere",
+    description="Revokes every session and access token of the current user",
+    responses={
+        204: {"description": "Sessions revoked"},
+        401: {"description": "Unauthorized"},
+    },
+)
+async def logout_all(current_user: schemas.CachedUser = Depends(get_current_user)):
+    await session_store.revoke_all(current_user.email)
+    await revocation_list.revoke(f"sub:{current_user.email}")
+
+
 @router.post(
     "/2fa/enable",
     response_model=schemas.TOTPEnableResponse,
@@ -168,17 +242,17 @@ async def refresh_token(
     },
 )
 async def enable_2fa(
-    current_user: schemas.UserOut = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: schemas.CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
     # Generate new TOTP secret
-    totp_secret = pyotp.random_base32()
-    crud.update_user_totp_secret(db, user_id=current_user.id, totp_secret=totp_secret)
+    totp_secret = generate_totp_secret()
+    await crud.update_user_totp_secret(
+        db, user_id=current_user.id, totp_secret=totp_secret
+    )
 
     # Generate provisioning URI for authenticator apps
-    provisioning_uri = pyotp.totp.TOTP(totp_secret).provisioning_uri(
-        name=current_user.email, issuer_name=settings.PROJECT_NAME
-    )
+    provisioning_uri = totp_provisioning_uri(totp_secret, current_user.email)
 
     return {"provisioning_uri": provisioning_uri}
 
@@ -196,30 +270,56 @@ async def enable_2fa(
 )
 async def verify_2fa(
     request: schemas.TOTPVerifyRequest,
-    current_user: schemas.UserOut = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    current_user: schemas.CachedUser = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
 ):
-    if not current_user.totp_secret:
+    if not current_user.has_totp:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="2FA not enabled for this user",
         )
 
-    totp = pyotp.TOTP(current_user.totp_secret)
-    if not totp.verify(request.code):
+    # The secret itself is never cached
+    user = await crud.get_user(db, current_user.id)
+    if not verify_totp(user.totp_secret, request.code):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid 2FA code"
         )
 
     # Generate tokens
-    access_token = create_access_token(
-        data={"sub": current_user.email},
-        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
-    )
-    refresh_token = create_refresh_token(data={"sub": current_user.email})
+    return await issue_tokens(db, user)
 
-    return {
-        "access_token": access_token,
-        "refresh_token": refresh_token,
-        "token_type": "bearer",
-    }
+
+@router.post(
+    "/introspect",
+    response_model=schemas.IntrospectResponse,
+    summary="Introspect access tokens",
+    description="Validates a batch of access tokens for gateways and returns, "
+    "in request order, whether each is active with its subject and roles",
+    responses={
+        200: {"description": "Tokens introspected"},
+        400: {"description": "Too many tokens"},
+        403: {"description": "Missing or invalid introspection key"},
+    },
+)
+async def introspect(
+    request: schemas.IntrospectRequest,
+    x_introspection_key: Optional[str] = Header(default=None),
+    db: AsyncSession = Depends(get_db),
+):
+    if not (
+        settings.INTROSPECTION_KEY
+        and x_introspection_key
+        and hmac.compare_digest(x_introspection_key, settings.INTROSPECTION_KEY)
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid introspection key",
+        )
+    if len(request.tokens) > settings.INTROSPECTION_MAX_TOKENS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"At most {settings.INTROSPECTION_MAX_TOKENS} tokens per request",
+        )
+
+    return {"results": await introspect_tokens(db, request.tokens)}
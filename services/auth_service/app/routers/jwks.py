@@ -0,0 +1,23 @@
+from app.core.config import settings
+from app.core.security import key_ring
+from fastapi import APIRouter, Request, Response
+
+router = APIRouter(tags=["jwks"])
+
+
+@router.get(
+    "/.well-known/jwks.json",
+    summary="Token signing keys",
+    description="Public keys for verifying access tokens, selected by the token's kid",
+)
+def jwks(request: Request):
+    key_ring.reload_if_due()
+    headers = {
+        "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE}",
+        "ETag": key_ring.etag,
+    }
+    if request.headers.get("if-none-match") == key_ring.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=key_ring.jwks, media_type="application/json", headers=headers
+    )
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, model_validator
 
 
 class UserBase(BaseModel):
@@ -26,6 +26,48 @@ class UserOut(UserBase):
         from_attributes = True
 
 
+class UserWithRoles(UserOut):
+    roles: List[str] = []
+
+
+class UserPage(BaseModel):
+    users: List[UserWithRoles]
+    # Pass as ``after`` to get the next page; None on the last page
+    next_after: Optional[int] = None
+
+
+class UserImportRow(UserBase):
+    """One user of a bulk import, with a password or an existing bcrypt hash."""
+
+    password: Optional[str] = None
+    password_hash: Optional[str] = None
+    roles: List[str] = []
+    is_active: bool = True
+
+    @model_validator(mode="after")
+    def one_password(self):
+        if (self.password is None) == (self.password_hash is None):
+            raise ValueError("Exactly one of password and password_hash is required")
+        return self
+
+
+class ImportRowError(BaseModel):
+    line: int
+    email: Optional[str] = None
+    error: str
+
+
+class ImportReport(BaseModel):
+    created: int = 0
+    errors: List[ImportRowError] = []
+
+
+class CachedUser(UserOut):
+    """The fields of a user needed to authorize a request, safe to cache."""
+
+    has_totp: bool = False
+
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str
@@ -36,6 +78,26 @@ class TokenData(BaseModel):
     email: Optional[str] = None
 
 
+class IntrospectRequest(BaseModel):
+    tokens: List[str]
+
+
+class TokenIntrospection(BaseModel):
+    """Introspection result for one access token, after RFC 7662."""
+
+    active: bool
+    sub: Optional[str] = None
+    user_id: Optional[int] = None
+    roles: List[str] = []
+    sid: Optional[str] = None
+    exp: Optional[int] = None
+    iat: Optional[float] = None
+
+
+class IntrospectResponse(BaseModel):
+    results: List[TokenIntrospection]
+
+
 class TOTPEnableRequest(BaseModel):
     code: str
 
@@ -0,0 +1,278 @@
+"""Bulk creation of users from CSV or NDJSON.
+
+CSV input needs a header row naming ``email`` and ``password`` or
+``password_hash`` columns, optionally ``roles`` (separated by ``;``) and
+``is_active``. NDJSON lines are objects with the same fields and ``roles`` as
+a list. Every record must fit on one line. Import a file with::
+
+    python -m app.user_import users.csv
+
+or post it to ``/api/v1/admin/users/import``. Rows are validated, hashed on a
+thread pool of their own and inserted in batches; a row that fails is
+reported with its line number and the rest of the file is still imported.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Tuple, Union
+
+from app import models, schemas
+from app.core.config import settings
+from app.core.hashing import PasswordHasher, pwd_context
+from app.core.outbox import outbox_relay
+from app.database import SessionLocal, engine
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+FORMATS = ("csv", "ndjson")
+
+IMPORT_HASH_WORKERS = settings.IMPORT_HASH_WORKERS or os.cpu_count() or 1
+# Imports wait for a hashing slot rather than failing halfway through a file
+# when another import is running; two per thread keeps every thread busy
+import_hasher = PasswordHasher(
+    pwd_context,
+    workers=IMPORT_HASH_WORKERS,
+    max_pending=2 * IMPORT_HASH_WORKERS,
+    wait=True,
+)
+
+# A parsed record, or the reason its line couldn't be parsed
+Record = Tuple[int, Union[dict, str]]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8-sig").rstrip("\r")
+    if buffer:
+        yield buffer.decode("utf-8-sig").rstrip("\r")
+
+
+async def parse_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Record]:
+    header = None
+    number = 0
+    async for line in lines:
+        number += 1
+        if not line.strip():
+            continue
+        if fmt == "ndjson":
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield number, f"Invalid JSON: {e}"
+                continue
+            yield number, record if isinstance(record, dict) else "Expected an object"
+            continue
+
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield number, f"Expected {len(header)} fields, got {len(values)}"
+            continue
+        # Empty cells are missing fields, so a password_hash column can be
+        # left blank on rows that carry a password
+        record = {name: value for name, value in zip(header, values) if value != ""}
+        if "roles" in record:
+            record["roles"] = [r.strip() for r in record["roles"].split(";") if r]
+        yield number, record
+
+
+class UserImporter:
+    def __init__(
+        self,
+        db: AsyncSession,
+        hasher: PasswordHasher = import_hasher,
+        batch_size: int = settings.IMPORT_BATCH_SIZE,
+    ):
+        self.db = db
+        self.hasher = hasher
+        self.batch_size = batch_size
+        self.report = schemas.ImportReport()
+        self._role_ids: Dict[str, int] = {}
+        self._seen = set()
+
+    def _fail(self, line: int, email, error: str):
+        self.report.errors.append(
+            schemas.ImportRowError(line=line, email=email, error=error)
+        )
+
+    async def run(self, records: AsyncIterator[Record]) -> schemas.ImportReport:
+        batch = []
+        async for line, record in records:
+            if isinstance(record, str):
+                self._fail(line, None, record)
+                continue
+            try:
+                row = schemas.UserImportRow(**record)
+            except (ValidationError, TypeError) as e:
+                errors = e.errors() if isinstance(e, ValidationError) else []
+                message = "; ".join(error["msg"] for error in errors) or str(e)
+                self._fail(line, record.get("email"), message)
+                continue
+            if row.email in self._seen:
+                self._fail(line, row.email, "Duplicate email in import")
+                continue
+            self._seen.add(row.email)
+            batch.append((line, row))
+            if len(batch) >= self.batch_size:
+                await self._import_batch(batch)
+                batch = []
+        if batch:
+            await self._import_batch(batch)
+        self.report.errors.sort(key=lambda error: error.line)
+        return self.report
+
+    async def _load_roles(self, names):
+        missing = set(names) - self._role_ids.keys()
+        if missing:
+            roles = await self.db.execute(
+                select(models.Role.name, models.Role.id).where(
+                    models.Role.name.in_(missing)
+                )
+            )
+            self._role_ids.update(roles.all())
+
+    async def _import_batch(self, batch: List[Tuple[int, schemas.UserImportRow]]):
+        existing = set(
+            await self.db.scalars(
+                select(models.User.email).where(
+                    models.User.email.in_([row.email for _, row in batch])
+                )
+            )
+        )
+        await self._load_roles({role for _, row in batch for role in row.roles})
+
+        valid = []
+        for line, row in batch:
+            unknown = [role for role in row.roles if role not in self._role_ids]
+            if row.email in existing:
+                self._fail(line, row.email, "Email already registered")
+            elif unknown:
+                self._fail(line, row.email, f"Unknown roles: {', '.join(unknown)}")
+            elif row.password_hash and pwd_context.identify(row.password_hash) is None:
+                self._fail(line, row.email, "password_hash is not a bcrypt hash")
+            else:
+                valid.append((line, row))
+
+        hashes = await asyncio.gather(
+            *(self.hasher.hash(row.password) for _, row in valid if row.password)
+        )
+        hashes = iter(hashes)
+        rows = [(line, row, row.password_hash or next(hashes)) for line, row in valid]
+
+        try:
+            await self._insert(rows)
+            await self.db.commit()
+            self.report.created += len(rows)
+        except IntegrityError:
+            # Someone registered one of the emails meanwhile, or a row broke
+            # another constraint; insert one by one to find out which
+            await self.db.rollback()
+            for line, row, password in rows:
+                try:
+                    await self._insert([(line, row, password)])
+                    await self.db.commit()
+                    self.report.created += 1
+                except IntegrityError as e:
+                    await self.db.rollback()
+                    if await self._email_taken(row.email):
+                        self._fail(line, row.email, "Email already registered")
+                    else:
+                        self._fail(line, row.email, f"Insert failed: {e.orig}")
+        outbox_relay.notify()
+
+    async def _email_taken(self, email: str) -> bool:
+        return (
+            await self.db.scalar(
+                select(models.User.id).where(models.User.email == email)
+            )
+            is not None
+        )
+
+    async def _insert(self, rows):
+        if not rows:
+            return
+        user_ids = dict(
+            (
+                await self.db.execute(
+                    insert(models.User).returning(models.User.email, models.User.id),
+                    [
+                        {
+                            "email": row.email,
+                            "password": password,
+                            "is_active": row.is_active,
+                        }
+                        for _, row, password in rows
+                    ],
+                )
+            ).all()
+        )
+        user_roles = [
+            {"user_id": user_ids[row.email], "role_id": self._role_ids[role]}
+            for _, row, _ in rows
+            for role in row.roles
+        ]
+        if user_roles:
+            await self.db.execute(insert(models.UserRole), user_roles)
+        now = datetime.utcnow()
+        await self.db.execute(
+            insert(models.OutboxEvent),
+            [
+                {
+                    "channel": "user:created",
+                    "payload": schemas.EventUserCreated(
+                        user_id=user_id, email=email, timestamp=now
+                    ).model_dump_json(),
+                }
+                for email, user_id in user_ids.items()
+            ],
+        )
+
+
+async def _read_chunks(path: str) -> AsyncIterator[bytes]:
+    with open(path, "rb") if path != "-" else sys.stdin.buffer as f:
+        while chunk := f.read(1 << 16):
+            yield chunk
+
+
+async def _import_file(path: str, fmt: str) -> schemas.ImportReport:
+    try:
+        async with SessionLocal() as db:
+            records = parse_records(iter_lines(_read_chunks(path)), fmt)
+            return await UserImporter(db).run(records)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import users from CSV or NDJSON")
+    parser.add_argument("file", help="File to import, - for stdin")
+    parser.add_argument(
+        "--format", choices=FORMATS, help="Defaults to the file's extension"
+    )
+    args = parser.parse_args()
+    fmt = args.format or os.path.splitext(args.file)[1].lstrip(".").lower()
+    if fmt not in FORMATS:
+        parser.error("pass --format for files without a .csv or .ndjson extension")
+
+    report = asyncio.run(_import_file(args.file, fmt))
+    for error in report.errors:
+        print(error.model_dump_json(), file=sys.stderr)
+    print(f"Created {report.created} users, {len(report.errors)} rows failed")
+    sys.exit(1 if report.errors else 0)
+
+
+if __name__ == "__main__":
+    main()
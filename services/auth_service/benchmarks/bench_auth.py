@@ -0,0 +1,413 @@
+"""Load tests for the auth service's request flows.
+
+Drives the app in process over ASGI against a database given by
+``--database-url`` (a throwaway SQLite file by default; a dedicated Postgres
+database works too) and an in-process fake Redis, or ``--redis-url``. For
+login with and without 2FA, refresh, and a ``get_current_user``-protected
+call, at each ``--concurrency`` level, it reports requests/sec, p50/p99
+latency, and how long the event loop was blocked by callbacks running longer
+than ``--stall-threshold``, which is where hashing or a sync database call on
+the loop shows up.
+
+    python -m benchmarks.bench_auth --save baseline.json
+    python -m benchmarks.bench_auth --baseline baseline.json
+
+With ``--baseline`` the run exits non-zero when any result regresses past
+``--tolerance``.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from typing import Annotated, Awaitable, Callable, Dict, List, NamedTuple
+from unittest.mock import patch
+
+import fakeredis
+import httpx
+import pyotp
+import redis.asyncio as redis
+from app import models, schemas
+from app.core.config import settings
+from app.core.hashing import password_hasher
+from app.core.login_shield import login_shield
+from app.core.revocation import revocation_list
+from app.core.security import get_current_user, key_ring
+from app.core.sessions import session_store
+from app.core.user_cache import user_cache
+from app.database import Base, get_db
+from app.main import app as service_app
+from fastapi import Depends, FastAPI
+from passlib.context import CryptContext
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+SCENARIOS = ("login", "login_2fa", "refresh", "protected")
+PASSWORD = "bench-password"
+PROTECTED_PATH = "/bench/protected"
+
+
+class Result(NamedTuple):
+    scenario: str
+    concurrency: int
+    requests_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    errors: int
+    blocked_ms: float
+    max_stall_ms: float
+
+
+class LoopStallMonitor:
+    """Times every event-loop callback and adds up those over ``threshold``.
+
+    A callback is one step of a task between awaits; while it runs nothing
+    else on the loop can, so a long one stalls every request in flight.
+    """
+
+    def __init__(self, threshold: float):
+        self.threshold = threshold
+        self.blocked = 0.0
+        self.max_stall = 0.0
+
+    def reset(self):
+        self.blocked = 0.0
+        self.max_stall = 0.0
+
+    @contextmanager
+    def watching(self):
+        run = asyncio.events.Handle._run
+        monitor = self
+
+        def timed_run(handle):
+            started = time.perf_counter()
+            try:
+                return run(handle)
+            finally:
+                took = time.perf_counter() - started
+                if took >= monitor.threshold:
+                    monitor.blocked += took
+                    monitor.max_stall = max(monitor.max_stall, took)
+
+        with patch.object(asyncio.events.Handle, "_run", timed_run):
+            yield self
+
+
+def make_app() -> FastAPI:
+    """The service's routes, plus one that only authenticates."""
+    app = FastAPI()
+    app.router.routes.extend(service_app.router.routes)
+    app.exception_handlers.update(service_app.exception_handlers)
+
+    @app.get(PROTECTED_PATH)
+    async def protected(user: Annotated[schemas.CachedUser, Depends(get_current_user)]):
+        return {"id": user.id}
+
+    return app
+
+
+async def seed(session_factory, context: CryptContext, users: int) -> List[str]:
+    """Create ``users`` users and as many with 2FA; returns the 2FA secrets."""
+    hashed = context.hash(PASSWORD)
+    secrets = [pyotp.random_base32() for _ in range(users)]
+    async with session_factory() as db:
+        await db.execute(
+            insert(models.User),
+            [
+                {"email": f"bench{i}@example.com", "password": hashed}
+                for i in range(users)
+            ]
+            + [
+                {
+                    "email": f"bench-2fa{i}@example.com",
+                    "password": hashed,
+                    "totp_secret": secret,
+                }
+                for i, secret in enumerate(secrets)
+            ],
+        )
+        await db.commit()
+    return secrets
+
+
+async def login(client: httpx.AsyncClient, index: int) -> httpx.Response:
+    return await client.post(
+        "/api/v1/auth/login",
+        data={"username": f"bench{index}@example.com", "password": PASSWORD},
+    )
+
+
+def _make_worker(
+    scenario: str, client: httpx.AsyncClient, secrets: List[str], worker: int
+) -> Callable[[int], Awaitable[httpx.Response]]:
+    """Return a coroutine function sending request number ``n`` of ``worker``."""
+    users = len(secrets)
+    if scenario == "login":
+        return lambda n: login(client, (worker + n) % users)
+    if scenario == "login_2fa":
+
+        async def login_2fa(n: int):
+            index = (worker + n) % users
+            totp = pyotp.TOTP(secrets[index])
+            while True:
+                issued = datetime.now()
+                response = await client.post(
+                    "/api/v1/auth/login",
+                    data={
+                        "username": f"bench-2fa{index}@example.com",
+                        "password": PASSWORD,
+                        "scope": f"totp_code:{totp.at(issued)}",
+                    },
+                )
+                # Like a user whose code ran out in flight, retry with the next
+                expired = totp.timecode(datetime.now()) != totp.timecode(issued)
+                if response.status_code != 401 or not expired:
+                    return response
+
+        return login_2fa
+    if scenario in ("refresh", "protected"):
+        tokens = {}
+
+        async def authenticated(n: int):
+            if not tokens:
+                tokens.update((await login(client, worker % users)).json())
+            if scenario == "protected":
+                return await client.get(
+                    PROTECTED_PATH,
+                    headers={"Authorization": f"Bearer {tokens['access_token']}"},
+                )
+            response = await client.post(
+                "/api/v1/auth/refresh",
+                headers={"Authorization": f"Bearer {tokens['refresh_token']}"},
+            )
+            if response.status_code == 200:
+                # Each refresh token is single use
+                tokens.update(response.json())
+            return response
+
+        return authenticated
+    raise ValueError(f"Unknown scenario {scenario!r}")
+
+
+async def run_scenario(
+    scenario: str,
+    concurrency: int,
+    client: httpx.AsyncClient,
+    secrets: List[str],
+    monitor: LoopStallMonitor,
+    requests: int,
+) -> Result:
+    per_worker = max(requests // concurrency, 1)
+    latencies: List[float] = []
+    errors = 0
+    workers = [
+        _make_worker(scenario, client, secrets, worker) for worker in range(concurrency)
+    ]
+    # Log the refresh and protected workers in before the clock starts
+    await asyncio.gather(*(send(-1) for send in workers))
+
+    async def run(send):
+        nonlocal errors
+        for n in range(per_worker):
+            start = time.perf_counter()
+            response = await send(n)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                errors += 1
+
+    user_cache.clear()
+    monitor.reset()
+    started = time.perf_counter()
+    await asyncio.gather(*(run(send) for send in workers))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return Result(
+        scenario=scenario,
+        concurrency=concurrency,
+        requests_per_sec=len(latencies) / elapsed,
+        p50_ms=latencies[len(latencies) // 2] * 1000,
+        p99_ms=latencies[int(len(latencies) * 0.99)] * 1000,
+        errors=errors,
+        blocked_ms=monitor.blocked * 1000,
+        max_stall_ms=monitor.max_stall * 1000,
+    )
+
+
+async def run_suite(
+    database_url: str,
+    new_redis: Callable[[], redis.Redis] = lambda: fakeredis.FakeAsyncRedis(
+        decode_responses=True
+    ),
+    requests: int = 200,
+    concurrency=(1, 8, 32),
+    scenarios=SCENARIOS,
+    users: int = 100,
+    bcrypt_rounds: int = settings.BCRYPT_ROUNDS,
+    stall_threshold: float = 0.005,
+) -> List[Result]:
+    engine = create_async_engine(database_url)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, expire_on_commit=False)
+    context = CryptContext(
+        schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=bcrypt_rounds
+    )
+    secrets = await seed(session_factory, context, users)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    app = make_app()
+    app.dependency_overrides[get_db] = override_get_db
+    client = new_redis()
+    monitor = LoopStallMonitor(stall_threshold)
+    results = []
+    with ExitStack() as stack:
+        for target, attribute in (
+            (session_store, "client"),
+            (revocation_list, "_redis"),
+            (login_shield, "client"),
+            (user_cache, "_redis"),
+        ):
+            stack.enter_context(patch.object(target, attribute, client))
+        stack.enter_context(patch.object(password_hasher, "context", context))
+        # One process, so a key generated in memory signs like a key file
+        stack.enter_context(patch.object(key_ring, "ephemeral", True))
+        # The service's routes resolve overrides through the service's app
+        stack.enter_context(
+            patch.dict(service_app.dependency_overrides, {get_db: override_get_db})
+        )
+        stack.enter_context(monitor.watching())
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://bench"
+        ) as http:
+            for scenario in scenarios:
+                for level in concurrency:
+                    results.append(
+                        await run_scenario(
+                            scenario, level, http, secrets, monitor, requests
+                        )
+                    )
+    user_cache.clear()
+    await client.aclose()
+    await engine.dispose()
+    return results
+
+
+def compare(
+    results: List[Result], baseline: Dict[str, dict], tolerance: float
+) -> List[str]:
+    """Describe every result that regressed against ``baseline``."""
+    regressions = []
+    for result in results:
+        name = f"{result.scenario}/{result.concurrency}"
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result.requests_per_sec < before["requests_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result.requests_per_sec:.0f} requests/sec, "
+                f"baseline {before['requests_per_sec']:.0f}"
+            )
+        if result.p99_ms > before["p99_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p99 {result.p99_ms:.1f}ms, baseline {before['p99_ms']:.1f}ms"
+            )
+        if result.errors > before["errors"]:
+            regressions.append(
+                f"{name}: {result.errors} errors, baseline {before['errors']}"
+            )
+    return regressions
+
+
+def print_results(results: List[Result]):
+    header = (
+        f"{'scenario':<10} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} "
+        f"{'errors':>7} {'blocked ms':>11} {'max stall':>10}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.scenario:<10} {r.concurrency:>5} {r.requests_per_sec:>9.0f} "
+            f"{r.p50_ms:>9.2f} {r.p99_ms:>9.2f} {r.errors:>7} "
+            f"{r.blocked_ms:>11.1f} {r.max_stall_ms:>10.1f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", default="1,8,32")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument(
+        "--database-url",
+        help="Async SQLAlchemy URL; its tables are dropped and recreated "
+        "(default: a temporary SQLite file)",
+    )
+    parser.add_argument("--redis-url", help="Use this Redis instead of a fake")
+    parser.add_argument("--bcrypt-rounds", type=int, default=settings.BCRYPT_ROUNDS)
+    parser.add_argument(
+        "--stall-threshold",
+        type=float,
+        default=5.0,
+        help="Milliseconds a callback must hold the loop to count as blocking",
+    )
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Fail on regressions against this file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    redis_options = {}
+    if args.redis_url:
+        redis_options["new_redis"] = lambda: redis.Redis.from_url(
+            args.redis_url, decode_responses=True
+        )
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or (
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        )
+        results = asyncio.run(
+            run_suite(
+                database_url,
+                **redis_options,
+                requests=args.requests,
+                concurrency=[int(c) for c in args.concurrency.split(",")],
+                scenarios=args.scenarios.split(","),
+                users=args.users,
+                bcrypt_rounds=args.bcrypt_rounds,
+                stall_threshold=args.stall_threshold / 1000,
+            )
+        )
+
+    print_results(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {f"{r.scenario}/{r.concurrency}": r._asdict() for r in results},
+                f,
+                indent=2,
+            )
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Startup time of the auth service, phase by phase.
+
+Measures, in fresh interpreters, how long importing ``app.main`` takes and
+which modules cost the most, then runs the database phases of startup
+(schema creation and admin seeding) against ``--database-url`` twice: as a
+first boot on an empty database and as a restart on a seeded one.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --database-url postgresql+asyncpg://...
+
+The service logs the same phases on every start and exports them on
+``/metrics`` as ``auth_startup_seconds``.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _python(*args: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *args],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+
+def import_seconds(runs: int) -> float:
+    """Median wall time to import ``app.main`` in a new interpreter."""
+    code = (
+        "import time; started = time.perf_counter(); import app.main; "
+        "print(time.perf_counter() - started)"
+    )
+    return statistics.median(
+        float(_python("-c", code).stdout.strip().splitlines()[-1]) for _ in range(runs)
+    )
+
+
+def slowest_imports(count: int) -> List[Tuple[str, float]]:
+    """The imports of ``app.main`` by cumulative import time, in seconds.
+
+    A dependency is counted under whichever of them imported it first.
+    """
+    stderr = _python("-X", "importtime", "-c", "import app.main").stderr
+    totals: Dict[str, float] = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # Names are indented by two spaces per level below app.main
+        if name.startswith("   ") and not name.startswith("     "):
+            totals[name.strip()] = int(cumulative) / 1e6
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+async def boot_phases(database_url: str, mode: str) -> List[Dict[str, float]]:
+    """Schema and seed phase times for a first boot and a restart."""
+    from app.core.config import settings
+    from app.crud import seed_admin
+    from app.database import init_db
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    boots = []
+    for _ in range(2):
+        # A new engine per boot, as in a new process
+        engine = create_async_engine(database_url)
+        phases = {}
+        started = time.perf_counter()
+        await init_db(mode, bind=engine)
+        phases["schema"] = time.perf_counter() - started
+        async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+            started = time.perf_counter()
+            await seed_admin(
+                db, settings.FIRST_ADMIN_EMAIL, settings.FIRST_ADMIN_PASSWORD
+            )
+            phases["seed"] = time.perf_counter() - started
+        await engine.dispose()
+        boots.append(phases)
+    return boots
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Import time samples")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument(
+        "--database-url",
+        help="Async SQLAlchemy URL of an empty database "
+        "(default: a temporary SQLite file)",
+    )
+    parser.add_argument(
+        "--schema-mode", choices=("always", "auto", "never"), default="auto"
+    )
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    print(f"import app.main: {import_seconds(args.runs) * 1000:.0f}ms (median)")
+    for name, seconds in slowest_imports(args.top):
+        print(f"  {name:<30} {seconds * 1000:>7.1f}ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or (
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'startup.db')}"
+        )
+        first, restart = asyncio.run(boot_phases(database_url, args.schema_mode))
+    print(f"\n{'phase':<8} {'first boot':>11} {'restart':>9}")
+    for phase in first:
+        print(
+            f"{phase:<8} {first[phase] * 1000:>9.1f}ms "
+            f"{restart[phase] * 1000:>7.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,39 @@
-from unittest.mock import AsyncMock, MagicMock, patch
+from unittest.mock import MagicMock, patch
 
+import fakeredis
 import pytest
+import pytest_asyncio
 from app.core.config import settings
-from app.core.redis import RedisClient
+from app.core.login_shield import login_shield
+from app.core.revocation import revocation_list
+from app.core.security import key_ring
+from app.core.sessions import session_store
 from app.database import Base, get_db
 from app.main import app
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
+# Tests sign with a key generated in memory rather than key files
+key_ring.ephemeral = True
+
+# Fixtures seed the database through a sync session; the app under test gets
+# its own async sessions on the same database
 engine = create_engine(
-    settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True, pool_size=20, max_overflow=10
+    settings.SQLALCHEMY_DATABASE_URI.replace("+asyncpg", "+psycopg2"),
+    pool_pre_ping=True,
+    pool_size=20,
+    max_overflow=10,
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# TestClient runs each request on a new event loop, and asyncpg connections
+# can't move between loops, so nothing is pooled
+async_engine = create_async_engine(settings.SQLALCHEMY_DATABASE_URI, poolclass=NullPool)
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 
 @pytest.fixture(scope="session")
 def test_db():
@@ -24,28 +44,40 @@ def test_db():
     Base.metadata.drop_all(bind=engine)
 
 
+class FakeRedis:
+    """fakeredis client that connects afresh for every command.
+
+    Each TestClient request runs on its own event loop, and a redis.asyncio
+    connection can't be reused from another loop.
+    """
+
+    def __init__(self):
+        self.server = fakeredis.FakeServer()
+
+    def __getattr__(self, name):
+        client = fakeredis.FakeAsyncRedis(server=self.server, decode_responses=True)
+        return getattr(client, name)
+
+
 @pytest.fixture(scope="module")
-def mock_redis():
-    mock = AsyncMock(spec=RedisClient)
-    mock.publish_event = AsyncMock(return_value=True)
-    return mock
+def fake_redis():
+    return FakeRedis()
 
 
 @pytest.fixture(scope="module")
-def client(test_db, mock_redis):
-    def override_get_db():
-        try:
-            yield test_db
-        finally:
-            test_db.rollback()
+def client(test_db, fake_redis):
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
 
     # Override database dependency
     app.dependency_overrides[get_db] = override_get_db
 
-    # Patch the global redis_client instance
-    with patch("app.core.redis.redis_client", mock_redis):
-        with patch("app.routers.auth.redis_client", mock_redis):
-            yield TestClient(app)
+    # Events stay in the outbox table: the relay only runs in the lifespan
+    with patch.object(session_store, "client", fake_redis), patch.object(
+        revocation_list, "_redis", fake_redis
+    ), patch.object(login_shield, "client", fake_redis):
+        yield TestClient(app)
 
     app.dependency_overrides.clear()
 
@@ -61,3 +93,9 @@ def clean_db(test_db):
 
     # Rollback all changes after test
     test_db.rollback()
+
+
+@pytest_asyncio.fixture
+async def async_db(test_db):
+    async with AsyncTestingSessionLocal() as db:
+        yield db
@@ -0,0 +1,42 @@
+import asyncio
+import time
+
+import pytest
+from benchmarks import bench_auth
+from benchmarks.bench_auth import LoopStallMonitor, compare, run_suite
+
+
+@pytest.mark.asyncio
+async def test_stall_monitor_counts_only_blocking_callbacks():
+    monitor = LoopStallMonitor(threshold=0.02)
+    with monitor.watching():
+        await asyncio.sleep(0.05)
+        time.sleep(0.05)
+        await asyncio.sleep(0)
+    assert 0.05 <= monitor.max_stall < 0.5
+    assert monitor.blocked == monitor.max_stall
+
+
+@pytest.mark.asyncio
+async def test_every_scenario_runs_without_errors(tmp_path):
+    results = await run_suite(
+        f"sqlite+aiosqlite:///{tmp_path}/bench.db",
+        requests=4,
+        concurrency=(1, 2),
+        users=4,
+        bcrypt_rounds=4,
+    )
+    assert [(r.scenario, r.concurrency) for r in results] == [
+        (scenario, level) for scenario in bench_auth.SCENARIOS for level in (1, 2)
+    ]
+    assert [r.errors for r in results] == [0] * len(results), results
+
+    result = results[0]
+    baseline = {
+        "login/1": {
+            **result._asdict(),
+            "requests_per_sec": result.requests_per_sec * 2,
+        }
+    }
+    assert len(compare([result], baseline, tolerance=0.2)) == 1
+    assert compare([result], {"login/1": result._asdict()}, 0.2) == []
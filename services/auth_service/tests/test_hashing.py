@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from app.core.hashing import PasswordHasher
+from fastapi import HTTPException
+from passlib.context import CryptContext
+
+
+def context(rounds):
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+@pytest.mark.asyncio
+async def test_hash_and_verify_off_loop():
+    hasher = PasswordHasher(context(10), workers=2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    task = asyncio.create_task(ticker())
+    hashed = await hasher.hash("correct horse")
+    task.cancel()
+
+    # The loop kept running while bcrypt did
+    assert ticks > 5
+    assert await hasher.verify_and_update("correct horse", hashed) == (True, None)
+    assert await hasher.verify_and_update("wrong", hashed) == (False, None)
+    assert hasher.completed == {"hash": 1, "verify": 2}
+
+
+@pytest.mark.asyncio
+async def test_outdated_cost_is_rehashed():
+    old = context(4).hash("correct horse")
+    hasher = PasswordHasher(context(5))
+    valid, new_hash = await hasher.verify_and_update("correct horse", old)
+    assert valid
+    assert new_hash.startswith("$2b$05$")
+    assert await hasher.verify_and_update("correct horse", new_hash) == (True, None)
+
+
+@pytest.mark.asyncio
+async def test_rejects_when_queue_is_full():
+    hasher = PasswordHasher(context(10), workers=1, max_pending=2)
+    results = await asyncio.gather(
+        *(hasher.hash("pw") for _ in range(3)), return_exceptions=True
+    )
+    rejected = [r for r in results if isinstance(r, HTTPException)]
+    assert len(rejected) == 1 and rejected[0].status_code == 503
+    assert hasher.rejected == 1
+    assert hasher.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_waits_for_a_slot_when_asked_to():
+    hasher = PasswordHasher(context(4), workers=1, max_pending=2, wait=True)
+    peak = 0
+
+    async def hash_and_watch():
+        nonlocal peak
+        task = asyncio.ensure_future(hasher.hash("pw"))
+        await asyncio.sleep(0)
+        peak = max(peak, hasher.pending)
+        return await task
+
+    results = await asyncio.gather(*(hash_and_watch() for _ in range(6)))
+    assert len(results) == 6 and hasher.rejected == 0
+    assert peak <= 2
+    assert hasher.completed["hash"] == 6
@@ -0,0 +1,112 @@
+from datetime import timedelta
+from unittest.mock import patch
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from app.core.config import settings
+from app.core.revocation import revocation_list
+from app.core.security import create_access_token, introspect_tokens
+from app.core.user_cache import user_cache
+from app.database import Base
+from app.main import app
+from app.models import User
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/introspect.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    statements = []
+    event.listen(
+        engine.sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement),
+    )
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        for i in range(3):
+            session.add(
+                User(email=f"user{i}@example.com", password="x", is_active=i != 2)
+            )
+        await session.commit()
+        statements.clear()
+        session.statements = statements
+        with patch.object(user_cache, "_redis", None):
+            user_cache.clear()
+            yield session
+            user_cache.clear()
+    await engine.dispose()
+
+
+def token_for(email, **claims):
+    return create_access_token(
+        {"sub": email, "roles": ["reader"], "sid": "s1", **claims},
+        timedelta(minutes=5),
+    )
+
+
+@pytest.mark.asyncio
+async def test_batch_results_in_request_order(db):
+    tokens = [
+        token_for("user0@example.com"),
+        "not-a-token",
+        token_for("user1@example.com"),
+        token_for("user2@example.com"),
+        token_for("missing@example.com"),
+        token_for("user0@example.com"),
+    ]
+    results = await introspect_tokens(db, tokens)
+
+    assert [r.active for r in results] == [True, False, True, False, False, True]
+    assert results[0].sub == "user0@example.com"
+    assert results[0].roles == ["reader"] and results[0].sid == "s1"
+    assert results[2].user_id == 2
+    assert results[1].sub is None
+    # All cache misses were resolved in a single query
+    assert len(db.statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_cached_users_skip_database(db):
+    tokens = [token_for("user0@example.com"), token_for("user1@example.com")]
+    await introspect_tokens(db, tokens)
+    db.statements.clear()
+
+    results = await introspect_tokens(db, tokens)
+    assert all(r.active for r in results)
+    assert db.statements == []
+
+
+@pytest.mark.asyncio
+async def test_revoked_tokens_are_inactive(db):
+    token = token_for("user0@example.com", sid="revoked-session")
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    with patch.object(revocation_list, "_redis", client):
+        await revocation_list.revoke("sid:revoked-session")
+        results = await introspect_tokens(db, [token, token_for("user1@example.com")])
+    assert [r.active for r in results] == [False, True]
+
+
+def test_endpoint_requires_introspection_key():
+    client = TestClient(app)
+    url = "/api/v1/auth/introspect"
+    with patch.object(settings, "INTROSPECTION_KEY", None):
+        response = client.post(
+            url, json={"tokens": []}, headers={"X-Introspection-Key": ""}
+        )
+        assert response.status_code == 403
+    with patch.object(settings, "INTROSPECTION_KEY", "gateway-key"):
+        response = client.post(
+            url, json={"tokens": []}, headers={"X-Introspection-Key": "wrong"}
+        )
+        assert response.status_code == 403
+        response = client.post(
+            url,
+            json={"tokens": ["t"] * (settings.INTROSPECTION_MAX_TOKENS + 1)},
+            headers={"X-Introspection-Key": "gateway-key"},
+        )
+        assert response.status_code == 400
@@ -0,0 +1,84 @@
+import os
+import time
+from datetime import timedelta
+
+import pytest
+from app.core import security
+from app.core.keys import KeyRing, generate_private_pem
+from app.core.security import create_access_token, decode_token
+from app.main import app
+from fastapi.testclient import TestClient
+from jose import jwt
+
+
+def write_key(keys_dir, kid, age=0, algorithm="RS256"):
+    path = os.path.join(keys_dir, f"{kid}.pem")
+    with open(path, "wb") as f:
+        f.write(generate_private_pem(algorithm))
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+
+
+def test_new_key_is_published_before_it_signs(tmp_path):
+    write_key(tmp_path, "old", age=3600)
+    write_key(tmp_path, "new", algorithm="ES256")
+    ring = KeyRing(str(tmp_path), activation_delay=300, reload_interval=0)
+    assert sorted(ring.keys) == ["new", "old"]
+    assert ring.signing_key().kid == "old"
+
+    os.utime(tmp_path / "new.pem", (time.time() - 600, time.time() - 600))
+    assert ring.signing_key().kid == "new"
+    assert ring.signing_key().algorithm == "ES256"
+
+
+def test_retired_key_stops_verifying(tmp_path, monkeypatch):
+    write_key(tmp_path, "a", age=3600)
+    ring = KeyRing(str(tmp_path), reload_interval=0)
+    monkeypatch.setattr(security, "key_ring", ring)
+    token = create_access_token({"sub": "rotated@example.com"}, timedelta(minutes=5))
+    assert jwt.get_unverified_header(token)["kid"] == "a"
+    assert decode_token(token)["sub"] == "rotated@example.com"
+
+    write_key(tmp_path, "b", age=3600)
+    os.remove(tmp_path / "a.pem")
+    assert decode_token(token) is None
+
+
+def test_malformed_kid_is_an_invalid_token(tmp_path, monkeypatch):
+    write_key(tmp_path, "a", age=3600)
+    ring = KeyRing(str(tmp_path), reload_interval=0)
+    monkeypatch.setattr(security, "key_ring", ring)
+    token = create_access_token({"sub": "forged@example.com"}, timedelta(minutes=5))
+    _, payload, signature = token.split(".")
+
+    for kid in (["a"], {"a": 1}, 1, None):
+        header = jwt.get_unverified_header(token)
+        forged = jwt.encode({}, "x", headers={**header, "kid": kid}).split(".")[0]
+        assert ring.public_key(kid) is None
+        assert decode_token(f"{forged}.{payload}.{signature}") is None
+
+
+def test_missing_keys_fail_unless_ephemeral(tmp_path):
+    with pytest.raises(RuntimeError, match="No signing keys"):
+        KeyRing(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        KeyRing(None, lazy=True).signing_key()
+    assert len(KeyRing(str(tmp_path), ephemeral=True).keys) == 1
+
+
+def test_jwks_verifies_tokens_without_private_key():
+    client = TestClient(app)
+    response = client.get("/.well-known/jwks.json")
+    assert response.status_code == 200
+    assert "max-age" in response.headers["cache-control"]
+    keys = {key["kid"]: key for key in response.json()["keys"]}
+    assert all("d" not in key for key in keys.values())
+
+    token = create_access_token({"sub": "jwks@example.com"}, timedelta(minutes=5))
+    header = jwt.get_unverified_header(token)
+    claims = jwt.decode(token, keys[header["kid"]], algorithms=[header["alg"]])
+    assert claims["sub"] == "jwks@example.com"
+
+    etag = response.headers["etag"]
+    cached = client.get("/.well-known/jwks.json", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
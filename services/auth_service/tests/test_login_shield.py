@@ -0,0 +1,94 @@
+import time
+
+import fakeredis
+import pytest
+from app.core.hashing import PasswordHasher, pwd_context
+from app.core.login_shield import LoginShield
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_shield(server, **kwargs):
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    hasher = PasswordHasher(pwd_context, workers=1)
+    return LoginShield(client, hasher, **kwargs)
+
+
+async def locked_for(shield, email="victim@example.com", ip="10.0.0.1"):
+    try:
+        await shield.check(email, ip)
+    except HTTPException as e:
+        assert e.status_code == 429
+        return int(e.headers["Retry-After"])
+    return 0
+
+
+@pytest.mark.asyncio
+async def test_lockout_doubles_after_free_attempts(server):
+    shield = make_shield(server, account_attempts=3, base_delay=10)
+    for _ in range(2):
+        await shield.record_failure("victim@example.com", "10.0.0.1")
+    assert await locked_for(shield) == 0
+
+    await shield.record_failure("victim@example.com", "10.0.0.1")
+    assert await locked_for(shield) == 10
+    await shield.record_failure("victim@example.com", "10.0.0.1")
+    assert await locked_for(shield) == 20
+    # The address of the same account differs only in case
+    assert await locked_for(shield, email="Victim@Example.com", ip="10.0.0.2") > 0
+    assert shield.rejected == {"account": 3, "ip": 0}
+
+
+@pytest.mark.asyncio
+async def test_lockout_is_capped_and_expires(server):
+    shield = make_shield(server, account_attempts=1, base_delay=0.05, max_delay=0.1)
+    for _ in range(5):
+        await shield.record_failure("victim@example.com", "10.0.0.1")
+    assert await locked_for(shield) == 1
+    time.sleep(0.15)
+    assert await locked_for(shield) == 0
+
+
+@pytest.mark.asyncio
+async def test_ip_locked_across_accounts(server):
+    shield = make_shield(server, account_attempts=100, ip_attempts=3, base_delay=10)
+    for i in range(3):
+        await shield.record_failure(f"user{i}@example.com", "10.0.0.1")
+    assert await locked_for(shield, email="fresh@example.com") == 10
+    assert await locked_for(shield, email="fresh@example.com", ip="10.0.0.2") == 0
+    assert shield.rejected["ip"] == 1
+
+
+@pytest.mark.asyncio
+async def test_success_resets_account_only(server):
+    shield = make_shield(server, account_attempts=2, ip_attempts=3, base_delay=10)
+    await shield.record_failure("victim@example.com", "10.0.0.1")
+    await shield.record_failure("victim@example.com", "10.0.0.1")
+    await shield.record_success("victim@example.com")
+    assert await locked_for(shield, ip="10.0.0.2") == 0
+
+    await shield.record_failure("victim@example.com", "10.0.0.1")
+    assert await locked_for(shield, email="other@example.com") == 10
+
+
+@pytest.mark.asyncio
+async def test_saved_seconds_use_mean_verify_time(server):
+    shield = make_shield(server, account_attempts=1, base_delay=10)
+    shield.hasher.completed["verify"] = 4
+    shield.hasher.seconds["verify"] = 1.0
+    await shield.record_failure("victim@example.com", "10.0.0.1")
+    await locked_for(shield)
+    await locked_for(shield)
+    assert shield.seconds_saved == pytest.approx(0.5)
+
+
+@pytest.mark.asyncio
+async def test_fails_open_without_redis(server):
+    shield = make_shield(server, account_attempts=1)
+    server.connected = False
+    await shield.record_failure("victim@example.com", "10.0.0.1")
+    assert await locked_for(shield) == 0
@@ -0,0 +1,110 @@
+import asyncio
+import json
+from datetime import datetime
+
+import fakeredis
+import pytest
+import pytest_asyncio
+from app import models, schemas
+from app.core.outbox import OutboxRelay, add_event
+from app.database import Base
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/outbox.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield async_sessionmaker(engine, expire_on_commit=False)
+    await engine.dispose()
+
+
+async def queue_logins(session_factory, count):
+    async with session_factory() as db:
+        for user_id in range(count):
+            event = schemas.EventUserLogin(
+                user_id=user_id, email="outbox@example.com", timestamp=datetime.utcnow()
+            )
+            add_event(db, "user:login", event)
+        await db.commit()
+
+
+async def pending(session_factory):
+    async with session_factory() as db:
+        return await db.scalar(select(func.count()).select_from(models.OutboxEvent))
+
+
+@pytest.mark.asyncio
+async def test_events_published_in_order_and_removed(session_factory):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    await pubsub.subscribe("user:login")
+    relay = OutboxRelay(session_factory, client, batch_size=2)
+    await queue_logins(session_factory, 3)
+
+    assert await relay.relay_batch() == 2
+    assert await relay.relay_batch() == 1
+    assert await relay.relay_batch() == 0
+
+    received = []
+    for _ in range(10):
+        message = await pubsub.get_message(timeout=0.1)
+        if message is not None:
+            received.append(json.loads(message["data"])["user_id"])
+    assert received == [0, 1, 2]
+    assert relay.published == 3
+    assert await pending(session_factory) == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_stay_queued(session_factory):
+    server = fakeredis.FakeServer()
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    relay = OutboxRelay(session_factory, client, poll_interval=0.01, max_backoff=0.02)
+    await queue_logins(session_factory, 2)
+    server.connected = False
+
+    relay.start()
+    try:
+        while relay.failures < 2:
+            await asyncio.sleep(0.01)
+        assert await pending(session_factory) == 2
+
+        server.connected = True
+        relay.notify()
+        while relay.published < 2:
+            await asyncio.sleep(0.01)
+        assert await pending(session_factory) == 0
+    finally:
+        await relay.stop()
+
+
+@pytest.mark.asyncio
+async def test_relay_survives_unreachable_database(session_factory):
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    reachable = False
+
+    def connect():
+        if not reachable:
+            # What asyncpg raises when Postgres refuses the connection
+            raise ConnectionRefusedError(111, "Connection refused")
+        return session_factory()
+
+    relay = OutboxRelay(connect, client, poll_interval=0.01, max_backoff=0.02)
+    await queue_logins(session_factory, 2)
+
+    relay.start()
+    try:
+        while relay.failures < 2 and not relay._task.done():
+            await asyncio.sleep(0.01)
+        assert not relay._task.done()
+
+        reachable = True
+        relay.notify()
+        while relay.published < 2:
+            await asyncio.sleep(0.01)
+        assert await pending(session_factory) == 0
+    finally:
+        await relay.stop()
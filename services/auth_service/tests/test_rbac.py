@@ -1,8 +1,7 @@
 import pytest
-from app.crud import assign_role_to_user, create_user
+from app.core.security import get_password_hash
 from app.main import app
-from app.models import Role, User
-from app.schemas import UserCreate
+from app.models import Role, User, UserRole
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import Session
 
@@ -18,16 +17,23 @@ def test_users(clean_db: Session):
     clean_db.commit()
 
     # Create test users
-    admin_user = create_user(
-        clean_db, UserCreate(email="admin@example.com", password="adminpass")
+    admin_user = User(
+        email="admin@example.com", password=get_password_hash("adminpass")
     )
-    regular_user = create_user(
-        clean_db, UserCreate(email="user@example.com", password="userpass")
+    regular_user = User(
+        email="user@example.com", password=get_password_hash("userpass")
     )
+    clean_db.add_all([admin_user, regular_user])
+    clean_db.commit()
 
     # Assign roles
-    assign_role_to_user(clean_db, admin_user.id, admin_role.id)
-    assign_role_to_user(clean_db, regular_user.id, user_role.id)
+    clean_db.add_all(
+        [
+            UserRole(user_id=admin_user.id, role_id=admin_role.id),
+            UserRole(user_id=regular_user.id, role_id=user_role.id),
+        ]
+    )
+    clean_db.commit()
 
     return {"admin": admin_user, "user": regular_user}
 
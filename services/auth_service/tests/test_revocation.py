@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from app.core.revocation import REVOKED_KEY, BloomFilter, RevocationList
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_list(server, **kwargs):
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return RevocationList(client, max_token_age=1800, capacity=1000, **kwargs)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    for i in range(1000):
+        bloom.add(f"sid:{i}")
+    assert all(f"sid:{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other:{i}" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+@pytest.mark.asyncio
+async def test_revocation_applies_to_tokens_issued_before(server):
+    revocations = make_list(server)
+    issued_before = time.time()
+    assert not await revocations.is_revoked(["sid:a"], issued_before)
+
+    await revocations.revoke("sid:a")
+
+    assert await revocations.is_revoked(["sub:x", "sid:a"], issued_before)
+    assert not await revocations.is_revoked(["sid:a"], time.time() + 1)
+    assert revocations.checks == {"filter_miss": 1, "revoked": 1, "lookup_miss": 1}
+
+
+@pytest.mark.asyncio
+async def test_clear_tokens_skip_redis(server):
+    revocations = make_list(server)
+    server.connected = False
+    assert not await revocations.is_revoked(["sid:a", "sub:x"], time.time())
+
+
+@pytest.mark.asyncio
+async def test_filter_hits_fail_closed_without_redis(server):
+    revocations = make_list(server)
+    revocations._filter.add("sid:a")
+    server.connected = False
+    assert await revocations.is_revoked(["sid:a"], time.time())
+
+
+@pytest.mark.asyncio
+async def test_rebuild_drops_expired_entries(server):
+    revocations = make_list(server)
+    await revocations.revoke("sid:fresh")
+    await revocations._redis.zadd(REVOKED_KEY, {"sid:stale": time.time() - 3600})
+
+    await revocations.rebuild()
+
+    assert await revocations._redis.zrange(REVOKED_KEY, 0, -1) == ["sid:fresh"]
+    assert revocations.entries == 1
+
+
+@pytest.mark.asyncio
+async def test_revocations_reach_other_instances(server):
+    writer, reader = make_list(server), make_list(server)
+    await writer.revoke("sid:before-start")
+    reader.start()
+    try:
+        # Let the listener subscribe and load the existing set
+        await asyncio.sleep(0.1)
+        issued_at = time.time()
+        await writer.revoke("sub:user@example.com")
+
+        deadline = time.monotonic() + 2
+        while reader.entries < 2 and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        assert await reader.is_revoked(["sub:user@example.com"], issued_at)
+        assert await reader.is_revoked(["sid:before-start"], issued_at - 1)
+    finally:
+        await reader.stop()
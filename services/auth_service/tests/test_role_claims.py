@@ -0,0 +1,70 @@
+from datetime import timedelta
+
+import pytest
+from app import crud
+from app.core.security import create_access_token, create_user_access_token
+from app.deps import RoleChecker, get_admin_user
+from app.models import Role
+from app.schemas import UserCreate
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from jose import jwt
+
+app = FastAPI()
+
+
+@app.get("/admin")
+def admin_only(claims=Depends(get_admin_user)):
+    return {"sub": claims.sub}
+
+
+@app.get("/editor")
+def editor_only(claims=Depends(RoleChecker("editor"))):
+    return {"roles": claims.roles}
+
+
+client = TestClient(app)
+
+
+def bearer(roles):
+    token = create_access_token(
+        {"sub": "claims@example.com", "roles": roles}, timedelta(minutes=5)
+    )
+    return {"Authorization": f"Bearer {token}"}
+
+
+def test_role_checked_from_claims():
+    response = client.get("/admin", headers=bearer(["admin"]))
+    assert response.status_code == 200
+    assert response.json() == {"sub": "claims@example.com"}
+
+    response = client.get("/editor", headers=bearer(["admin", "editor"]))
+    assert response.json() == {"roles": ["admin", "editor"]}
+
+
+def test_missing_role_forbidden():
+    response = client.get("/admin", headers=bearer(["editor"]))
+    assert response.status_code == 403
+    assert response.json() == {"detail": "Requires admin role"}
+    assert client.get("/editor", headers=bearer([])).status_code == 403
+
+
+def test_invalid_token_unauthorized():
+    response = client.get("/admin", headers={"Authorization": "Bearer invalid"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_access_token_carries_current_roles(async_db):
+    role = Role(name="auditor", description="Read-only audit access")
+    async_db.add(role)
+    await async_db.commit()
+    user = await crud.create_user(
+        async_db, UserCreate(email="auditor@example.com", password="auditorpass")
+    )
+    token = await create_user_access_token(async_db, user, "session")
+    assert jwt.get_unverified_claims(token)["roles"] == []
+
+    await crud.assign_role_to_user(async_db, user.id, role.id)
+    token = await create_user_access_token(async_db, user, "session")
+    assert jwt.get_unverified_claims(token)["roles"] == ["auditor"]
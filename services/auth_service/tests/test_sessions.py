@@ -0,0 +1,87 @@
+from unittest.mock import AsyncMock
+
+import fakeredis
+import pytest
+import redis.asyncio as redis
+from app.core.sessions import Rotation, SessionStore, new_token_id
+from fastapi import HTTPException
+
+
+@pytest.fixture
+def store():
+    return SessionStore(fakeredis.FakeAsyncRedis(decode_responses=True), ttl=3600)
+
+
+@pytest.mark.asyncio
+async def test_rotation_replaces_current_token(store):
+    family, first = await store.create("user@example.com")
+    second = new_token_id()
+
+    assert await store.rotate("user@example.com", family, first, second) is (
+        Rotation.ROTATED
+    )
+    third = new_token_id()
+    assert await store.rotate("user@example.com", family, second, third) is (
+        Rotation.ROTATED
+    )
+    ttl = await store.client.ttl(f"auth:session:{{user@example.com}}:{family}")
+    assert 0 < ttl <= 3600
+
+
+@pytest.mark.asyncio
+async def test_reuse_revokes_family(store):
+    family, first = await store.create("user@example.com")
+    second = new_token_id()
+    await store.rotate("user@example.com", family, first, second)
+
+    # The old token comes back: whoever holds the new one loses the session too
+    assert await store.rotate("user@example.com", family, first, new_token_id()) is (
+        Rotation.REUSED
+    )
+    assert await store.rotate("user@example.com", family, second, new_token_id()) is (
+        Rotation.INVALID
+    )
+
+
+@pytest.mark.asyncio
+async def test_unknown_and_revoked_families_are_invalid(store):
+    assert await store.rotate("user@example.com", "missing", "a", "b") is (
+        Rotation.INVALID
+    )
+
+    family, first = await store.create("user@example.com")
+    await store.revoke("user@example.com", family)
+    assert await store.rotate("user@example.com", family, first, "b") is (
+        Rotation.INVALID
+    )
+
+
+@pytest.mark.asyncio
+async def test_revoke_all_invalidates_existing_sessions_only(store):
+    families = [await store.create("user@example.com") for _ in range(3)]
+    other_family, other_token = await store.create("other@example.com")
+
+    await store.revoke_all("user@example.com")
+
+    for family, token_id in families:
+        assert await store.rotate("user@example.com", family, token_id, "next") is (
+            Rotation.INVALID
+        )
+    assert (
+        await store.rotate("other@example.com", other_family, other_token, "next")
+        is Rotation.ROTATED
+    )
+
+    family, token_id = await store.create("user@example.com")
+    assert await store.rotate("user@example.com", family, token_id, "next") is (
+        Rotation.ROTATED
+    )
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_are_service_unavailable(store):
+    store._rotate = AsyncMock(side_effect=redis.ConnectionError("down"))
+
+    with pytest.raises(HTTPException) as excinfo:
+        await store.rotate("user@example.com", "family", "a", "b")
+    assert excinfo.value.status_code == 503
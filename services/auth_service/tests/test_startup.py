@@ -0,0 +1,54 @@
+from datetime import datetime
+
+import pytest
+import pytest_asyncio
+from app import crud, models
+from app.database import init_db, schema_version
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/startup.db")
+    yield engine
+    await engine.dispose()
+
+
+async def count(session, model):
+    return await session.scalar(select(func.count()).select_from(model))
+
+
+@pytest.mark.asyncio
+async def test_schema_is_only_created_when_the_models_changed(engine):
+    assert await init_db("auto", bind=engine)
+    assert not await init_db("auto", bind=engine)
+    assert await init_db("always", bind=engine)
+
+    async with engine.begin() as conn:
+        await conn.execute(update(schema_version).values(version="outdated"))
+    assert await init_db("auto", bind=engine)
+    assert not await init_db("never", bind=engine)
+
+
+@pytest.mark.asyncio
+async def test_admin_is_seeded_once(engine):
+    await init_db("auto", bind=engine)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as db:
+        assert await crud.seed_admin(db, "root@example.com", "changeme")
+        assert not await crud.seed_admin(db, "root@example.com", "changeme")
+
+        user = await crud.get_user_by_email(db, "root@example.com")
+        assert await crud.get_user_role_names(db, user.id) == ["admin"]
+        assert await count(db, models.Role) == 1
+        assert await count(db, models.OutboxEvent) == 1
+
+
+def test_postgres_seed_is_one_statement():
+    statement = crud._seed_admin_statement(
+        "root@example.com", "hash", datetime(2026, 1, 1)
+    )
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    assert sql.count("INSERT INTO") == 4
+    assert "ON CONFLICT (email) DO NOTHING" in sql
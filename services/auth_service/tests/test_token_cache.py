@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from app.core.config import settings
+from app.core.security import (create_access_token, create_refresh_token,
+                               decode_token, token_cache)
+from app.core.token_cache import TokenCache
+
+
+def test_cache_returns_claims_until_exp():
+    cache = TokenCache(maxsize=10)
+    cache.set("valid", {"sub": "a@example.com", "exp": time.time() + 60})
+    cache.set("expired", {"sub": "b@example.com", "exp": time.time() - 1})
+    assert cache.get("valid")["sub"] == "a@example.com"
+    assert cache.get("expired") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_evicts_least_recently_used():
+    cache = TokenCache(maxsize=2)
+    exp = time.time() + 60
+    cache.set("a", {"sub": "a", "exp": exp})
+    cache.set("b", {"sub": "b", "exp": exp})
+    cache.get("a")
+    cache.set("c", {"sub": "c", "exp": exp})
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+
+def test_decode_token_hits_cache_on_repeat():
+    token_cache.clear()
+    token = create_access_token(
+        data={"sub": "cached@example.com"}, expires_delta=timedelta(minutes=5)
+    )
+    hits = token_cache.hits
+    assert decode_token(token)["sub"] == "cached@example.com"
+    assert decode_token(token)["sub"] == "cached@example.com"
+    assert token_cache.hits == hits + 1
+
+
+def test_cached_token_not_accepted_with_other_key():
+    token = create_refresh_token(data={"sub": "refresh@example.com"})
+    assert decode_token(token, settings.REFRESH_SECRET_KEY) is not None
+    assert decode_token(token) is None
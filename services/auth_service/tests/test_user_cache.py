@@ -0,0 +1,101 @@
+import asyncio
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import fakeredis
+import pytest
+from app.core.user_cache import UserCache
+
+
+def db_user(**fields):
+    defaults = dict(
+        id=1,
+        email="cached@example.com",
+        is_active=True,
+        created_at=datetime(2024, 1, 1),
+        totp_secret=None,
+    )
+    return SimpleNamespace(**{**defaults, **fields})
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def make_cache(server, **kwargs):
+    client = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return UserCache(client=client, **kwargs)
+
+
+@pytest.mark.asyncio
+async def test_lookup_falls_through_tiers(server):
+    first, second = make_cache(server), make_cache(server)
+    assert await first.get("cached@example.com") is None
+    await first.set(db_user(totp_secret="SECRET"))
+
+    user = await second.get("cached@example.com")
+    assert user.id == 1 and user.has_totp
+    assert "SECRET" not in user.model_dump_json()
+    await second.get("cached@example.com")
+    assert second.hits == {"local": 1, "redis": 1}
+    assert first.misses == 1
+
+
+@pytest.mark.asyncio
+async def test_local_entries_expire():
+    cache = UserCache(local_ttl=0.01)
+    await cache.set(db_user())
+    assert await cache.get("cached@example.com") is not None
+    time.sleep(0.02)
+    assert await cache.get("cached@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_invalidate_reaches_other_instances(server):
+    writer, reader = make_cache(server), make_cache(server)
+    reader.start()
+    try:
+        await writer.set(db_user())
+        assert (await reader.get("cached@example.com")).is_active
+        # Let the listener subscribe before publishing
+        await asyncio.sleep(0.1)
+
+        await writer.invalidate("cached@example.com")
+        deadline = time.monotonic() + 2
+        while len(reader) and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        assert len(reader) == 0
+        assert await reader.get("cached@example.com") is None
+    finally:
+        await reader.stop()
+
+
+@pytest.mark.asyncio
+async def test_redis_errors_are_misses():
+    client = fakeredis.FakeAsyncRedis(decode_responses=True)
+    client.connected = False
+    cache = UserCache(client=client)
+    assert await cache.get("cached@example.com") is None
+    await cache.set(db_user())
+    await cache.invalidate("cached@example.com")
+    assert await cache.get("cached@example.com") is None
+
+
+@pytest.mark.asyncio
+async def test_get_many_checks_each_tier_once(server):
+    first, second = make_cache(server), make_cache(server)
+    await first.set_many([db_user(id=1), db_user(id=2, email="other@example.com")])
+    await second.set(db_user(id=3, email="local@example.com"))
+
+    users = await second.get_many(
+        ["cached@example.com", "other@example.com", "local@example.com", "none@x.io"]
+    )
+    assert {email: user.id for email, user in users.items()} == {
+        "cached@example.com": 1,
+        "other@example.com": 2,
+        "local@example.com": 3,
+    }
+    assert second.hits == {"local": 1, "redis": 2}
+    assert second.misses == 1
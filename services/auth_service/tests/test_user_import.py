@@ -0,0 +1,184 @@
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+from app import models
+from app.core.hashing import PasswordHasher
+from app.database import Base
+from app.user_import import UserImporter, iter_lines, parse_records
+from passlib.context import CryptContext
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+fast_context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=4)
+PREHASHED = fast_context.hash("prehashed")
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/import.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        session.add_all(
+            [
+                models.Role(name="admin", description="Administrator role"),
+                models.Role(name="editor", description="Editor role"),
+                models.User(email="taken@example.com", password="x"),
+            ]
+        )
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+async def run_import(db, text, fmt, batch_size=2, importer=None):
+    async def chunks():
+        # Split mid-line to exercise line reassembly
+        data = text.encode()
+        for i in range(0, len(data), 7):
+            yield data[i : i + 7]
+
+    importer = importer or UserImporter(
+        db, hasher=PasswordHasher(fast_context, workers=2), batch_size=batch_size
+    )
+    return await importer.run(parse_records(iter_lines(chunks()), fmt))
+
+
+async def user_roles(db, email):
+    rows = await db.scalars(
+        select(models.Role.name)
+        .join(models.UserRole, models.UserRole.role_id == models.Role.id)
+        .join(models.User, models.User.id == models.UserRole.user_id)
+        .where(models.User.email == email)
+    )
+    return sorted(rows)
+
+
+@pytest.mark.asyncio
+async def test_csv_import_reports_bad_rows_and_keeps_going(db):
+    text = (
+        "email,password,password_hash,roles,is_active\r\n"
+        "one@example.com,secret1,,admin;editor,true\r\n"
+        "not-an-email,secret,,,\r\n"
+        "\r\n"
+        f"two@example.com,,{PREHASHED},,false\r\n"
+        "three@example.com,,,,\r\n"
+        "taken@example.com,secret,,,\r\n"
+        "four@example.com,secret4,,ghost,\r\n"
+        "one@example.com,again,,,\r\n"
+        "five@example.com,secret5,,editor\r\n"
+        "six@example.com,,not-a-hash,,\r\n"
+        "seven@example.com,secret7\r\n"
+    )
+    report = await run_import(db, text, "csv")
+
+    assert report.created == 2
+    assert [(e.line, e.email) for e in report.errors] == [
+        (3, "not-an-email"),
+        (6, "three@example.com"),
+        (7, "taken@example.com"),
+        (8, "four@example.com"),
+        (9, "one@example.com"),
+        (10, None),
+        (11, "six@example.com"),
+        (12, None),
+    ]
+    assert report.errors[3].error == "Unknown roles: ghost"
+
+    one = await db.scalar(
+        select(models.User).where(models.User.email == "one@example.com")
+    )
+    assert fast_context.verify("secret1", one.password)
+    assert await user_roles(db, "one@example.com") == ["admin", "editor"]
+    two = await db.scalar(
+        select(models.User).where(models.User.email == "two@example.com")
+    )
+    assert two.password == PREHASHED and two.is_active is False
+    # Line 10 has fewer fields than the header
+    assert "Expected 5 fields" in report.errors[5].error
+
+
+@pytest.mark.asyncio
+async def test_ndjson_import_queues_created_events(db):
+    lines = [
+        {"email": f"user{i}@example.com", "password": f"pw{i}", "roles": ["editor"]}
+        for i in range(5)
+    ]
+    text = "\n".join(json.dumps(line) for line in lines) + "\n[1]\n{broken"
+    report = await run_import(db, text, "ndjson")
+
+    assert report.created == 5
+    assert [(e.line, e.error.split(":")[0]) for e in report.errors] == [
+        (6, "Expected an object"),
+        (7, "Invalid JSON"),
+    ]
+    assert await user_roles(db, "user4@example.com") == ["editor"]
+    events = (await db.scalars(select(models.OutboxEvent))).all()
+    assert sorted(json.loads(e.payload)["email"] for e in events) == [
+        f"user{i}@example.com" for i in range(5)
+    ]
+    assert await db.scalar(select(func.count()).select_from(models.UserRole)) == 5
+
+
+@pytest.mark.asyncio
+async def test_imports_wait_for_hashing_slots(db, tmp_path):
+    # Two imports share a hasher with room for fewer hashes than a batch
+    hasher = PasswordHasher(fast_context, workers=1, max_pending=2, wait=True)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/import.db")
+    async with async_sessionmaker(engine, expire_on_commit=False)() as other:
+        reports = await asyncio.gather(
+            *(
+                run_import(
+                    session,
+                    "email,password\n"
+                    + "".join(f"{name}{i}@example.com,pw{i}\n" for i in range(8)),
+                    "csv",
+                    importer=UserImporter(session, hasher=hasher, batch_size=8),
+                )
+                for name, session in (("a", db), ("b", other))
+            )
+        )
+    await engine.dispose()
+
+    assert [(r.created, r.errors) for r in reports] == [(8, []), (8, [])]
+    assert hasher.rejected == 0
+
+
+@pytest.mark.asyncio
+async def test_only_taken_emails_are_reported_as_registered(db):
+    importer = UserImporter(
+        db, hasher=PasswordHasher(fast_context, workers=2), batch_size=3
+    )
+    insert_rows = importer._insert
+
+    async def racing_insert(rows):
+        emails = [row.email for _, row, _ in rows]
+        if len(rows) > 1:
+            # Registered between the existence check and the insert
+            await db.execute(
+                insert(models.User).values(email="raced@example.com", password="x")
+            )
+            await db.commit()
+        elif emails == ["broken@example.com"]:
+            raise IntegrityError("INSERT", {}, Exception("CHECK constraint failed"))
+        await insert_rows(rows)
+
+    importer._insert = racing_insert
+    report = await run_import(
+        db,
+        "email,password\n"
+        "ok@example.com,pw\n"
+        "raced@example.com,pw\n"
+        "broken@example.com,pw\n",
+        "csv",
+        importer=importer,
+    )
+
+    assert report.created == 1
+    assert [(e.line, e.email, e.error) for e in report.errors] == [
+        (3, "raced@example.com", "Email already registered"),
+        (4, "broken@example.com", "Insert failed: CHECK constraint failed"),
+    ]
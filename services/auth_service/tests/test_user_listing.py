@@ -0,0 +1,83 @@
+import pytest
+import pytest_asyncio
+from app import crud, models
+from app.database import Base
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+
+@pytest_asyncio.fixture
+async def db(tmp_path):
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/users.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+        await session.execute(
+            insert(models.Role), [{"name": "admin"}, {"name": "editor"}]
+        )
+        await session.execute(
+            insert(models.User),
+            [
+                {
+                    "email": f"user{i}@example.com",
+                    "password": "x",
+                    "is_active": i % 3 != 0,
+                }
+                for i in range(1, 11)
+            ],
+        )
+        # Users 2, 4, ... are editors, and every fourth is also an admin
+        await session.execute(
+            insert(models.UserRole),
+            [{"user_id": i, "role_id": 2} for i in range(2, 11, 2)]
+            + [{"user_id": i, "role_id": 1} for i in range(4, 11, 4)],
+        )
+        await session.commit()
+        yield session
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_pages_follow_the_last_id(db):
+    ids, after = [], 0
+    while True:
+        page = await crud.get_users_page(db, after, limit=3)
+        if not page:
+            break
+        ids.extend(user.id for user in page)
+        after = page[-1].id
+    assert ids == list(range(1, 11))
+
+    page = await crud.get_users_page(db, 3, limit=2)
+    assert [(user.id, user.roles) for user in page] == [
+        (4, ["admin", "editor"]),
+        (5, []),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pages_filter_by_active_flag_and_role(db):
+    inactive = await crud.get_users_page(db, is_active=False)
+    assert [user.id for user in inactive] == [3, 6, 9]
+    active_editors = await crud.get_users_page(db, 4, is_active=True, role="editor")
+    assert [user.id for user in active_editors] == [8, 10]
+
+
+@pytest.mark.asyncio
+async def test_export_streams_every_user_once_with_all_roles(db):
+    chunks = [chunk async for chunk in crud.stream_users(db, chunk_size=3)]
+    users = [user for chunk in chunks for user in chunk]
+
+    assert len(chunks) > 1
+    assert [user.id for user in users] == list(range(1, 11))
+    roles = {user.id: user.roles for user in users}
+    assert roles[8] == ["admin", "editor"]
+    assert roles[7] == []
+
+    admins = [
+        user async for chunk in crud.stream_users(db, role="admin") for user in chunk
+    ]
+    assert [(user.id, user.roles) for user in admins] == [
+        (4, ["admin", "editor"]),
+        (8, ["admin", "editor"]),
+    ]
@@ -0,0 +1,141 @@
+import asyncio
+import time
+import uuid
+from typing import NamedTuple, Optional
+
+from .fallback import (FAIL_CLOSED, FAIL_OPEN, DegradedModeLimiter,
+                       degraded_limiter)
+from .sharding import KEY_PREFIX, RedisBackend, client_for, run_script
+
+CONCURRENCY_FAILURE_MODES = (FAIL_OPEN, FAIL_CLOSED)
+
+# Sorted set of lease IDs scored by their expiry time. The key's expiry is
+# only ever pushed later, so a short lease can't expire the set, and with it
+# the longer leases still held in it.
+# KEYS[1]: semaphore key. ARGV: now, limit, ttl, lease_id
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    local first = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, first[2] or ''}
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[4])
+if redis.call('PTTL', KEYS[1]) < ttl * 1000 then
+    redis.call('PEXPIRE', KEYS[1], math.ceil(ttl * 1000))
+end
+return {1, tostring(now + ttl)}
+"""
+
+# KEYS[1]: semaphore key. ARGV: now, ttl, lease_id
+RENEW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+local expiry = redis.call('ZSCORE', KEYS[1], ARGV[3])
+if not expiry or tonumber(expiry) <= now then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now + ttl, ARGV[3])
+if redis.call('PTTL', KEYS[1]) < ttl * 1000 then
+    redis.call('PEXPIRE', KEYS[1], math.ceil(ttl * 1000))
+end
+return 1
+"""
+
+
+def make_concurrency_key(scope: str, scope_id: str, resource: str) -> str:
+    return f"{KEY_PREFIX}:{{{scope_id}}}:concurrency:{scope}:{resource}"
+
+
+class Lease(NamedTuple):
+    acquired: bool
+    lease_id: Optional[str] = None
+    # Expiry of the new lease, or of the oldest held lease when rejected
+    expires_at: Optional[float] = None
+
+
+class ConcurrencyLimiter:
+    """Distributed semaphore bounding in-flight work per user or tenant.
+
+    Each slot is a lease that expires after ``ttl`` seconds unless renewed,
+    so a holder that crashes without releasing only blocks its slot until
+    the lease runs out.
+
+    Redis calls run on a thread behind the degraded-mode breaker. While Redis
+    is unavailable, acquires and renewals all succeed (``open``) or all fail
+    (``closed``); slots can't be counted locally, as leases handed out by one
+    instance would be invisible to the others and to Redis on recovery.
+    """
+
+    def __init__(
+        self,
+        redis: RedisBackend,
+        limit: int = 10,
+        ttl: int = 30,
+        failure_mode: str = FAIL_CLOSED,
+        degraded: DegradedModeLimiter = degraded_limiter,
+    ):
+        if failure_mode not in CONCURRENCY_FAILURE_MODES:
+            raise ValueError(f"Invalid concurrency failure mode {failure_mode!r}")
+        self.redis = redis
+        self.limit = limit
+        self.ttl = ttl
+        self.fail_open = failure_mode == FAIL_OPEN
+        self.degraded = degraded
+
+    async def _guard(self, redis_call, local_call):
+        return await self.degraded.guard(
+            self.redis, lambda: asyncio.to_thread(redis_call), local_call
+        )
+
+    async def acquire(self, key: str) -> Lease:
+        lease_id = uuid.uuid4().hex
+        now = time.time()
+
+        def acquire_in_redis():
+            acquired, expires_at = run_script(
+                client_for(self.redis, key),
+                ACQUIRE_SCRIPT,
+                [key],
+                [now, self.limit, self.ttl, lease_id],
+            )
+            return Lease(
+                acquired=bool(acquired),
+                lease_id=lease_id if acquired else None,
+                expires_at=float(expires_at) if expires_at else None,
+            )
+
+        def acquire_locally():
+            if self.fail_open:
+                return Lease(
+                    acquired=True, lease_id=lease_id, expires_at=now + self.ttl
+                )
+            return Lease(acquired=False)
+
+        return await self._guard(acquire_in_redis, acquire_locally)
+
+    async def renew(self, key: str, lease_id: str) -> bool:
+        def renew_in_redis():
+            return bool(
+                run_script(
+                    client_for(self.redis, key),
+                    RENEW_SCRIPT,
+                    [key],
+                    [time.time(), self.ttl, lease_id],
+                )
+            )
+
+        return await self._guard(renew_in_redis, lambda: self.fail_open)
+
+    async def release(self, key: str, lease_id: str) -> bool:
+        return await self._guard(
+            lambda: bool(client_for(self.redis, key).zrem(key, lease_id)),
+            lambda: False,
+        )
+
+    async def in_flight(self, key: str) -> int:
+        return await self._guard(
+            lambda: client_for(self.redis, key).zcount(key, time.time(), "+inf"),
+            lambda: 0,
+        )
@@ -1,14 +1,43 @@
 import os
-from typing import Generator
+from typing import Generator, Optional
 
 import redis
+from redis.cluster import RedisCluster
+
+from .sharding import RedisBackend, ShardedRedis
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# Comma-separated standalone nodes for client-side consistent hashing
+REDIS_NODES = [url for url in os.getenv("REDIS_NODES", "").split(",") if url.strip()]
+# Treat REDIS_URL as a seed node of a Redis Cluster
+REDIS_CLUSTER = os.getenv("REDIS_CLUSTER", "false").lower() == "true"
+# Bound how long a hung Redis can stall a check before the fallback takes over
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+
+_backend: Optional[RedisBackend] = None
+
+
+def create_redis() -> RedisBackend:
+    if REDIS_NODES:
+        return ShardedRedis(
+            [url.strip() for url in REDIS_NODES],
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+        )
+    if REDIS_CLUSTER:
+        return RedisCluster.from_url(REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT)
+    return redis.Redis.from_url(REDIS_URL, socket_timeout=REDIS_SOCKET_TIMEOUT)
+
+
+def get_redis() -> Generator[RedisBackend, None, None]:
+    # Shared across requests so connection pools are reused
+    global _backend
+    if _backend is None:
+        _backend = create_redis()
+    yield _backend
 
 
-def get_redis() -> Generator[redis.Redis, None, None]:
-    r = redis.Redis.from_url(REDIS_URL)
-    try:
-        yield r
-    finally:
-        r.close()
+def close_redis():
+    global _backend
+    if _backend is not None:
+        _backend.close()
+        _backend = None
@@ -0,0 +1,241 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+
+from redis.exceptions import RedisClusterException, RedisError
+
+from .sharding import RedisBackend, client_for
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+FAIL_OPEN = "open"
+FAIL_CLOSED = "closed"
+FAIL_LOCAL = "local"
+FAILURE_MODES = (FAIL_OPEN, FAIL_CLOSED, FAIL_LOCAL)
+
+# RedisCluster raises RedisClusterException, which isn't a RedisError, when it
+# can't reach the cluster at all
+REDIS_ERRORS = (RedisError, RedisClusterException)
+
+
+class MemoryRateLimiter:
+    """In-process sliding-window counter limiter with LRU-bounded memory.
+
+    Each key keeps only the counts of the current and previous fixed window,
+    and the least recently used key is evicted once ``max_keys`` is reached.
+    """
+
+    def __init__(self, max_keys: int = 10000):
+        self.max_keys = max_keys
+        # key -> [window, window_index, previous_count, current_count]
+        self._buckets: "OrderedDict[str, List[int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def _bucket(self, key: str, window: int, now: float) -> List[int]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = [window, int(now // window), 0, 0]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    @staticmethod
+    def _estimate(bucket: List[int], now: float) -> float:
+        """Roll ``bucket`` forward to ``now`` and estimate the sliding count."""
+        window, index, previous, current = bucket
+        now_index = int(now // window)
+        if now_index != index:
+            bucket[1] = now_index
+            bucket[2] = current if now_index == index + 1 else 0
+            bucket[3] = 0
+        elapsed = (now - now_index * window) / window
+        return bucket[2] * (1 - elapsed) + bucket[3]
+
+    def check(
+        self, key: str, limit: int, window: int, now: Optional[float] = None
+    ) -> bool:
+        now = time.time() if now is None else now
+        bucket = self._bucket(key, window, now)
+        if self._estimate(bucket, now) >= limit:
+            return False
+        bucket[3] += 1
+        return True
+
+    def count(self, key: str, now: Optional[float] = None) -> int:
+        """Estimated requests counted for ``key`` in the sliding window."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            return 0
+        return round(self._estimate(bucket, time.time() if now is None else now))
+
+    def check_many(
+        self, entries: List[Tuple[str, int, int]], now: Optional[float] = None
+    ) -> Optional[int]:
+        """Check ``(key, limit, window)`` entries together.
+
+        Returns the index of the first entry over its limit without counting
+        the request anywhere, or ``None`` after counting it in every entry.
+        """
+        now = time.time() if now is None else now
+        buckets = [self._bucket(key, window, now) for key, _, window in entries]
+        for i, (bucket, (_, limit, _)) in enumerate(zip(buckets, entries)):
+            if self._estimate(bucket, now) >= limit:
+                return i
+        for bucket in buckets:
+            bucket[3] += 1
+        return None
+
+    def drain(self, now: Optional[float] = None) -> List[Tuple[str, int, int]]:
+        """Remove all keys, returning ``(key, window, estimated_count)``."""
+        now = time.time() if now is None else now
+        drained = []
+        for key, bucket in self._buckets.items():
+            count = round(self._estimate(bucket, now))
+            if count:
+                drained.append((key, bucket[0], count))
+        self._buckets.clear()
+        return drained
+
+
+def parse_failure_modes(value: str) -> Dict[str, str]:
+    """Parse ``"login:closed,search:open"`` into a per-action mapping."""
+    modes = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        action, _, mode = item.partition(":")
+        mode = mode.strip().lower()
+        if mode not in FAILURE_MODES:
+            raise ValueError(f"Invalid failure mode {mode!r} for action {action!r}")
+        modes[action.strip()] = mode
+    return modes
+
+
+class DegradedModeLimiter:
+    """Circuit breaker that swaps Redis for ``MemoryRateLimiter`` on failure.
+
+    Redis errors, or Redis calls slower than ``latency_threshold``, open the
+    breaker for ``retry_interval`` seconds. While open, checks are answered
+    according to the action's failure mode. The first successful Redis call
+    afterwards closes the breaker and copies the local counts into Redis so
+    clients don't get a fresh quota on recovery.
+    """
+
+    def __init__(
+        self,
+        max_keys: int = 10000,
+        latency_threshold: float = 0.05,
+        retry_interval: float = 5.0,
+        default_mode: str = FAIL_LOCAL,
+        action_modes: Optional[Dict[str, str]] = None,
+    ):
+        if default_mode not in FAILURE_MODES:
+            raise ValueError(f"Invalid failure mode {default_mode!r}")
+        self.memory = MemoryRateLimiter(max_keys=max_keys)
+        self.latency_threshold = latency_threshold
+        self.retry_interval = retry_interval
+        self.default_mode = default_mode
+        self.action_modes = action_modes or {}
+        self.degraded = False
+        self._retry_at = 0.0
+
+    @classmethod
+    def from_env(cls) -> "DegradedModeLimiter":
+        return cls(
+            max_keys=int(os.getenv("FALLBACK_MAX_KEYS", "10000")),
+            latency_threshold=float(os.getenv("REDIS_LATENCY_THRESHOLD_MS", "50"))
+            / 1000,
+            retry_interval=float(os.getenv("REDIS_RETRY_INTERVAL", "5")),
+            default_mode=os.getenv("RATE_LIMIT_FAILURE_MODE", FAIL_LOCAL).lower(),
+            action_modes=parse_failure_modes(os.getenv("RATE_LIMIT_FAILURE_MODES", "")),
+        )
+
+    def trip(self, reason: str):
+        if not self.degraded:
+            logger.warning(f"Rate limiter entering degraded mode: {reason}")
+        self.degraded = True
+        self._retry_at = time.monotonic() + self.retry_interval
+
+    def should_use_redis(self) -> bool:
+        return not self.degraded or time.monotonic() >= self._retry_at
+
+    def check_local(self, key: str, action: str, limit: int, window: int) -> bool:
+        mode = self.action_modes.get(action, self.default_mode)
+        if mode == FAIL_OPEN:
+            return True
+        if mode == FAIL_CLOSED:
+            return False
+        return self.memory.check(key, limit, window)
+
+    def check_local_many(
+        self, entries: List[Tuple[str, int, int]], action: str
+    ) -> Optional[int]:
+        """Degraded-mode variant of ``check_local`` for nested limits."""
+        mode = self.action_modes.get(action, self.default_mode)
+        if mode == FAIL_OPEN:
+            return None
+        if mode == FAIL_CLOSED:
+            return 0
+        return self.memory.check_many(entries)
+
+    def recover(self) -> List[Tuple[str, int, int]]:
+        """Close the breaker and hand back the locally counted requests."""
+        self.degraded = False
+        return self.memory.drain()
+
+    def reconcile(self, redis: RedisBackend, drained: List[Tuple[str, int, int]]):
+        """Add requests counted in memory to Redis, one pipeline per node."""
+        now = time.time()
+        pipelines = {}
+        try:
+            for key, window, count in drained:
+                client = client_for(redis, key)
+                pipe = pipelines.get(id(client))
+                if pipe is None:
+                    pipe = pipelines[id(client)] = client.pipeline(transaction=False)
+                pipe.zadd(key, {f"{now}:local:{i}": now for i in range(count)})
+                pipe.expire(key, window)
+            for pipe in pipelines.values():
+                pipe.execute()
+        except REDIS_ERRORS as e:
+            logger.error(f"Failed to reconcile local rate limits: {str(e)}")
+        logger.info(f"Rate limiter recovered, reconciled {len(drained)} keys")
+
+    async def guard(
+        self,
+        redis: RedisBackend,
+        redis_call: Callable[[], Awaitable[T]],
+        local_call: Callable[[], T],
+    ) -> T:
+        """Run ``redis_call`` unless degraded, using ``local_call`` on failure."""
+        if not self.should_use_redis():
+            return local_call()
+
+        start = time.perf_counter()
+        try:
+            result = await redis_call()
+        except REDIS_ERRORS as e:
+            self.trip(str(e))
+            return local_call()
+        elapsed = time.perf_counter() - start
+
+        if self.degraded:
+            # Off the event loop, as the first request after an outage may
+            # write up to max_keys counts
+            await asyncio.to_thread(self.reconcile, redis, self.recover())
+        if elapsed > self.latency_threshold:
+            self.trip(f"Redis latency {elapsed * 1000:.1f}ms")
+        return result
+
+
+degraded_limiter = DegradedModeLimiter.from_env()
@@ -0,0 +1,117 @@
+import heapq
+import os
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class HeavyHitter(NamedTuple):
+    key: str
+    count: float
+    # Upper bound on how much of ``count`` was inherited from evicted keys
+    error: float
+
+
+class SpaceSaving:
+    """Space-Saving top-k sketch (Metwally et al.) over at most ``capacity`` keys.
+
+    Any key whose true count exceeds total / capacity is guaranteed to be
+    tracked, and its count is overestimated by at most ``error``.
+
+    The smallest counter is found through a min-heap holding one entry per
+    key. Increments don't touch the heap; an entry found stale at eviction is
+    pushed back with its current count. That makes a flood of new keys cost
+    O(log capacity) per key instead of a scan of every counter.
+    """
+
+    def __init__(self, capacity: int = 100):
+        self.capacity = capacity
+        self._counters: Dict[str, List[float]] = {}
+        # (count, key) per counter; count may lag behind the counter
+        self._heap: List[Tuple[float, str]] = []
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def add(self, key: str, count: float = 1):
+        counter = self._counters.get(key)
+        if counter is not None:
+            counter[0] += count
+            return
+        if len(self._counters) < self.capacity:
+            self._counters[key] = [count, 0]
+            heapq.heappush(self._heap, (count, key))
+            return
+        # Replace the smallest counter, inheriting its count as error
+        floor, victim = self._heap[0]
+        while self._counters[victim][0] > floor:
+            heapq.heapreplace(self._heap, (self._counters[victim][0], victim))
+            floor, victim = self._heap[0]
+        del self._counters[victim]
+        self._counters[key] = [floor + count, floor]
+        heapq.heapreplace(self._heap, (floor + count, key))
+
+    def top(self, n: int = 10) -> List[HeavyHitter]:
+        ranked = sorted(self._counters.items(), key=lambda item: -item[1][0])
+        return [HeavyHitter(key, count, error) for key, (count, error) in ranked[:n]]
+
+    def decay(self, factor: float = 0.5):
+        for counter in self._counters.values():
+            counter[0] *= factor
+            counter[1] *= factor
+        # Scaling every entry keeps the heap ordered
+        self._heap = [(count * factor, key) for count, key in self._heap]
+
+
+class HeavyHitters:
+    """Hottest rate limit keys by checks and by rejections, in bounded memory.
+
+    Counts are halved every ``decay_interval`` seconds so the ranking follows
+    current traffic rather than everything since startup.
+    """
+
+    def __init__(self, capacity: int = 100, decay_interval: float = 60.0):
+        self.checks = SpaceSaving(capacity)
+        self.rejections = SpaceSaving(capacity)
+        self.decay_interval = decay_interval
+        self._last_decay: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> "HeavyHitters":
+        return cls(
+            capacity=int(os.getenv("HEAVY_HITTERS_CAPACITY", "100")),
+            decay_interval=float(os.getenv("HEAVY_HITTERS_DECAY_INTERVAL", "60")),
+        )
+
+    def record(self, key: str, allowed: bool, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if self._last_decay is None:
+            self._last_decay = now
+        elif self.decay_interval and now - self._last_decay >= self.decay_interval:
+            self.checks.decay()
+            self.rejections.decay()
+            self._last_decay = now
+        self.checks.add(key)
+        if not allowed:
+            self.rejections.add(key)
+
+    def snapshot(self, n: int = 10) -> Dict[str, List[HeavyHitter]]:
+        return {"checks": self.checks.top(n), "rejections": self.rejections.top(n)}
+
+    def metrics(self, n: int = 10) -> str:
+        """Top keys in Prometheus text exposition format."""
+        lines = []
+        for name, sketch in (("checks", self.checks), ("rejections", self.rejections)):
+            metric = f"rate_limit_heavy_hitter_{name}"
+            lines.append(f"# HELP {metric} Estimated {name} for the hottest keys")
+            lines.append(f"# TYPE {metric} gauge")
+            for hitter in sketch.top(n):
+                label = (
+                    hitter.key.replace("\\", "\\\\")
+                    .replace('"', '\\"')
+                    .replace("\n", "\\n")
+                )
+                lines.append(f'{metric}{{key="{label}"}} {hitter.count:g}')
+        return "\n".join(lines) + "\n"
+
+
+heavy_hitters = HeavyHitters.from_env()
@@ -0,0 +1,179 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from redis.cluster import RedisCluster
+
+from .fallback import DegradedModeLimiter
+from .heavy_hitters import heavy_hitters
+from .rate_limiter import ACTION_WINDOW
+from .sharding import (KEY_PREFIX, RedisBackend, client_for, hash_tag,
+                       make_key, run_script)
+
+# KEYS: one sorted set per level, outermost first
+# ARGV: now, member, then limit and window for each level
+# Returns {0, ""} when allowed, else {level index (1-based), reset timestamp}
+HIERARCHY_SCRIPT = """
+local now = tonumber(ARGV[1])
+local member = ARGV[2]
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[1 + i * 2])
+    local window = tonumber(ARGV[2 + i * 2])
+    redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        local reset = now + window
+        if oldest[2] then
+            reset = tonumber(oldest[2]) + window
+        end
+        return {i, tostring(reset)}
+    end
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, member)
+    redis.call('EXPIRE', key, math.ceil(tonumber(ARGV[2 + i * 2])))
+end
+return {0, ''}
+"""
+
+
+class LimitLevel(NamedTuple):
+    name: str
+    key: str
+    limit: int
+    window: int
+
+
+class HierarchyResult(NamedTuple):
+    allowed: bool
+    level: Optional[str] = None
+    reset: Optional[float] = None
+
+
+def global_key() -> str:
+    return f"{KEY_PREFIX}:global"
+
+
+def tenant_key(tenant_id: str) -> str:
+    return f"{KEY_PREFIX}:tenant:{{{tenant_id}}}"
+
+
+def user_key(user_id: str) -> str:
+    """All requests of a user, in the same slot as the user's action keys."""
+    return f"{KEY_PREFIX}:user:{{{user_id}}}"
+
+
+def build_levels(
+    user_id: str,
+    action: str,
+    action_limit: int,
+    tenant_id: Optional[str] = None,
+    window: Optional[int] = None,
+) -> List[LimitLevel]:
+    """Build the global -> tenant -> user -> action levels from the environment.
+
+    A level whose limit is 0 (the default for all but ``action``) is skipped.
+    The user and action keys depend only on the user, so leaving out or
+    changing ``tenant_id`` doesn't give a user a fresh quota. The action key
+    is the one ``/check`` uses, so the action level also uses its
+    ``ACTION_WINDOW`` rather than ``window``; trims with two windows on one
+    key would drop requests the other still counts.
+    """
+    window = window or int(os.getenv("RATE_LIMIT_WINDOW", "60"))
+    levels = [
+        LimitLevel(
+            "global", global_key(), int(os.getenv("GLOBAL_RATE_LIMIT", "0")), window
+        )
+    ]
+    if tenant_id:
+        levels.append(
+            LimitLevel(
+                "tenant",
+                tenant_key(tenant_id),
+                int(os.getenv("TENANT_RATE_LIMIT", "0")),
+                window,
+            )
+        )
+    levels.append(
+        LimitLevel(
+            "user", user_key(user_id), int(os.getenv("USER_RATE_LIMIT", "0")), window
+        )
+    )
+    levels.append(
+        LimitLevel("action", make_key(user_id, action), action_limit, ACTION_WINDOW)
+    )
+    return [level for level in levels if level.limit > 0]
+
+
+class HierarchicalRateLimiter:
+    """Evaluate and consume several nested limits together.
+
+    Levels stored on the same node are checked by one script, so with a
+    single Redis a check is one round trip. A level rejected on a later node
+    takes the request back out of the levels that already counted it.
+    """
+
+    def __init__(self, redis: RedisBackend, degraded: DegradedModeLimiter):
+        self.redis = redis
+        self.degraded = degraded
+
+    async def check(self, levels: List[LimitLevel], action: str) -> HierarchyResult:
+        if not levels:
+            return HierarchyResult(allowed=True)
+        result = await self.degraded.guard(
+            self.redis,
+            # The Redis client is synchronous, so it runs off the event loop
+            lambda: asyncio.to_thread(self._check_redis, levels),
+            lambda: self._check_local(levels, action),
+        )
+        heavy_hitters.record(levels[-1].key, result.allowed)
+        return result
+
+    def _groups(self, levels: List[LimitLevel]) -> List[List[int]]:
+        """Indexes of ``levels`` that one script can check together.
+
+        Levels are grouped by the node that owns their key, and on Redis
+        Cluster by slot. Groups are ordered by their outermost level.
+        """
+        groups: Dict[Tuple[int, Optional[str]], List[int]] = {}
+        for i, level in enumerate(levels):
+            client = client_for(self.redis, level.key)
+            slot = hash_tag(level.key) if isinstance(client, RedisCluster) else None
+            groups.setdefault((id(client), slot), []).append(i)
+        return list(groups.values())
+
+    def _check_redis(self, levels: List[LimitLevel]) -> HierarchyResult:
+        now = time.time()
+        member = f"{now}:{uuid.uuid4().hex[:8]}"
+        counted: List[str] = []
+        for group in self._groups(levels):
+            keys = [levels[i].key for i in group]
+            args: list = [now, member]
+            for i in group:
+                args.extend([levels[i].limit, levels[i].window])
+            client = client_for(self.redis, keys[0])
+            index, reset = run_script(client, HIERARCHY_SCRIPT, keys, args)
+            if index:
+                # Take the request back out of the groups that counted it
+                for key in counted:
+                    client_for(self.redis, key).zrem(key, member)
+                return HierarchyResult(
+                    allowed=False,
+                    level=levels[group[index - 1]].name,
+                    reset=float(reset),
+                )
+            counted.extend(keys)
+        return HierarchyResult(allowed=True)
+
+    def _check_local(self, levels: List[LimitLevel], action: str) -> HierarchyResult:
+        entries = [(level.key, level.limit, level.window) for level in levels]
+        index = self.degraded.check_local_many(entries, action)
+        if index is None:
+            return HierarchyResult(allowed=True)
+        return HierarchyResult(
+            allowed=False,
+            level=levels[index].name,
+            reset=time.time() + levels[index].window,
+        )
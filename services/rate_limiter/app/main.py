@@ -2,12 +2,13 @@ import logging
 import os
 from datetime import datetime
 
-import redis
 from fastapi import FastAPI, Request
 from fastapi.exceptions import HTTPException
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from .deps import get_redis
+from .deps import close_redis, get_redis
+from .fallback import degraded_limiter
+from .heavy_hitters import heavy_hitters
 from .routers import rate_limit
 
 # Configure logging
@@ -31,8 +32,14 @@ async def startup():
         r.ping()
         logger.info("Connected to Redis successfully")
     except Exception as e:
+        # Serve from the in-memory fallback until Redis comes back
         logger.error(f"Failed to connect to Redis: {str(e)}")
-        raise
+        degraded_limiter.trip(str(e))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    close_redis()
 
 
 @app.get("/health")
@@ -44,13 +51,24 @@ async def health():
             "status": "healthy",
             "timestamp": datetime.utcnow().isoformat(),
             "redis": "connected",
+            "degraded": degraded_limiter.degraded,
         }
     except Exception as e:
         raise HTTPException(
-            status_code=503, detail={"status": "unhealthy", "redis": "disconnected"}
+            status_code=503,
+            detail={
+                "status": "unhealthy",
+                "redis": "disconnected",
+                "degraded": degraded_limiter.degraded,
+            },
         )
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return heavy_hitters.metrics()
+
+
 @app.get("/")
 def root():
     return {"message": "Rate Limiter Service is running"}
@@ -0,0 +1,147 @@
+"""In-process rate limiting for other services.
+
+Mounting the limiter directly saves the HTTP round trip to
+``/api/v1/rate_limit/check`` on every request. Authenticated callers are
+keyed on their user ID like ``/check?userId=...``, so their limits are shared
+with services that still call the endpoint for the same action::
+
+    app.add_middleware(RateLimitMiddleware, action="api", limit=600)
+
+    @router.post("/login", dependencies=[Depends(RateLimit("login", limit=5))])
+    async def login(...): ...
+"""
+
+import json
+from typing import Callable, Iterable, Optional
+
+from fastapi import HTTPException, Request, Response
+
+from .deps import get_redis
+from .rate_limiter import RateLimitResult, check_limit
+from .sharding import RedisBackend, make_key
+
+Identify = Callable[[dict], str]
+
+
+def identify_client(scope: dict) -> str:
+    """Identify the caller by authenticated user, falling back to client IP.
+
+    The user is the one an authentication middleware running before this one
+    verified and stored in ``scope["user"]``, e.g. Starlette's
+    ``AuthenticationMiddleware``. Unverified credentials are never used: a
+    client sending a new random token with every request would get a fresh
+    quota each time.
+    """
+    user = scope.get("user")
+    if user is not None and user.is_authenticated:
+        try:
+            return user.identity
+        except NotImplementedError:
+            # Starlette's SimpleUser only has a name
+            return user.display_name
+    client = scope.get("client")
+    # Prefixed so an IP can't share a bucket with a user ID
+    return f"ip:{client[0]}" if client else "anonymous"
+
+
+class RateLimitMiddleware:
+    """ASGI middleware applying one sliding-window limit to every request.
+
+    Allowed responses get ``RateLimit-*`` headers; rejected requests are
+    answered with 429 before reaching the application.
+    """
+
+    def __init__(
+        self,
+        app,
+        action: str = "http",
+        limit: int = 60,
+        window: int = 60,
+        identify: Identify = identify_client,
+        exempt_paths: Iterable[str] = ("/health",),
+        redis: Optional[RedisBackend] = None,
+    ):
+        self.app = app
+        self.action = action
+        self.limit = limit
+        self.window = window
+        self.identify = identify
+        self.exempt_paths = set(exempt_paths)
+        self.redis = redis
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+        result = await check_limit(
+            self.redis or next(get_redis()),
+            make_key(self.identify(scope), self.action),
+            self.action,
+            self.limit,
+            self.window,
+        )
+        headers = [
+            (name.lower().encode(), value.encode())
+            for name, value in result.headers().items()
+        ]
+
+        if not result.allowed:
+            body = json.dumps({"detail": "Too many requests"}).encode()
+            await send(
+                {
+                    "type": "http.response.start",
+                    "status": 429,
+                    "headers": [
+                        (b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode()),
+                        *headers,
+                    ],
+                }
+            )
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                # A stricter per-route ``RateLimit`` dependency reports its own
+                existing = {name.lower() for name, _ in message["headers"]}
+                extra = [header for header in headers if header[0] not in existing]
+                message = {**message, "headers": [*message["headers"], *extra]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RateLimit:
+    """FastAPI dependency enforcing a per-route limit.
+
+    The caller is identified by ``identify`` (authenticated user or client IP
+    by default); routes that know the user can pass ``identify`` to key on it.
+    """
+
+    def __init__(
+        self,
+        action: str,
+        limit: int = 60,
+        window: int = 60,
+        identify: Identify = identify_client,
+    ):
+        self.action = action
+        self.limit = limit
+        self.window = window
+        self.identify = identify
+
+    async def __call__(self, request: Request, response: Response) -> RateLimitResult:
+        result = await check_limit(
+            next(get_redis()),
+            make_key(self.identify(request.scope), self.action),
+            self.action,
+            self.limit,
+            self.window,
+        )
+        if not result.allowed:
+            raise HTTPException(
+                status_code=429, detail="Too many requests", headers=result.headers()
+            )
+        response.headers.update(result.headers())
+        return result
@@ -1,53 +1,121 @@
+import asyncio
 import time
-from typing import Optional
+import uuid
+from typing import Dict, NamedTuple, Optional
 
-import redis
 from fastapi import HTTPException, Request
-from fastapi.responses import JSONResponse
+
+from .fallback import degraded_limiter
+from .heavy_hitters import heavy_hitters
+from .sharding import RedisBackend, client_for, make_key, run_script
+
+# Window in seconds of per-action limits. /check and the hierarchy's action
+# level count in the same key, and both trim it by this window.
+ACTION_WINDOW = 60
+
+# Sliding window log in one round trip.
+# KEYS[1]: sorted set of request timestamps. ARGV: now, window, limit, member
+# Returns {allowed, remaining, reset timestamp}
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('EXPIRE', KEYS[1], math.ceil(window))
+    count = count + 1
+    allowed = 1
+end
+local reset = now + window
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window
+end
+return {allowed, math.max(limit - count, 0), tostring(reset)}
+"""
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    limit: int
+    remaining: int
+    reset: float
+
+    def headers(self) -> Dict[str, str]:
+        """Rate limit headers as in the IETF ``RateLimit`` header draft."""
+        reset_after = max(0, int(self.reset - time.time() + 0.999))
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(reset_after),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, reset_after))
+        return headers
 
 
 class RateLimiter:
-    def __init__(self, redis: redis.Redis, limit: int = 60, window: int = 60):
+    def __init__(self, redis: RedisBackend, limit: int = 60, window: int = 60):
         self.redis = redis
         self.limit = limit
         self.window = window
 
-    async def check_rate_limit(self, key: str) -> bool:
+    async def hit(self, key: str) -> RateLimitResult:
         current_time = time.time()
-        window_start = current_time - self.window
+        member = f"{current_time}:{uuid.uuid4().hex[:8]}"
+        # The Redis client is synchronous, so it runs off the event loop
+        allowed, remaining, reset = await asyncio.to_thread(
+            run_script,
+            client_for(self.redis, key),
+            SLIDING_WINDOW_SCRIPT,
+            [key],
+            [current_time, self.window, self.limit, member],
+        )
+        return RateLimitResult(bool(allowed), self.limit, remaining, float(reset))
+
+    async def check_rate_limit(self, key: str) -> bool:
+        return (await self.hit(key)).allowed
 
-        # Remove old requests
-        self.redis.zremrangebyscore(key, 0, window_start)
 
-        # Count requests in current window
-        request_count = self.redis.zcard(key)
+async def check_limit(
+    redis: RedisBackend, key: str, action: str, limit: int, window: int = 60
+) -> RateLimitResult:
+    """Count one request against ``key``, falling back to memory if degraded."""
+    limiter = RateLimiter(redis, limit=limit, window=window)
 
-        if request_count >= self.limit:
-            return False
+    def local() -> RateLimitResult:
+        allowed = degraded_limiter.check_local(key, action, limit, window)
+        used = degraded_limiter.memory.count(key)
+        return RateLimitResult(
+            allowed, limit, max(limit - used, 0), time.time() + window
+        )
 
-        # Add current request
-        self.redis.zadd(key, {str(current_time): current_time})
-        self.redis.expire(key, self.window)
-        return True
+    result = await degraded_limiter.guard(redis, lambda: limiter.hit(key), local)
+    heavy_hitters.record(key, result.allowed)
+    return result
 
 
 async def rate_limit_middleware(
     request: Request,
-    redis: redis.Redis,
+    redis: RedisBackend,
     user_id: str,
     action: str,
     limit: Optional[int] = None,
 ):
-    limiter = RateLimiter(
-        redis, limit=limit or int(request.app.state.default_rate_limit), window=60
+    result = await check_limit(
+        redis,
+        make_key(user_id, action),
+        action,
+        limit or int(request.app.state.default_rate_limit),
+        window=ACTION_WINDOW,
     )
 
-    key = f"rate_limit:{user_id}:{action}"
-    allowed = await limiter.check_rate_limit(key)
-
-    if not allowed:
+    if not result.allowed:
         raise HTTPException(
             status_code=429,
             detail="Too many requests",
-            headers={"Retry-After": str(60)},
+            headers=result.headers(),
         )
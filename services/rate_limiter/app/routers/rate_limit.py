@@ -1,21 +1,45 @@
 import logging
+import math
+import os
+import time
+from typing import Optional
 
-from fastapi import APIRouter, Depends, Query, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import JSONResponse
 
+from ..concurrency import (CONCURRENCY_FAILURE_MODES, ConcurrencyLimiter,
+                           make_concurrency_key)
 from ..deps import get_redis
+from ..fallback import degraded_limiter
+from ..heavy_hitters import heavy_hitters
+from ..hierarchy import HierarchicalRateLimiter, build_levels
 from ..rate_limiter import rate_limit_middleware
+from ..sharding import RedisBackend
 
 router = APIRouter(prefix="/api/v1/rate_limit", tags=["rate_limit"])
 logger = logging.getLogger(__name__)
 
+DEFAULT_CONCURRENCY_LIMIT = int(os.getenv("DEFAULT_CONCURRENCY_LIMIT", "10"))
+DEFAULT_LEASE_TTL = int(os.getenv("DEFAULT_LEASE_TTL", "30"))
+CONCURRENCY_FAILURE_MODE = os.getenv("CONCURRENCY_FAILURE_MODE", "closed").lower()
+if CONCURRENCY_FAILURE_MODE not in CONCURRENCY_FAILURE_MODES:
+    raise ValueError(f"Invalid CONCURRENCY_FAILURE_MODE {CONCURRENCY_FAILURE_MODE!r}")
+
+
+def _concurrency_key(
+    scope: str = Query(..., regex="^(user|tenant)$", description="user or tenant"),
+    scopeId: str = Query(..., description="User or tenant ID holding the slot"),
+    resource: str = Query(..., description="Backend being protected, e.g. llm"),
+) -> str:
+    return make_concurrency_key(scope, scopeId, resource)
+
 
 @router.get("/check")
 async def check_rate_limit(
     request: Request,
     userId: str = Query(..., description="User ID to check"),
     action: str = Query(..., description="Action being performed"),
-    redis: redis.Redis = Depends(get_redis),
+    redis: RedisBackend = Depends(get_redis),
 ):
     try:
         await rate_limit_middleware(request, redis, userId, action)
@@ -28,5 +52,109 @@ async def check_rate_limit(
             return JSONResponse(
                 status_code=429,
                 content={"allowed": False, "message": "Rate limit exceeded"},
+                headers=e.headers,
             )
         raise
+
+
+@router.get("/check/hierarchy")
+async def check_hierarchical_rate_limit(
+    request: Request,
+    userId: str = Query(..., description="User ID to check"),
+    action: str = Query(..., description="Action being performed"),
+    tenantId: Optional[str] = Query(None, description="Tenant the user belongs to"),
+    redis: RedisBackend = Depends(get_redis),
+):
+    levels = build_levels(
+        userId,
+        action,
+        int(request.app.state.default_rate_limit),
+        tenant_id=tenantId,
+    )
+    limiter = HierarchicalRateLimiter(redis, degraded_limiter)
+    result = await limiter.check(levels, action)
+    if result.allowed:
+        return JSONResponse(
+            status_code=200, content={"allowed": True, "message": "Request allowed"}
+        )
+
+    logger.warning(
+        f"{result.level} rate limit exceeded for user {userId}, action {action}"
+    )
+    retry_after = max(1, math.ceil(result.reset - time.time()))
+    return JSONResponse(
+        status_code=429,
+        content={
+            "allowed": False,
+            "message": "Rate limit exceeded",
+            "level": result.level,
+            "reset": result.reset,
+        },
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@router.post("/concurrency/acquire")
+async def acquire_concurrency_slot(
+    key: str = Depends(_concurrency_key),
+    limit: int = Query(DEFAULT_CONCURRENCY_LIMIT, ge=0, description="Max in flight"),
+    ttl: int = Query(DEFAULT_LEASE_TTL, gt=0, description="Lease TTL in seconds"),
+    redis: RedisBackend = Depends(get_redis),
+):
+    lease = await ConcurrencyLimiter(
+        redis, limit=limit, ttl=ttl, failure_mode=CONCURRENCY_FAILURE_MODE
+    ).acquire(key)
+    if lease.acquired:
+        return JSONResponse(
+            status_code=200,
+            content={
+                "acquired": True,
+                "leaseId": lease.lease_id,
+                "expiresAt": lease.expires_at,
+            },
+        )
+
+    logger.warning(f"Concurrency limit reached for {key}")
+    retry_after = 1
+    if lease.expires_at:
+        retry_after = max(1, math.ceil(lease.expires_at - time.time()))
+    return JSONResponse(
+        status_code=429,
+        content={"acquired": False, "message": "Concurrency limit exceeded"},
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+@router.post("/concurrency/renew")
+async def renew_concurrency_slot(
+    leaseId: str = Query(..., description="Lease returned by acquire"),
+    key: str = Depends(_concurrency_key),
+    ttl: int = Query(DEFAULT_LEASE_TTL, gt=0, description="Lease TTL in seconds"),
+    redis: RedisBackend = Depends(get_redis),
+):
+    if not await ConcurrencyLimiter(
+        redis, ttl=ttl, failure_mode=CONCURRENCY_FAILURE_MODE
+    ).renew(key, leaseId):
+        raise HTTPException(status_code=404, detail="Lease not found or expired")
+    return {"renewed": True, "leaseId": leaseId}
+
+
+@router.post("/concurrency/release")
+async def release_concurrency_slot(
+    leaseId: str = Query(..., description="Lease returned by acquire"),
+    key: str = Depends(_concurrency_key),
+    redis: RedisBackend = Depends(get_redis),
+):
+    released = await ConcurrencyLimiter(redis).release(key, leaseId)
+    return {"released": released}
+
+
+@router.get("/admin/heavy_hitters")
+async def get_heavy_hitters(
+    top: int = Query(10, ge=1, le=1000, description="Number of keys to return"),
+):
+    snapshot = heavy_hitters.snapshot(top)
+    return {
+        name: [hitter._asdict() for hitter in hitters]
+        for name, hitters in snapshot.items()
+    }
@@ -0,0 +1,99 @@
+import bisect
+import hashlib
+from typing import Dict, List, Sequence, Union
+
+import redis
+from redis.cluster import RedisCluster
+from redis.commands.core import Script
+
+KEY_PREFIX = "rate_limit"
+
+
+def make_key(user_id: str, action: str) -> str:
+    """Build a rate limit key whose hash tag is the user ID.
+
+    Redis Cluster (and ``ShardedRedis``) only hash the part between the first
+    ``{`` and ``}``, so every key belonging to one user lands on the same node
+    and can be touched together by a multi-key script.
+    """
+    return f"{KEY_PREFIX}:{{{user_id}}}:{action}"
+
+
+def hash_tag(key: str) -> str:
+    """Return the part of ``key`` used for slot/node selection."""
+    start = key.find("{")
+    if start != -1:
+        end = key.find("}", start + 1)
+        if end > start + 1:
+            return key[start + 1 : end]
+    return key
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """Consistent hash ring mapping keys onto a fixed set of nodes."""
+
+    def __init__(self, nodes: Sequence[str], replicas: int = 160):
+        if not nodes:
+            raise ValueError("HashRing requires at least one node")
+        self.nodes = list(nodes)
+        self.replicas = replicas
+        self._ring: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in self.nodes:
+            for i in range(replicas):
+                point = _hash(f"{node}#{i}")
+                self._owners[point] = node
+                bisect.insort(self._ring, point)
+
+    def get_node(self, key: str) -> str:
+        index = bisect.bisect(self._ring, _hash(key)) % len(self._ring)
+        return self._owners[self._ring[index]]
+
+
+class ShardedRedis:
+    """Client-side consistent hashing across several standalone Redis nodes."""
+
+    def __init__(self, urls: Sequence[str], replicas: int = 160, **kwargs):
+        self.ring = HashRing(urls, replicas=replicas)
+        self.clients: Dict[str, redis.Redis] = {
+            url: redis.Redis.from_url(url, **kwargs) for url in self.ring.nodes
+        }
+
+    def get_client(self, key: str) -> redis.Redis:
+        return self.clients[self.ring.get_node(hash_tag(key))]
+
+    def ping(self) -> bool:
+        return all(client.ping() for client in self.clients.values())
+
+    def close(self):
+        for client in self.clients.values():
+            client.close()
+
+
+RedisBackend = Union[redis.Redis, RedisCluster, ShardedRedis]
+
+
+def client_for(backend: RedisBackend, key: str) -> Union[redis.Redis, RedisCluster]:
+    """Resolve the client that owns ``key``.
+
+    Standalone Redis and Redis Cluster route keys themselves; only
+    ``ShardedRedis`` needs to pick a node on the client side.
+    """
+    if isinstance(backend, ShardedRedis):
+        return backend.get_client(key)
+    return backend
+
+
+_scripts: Dict[str, Script] = {}
+
+
+def run_script(client, source: str, keys: Sequence[str], args: Sequence):
+    """Run a Lua script via EVALSHA, loading it on first use per node."""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = client.register_script(source)
+    return script(keys=keys, args=args, client=client)
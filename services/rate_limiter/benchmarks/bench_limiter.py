@@ -0,0 +1,308 @@
+"""Benchmark suite for the rate limiter algorithms.
+
+Runs every algorithm mode through a set of traffic scenarios against a locally
+spawned ``redis-server`` (``--redis-server``) or an in-process fake, and
+reports checks/sec, p50/p99 latency, Redis round trips and server-side
+commands per check, and memory per key.
+
+    python -m benchmarks.bench_limiter --save baseline.json
+    python -m benchmarks.bench_limiter --baseline baseline.json
+
+With ``--baseline`` the run exits non-zero when any result regresses past
+``--tolerance`` so it can gate changes to ``RateLimiter``.
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import threading
+import time
+from contextlib import ExitStack
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+import redis
+from app.concurrency import ConcurrencyLimiter, make_concurrency_key
+from app.fallback import DegradedModeLimiter, MemoryRateLimiter
+from app.hierarchy import (HierarchicalRateLimiter, LimitLevel, tenant_key,
+                           user_key)
+from app.rate_limiter import RateLimiter
+from app.sharding import make_key
+
+from .common import CommandCounter, has_redis_server, redis_servers
+
+MODES = ("sliding_window", "hierarchy", "concurrency", "memory")
+
+
+class Scenario(NamedTuple):
+    name: str
+    keys: int
+    limit: int
+    clients: int = 1
+
+
+SCENARIOS = (
+    # One user hammering one action; most checks end up rejected
+    Scenario("hot_key", keys=1, limit=1000),
+    # Many users touching their key once or twice
+    Scenario("cold_keys", keys=10_000, limit=60),
+    # One key whose window holds every request
+    Scenario("high_limit", keys=1, limit=10_000_000),
+    Scenario("concurrent", keys=10_000, limit=60, clients=8),
+)
+
+
+class Result(NamedTuple):
+    mode: str
+    scenario: str
+    checks_per_sec: float
+    p50_ms: float
+    p99_ms: float
+    round_trips_per_check: float
+    server_commands_per_check: Optional[float]
+    bytes_per_key: Optional[float]
+
+
+def _make_check(mode: str, client, limit: int) -> Callable[[int], Awaitable]:
+    """Return a coroutine function performing one check for key number ``i``."""
+    if mode == "sliding_window":
+        limiter = RateLimiter(client, limit=limit, window=60)
+        return lambda i: limiter.hit(make_key(f"user{i}", "bench"))
+    if mode == "hierarchy":
+        limiter = HierarchicalRateLimiter(
+            client, DegradedModeLimiter(latency_threshold=float("inf"))
+        )
+
+        def check(i: int):
+            levels = [
+                LimitLevel("tenant", tenant_key(f"tenant{i % 10}"), limit * 100, 60),
+                LimitLevel("user", user_key(f"user{i}"), limit, 60),
+                LimitLevel("action", make_key(f"user{i}", "bench"), limit, 60),
+            ]
+            return limiter.check(levels, "bench")
+
+        return check
+    if mode == "concurrency":
+        limiter = ConcurrencyLimiter(client, limit=limit, ttl=30)
+
+        async def acquire_release(i: int):
+            key = make_concurrency_key("user", f"user{i}", "bench")
+            lease = await limiter.acquire(key)
+            if lease.acquired:
+                await limiter.release(key, lease.lease_id)
+
+        return acquire_release
+    if mode == "memory":
+        memory = MemoryRateLimiter(max_keys=100_000)
+
+        async def check_memory(i: int):
+            return memory.check(make_key(f"user{i}", "bench"), limit, 60)
+
+        return check_memory
+    raise ValueError(f"Unknown mode {mode!r}")
+
+
+def _sample_keys(mode: str, keys: int) -> List[str]:
+    sample = range(min(keys, 100))
+    if mode == "hierarchy":
+        return [tenant_key(f"tenant{i % 10}") for i in sample]
+    if mode == "concurrency":
+        return [make_concurrency_key("user", f"user{i}", "bench") for i in sample]
+    return [make_key(f"user{i}", "bench") for i in sample]
+
+
+def _server_commands(client) -> Optional[int]:
+    try:
+        stats = client.info("commandstats")
+    except redis.ResponseError:
+        return None
+    return sum(
+        entry["calls"]
+        for name, entry in stats.items()
+        if name not in ("cmdstat_info", "cmdstat_memory")
+    )
+
+
+def _bytes_per_key(client, keys: List[str]) -> Optional[float]:
+    try:
+        sizes = [client.memory_usage(key) for key in keys]
+    except redis.ResponseError:
+        return None
+    sizes = [size for size in sizes if size]
+    return statistics.mean(sizes) if sizes else None
+
+
+def run_scenario(
+    mode: str,
+    scenario: Scenario,
+    new_client: Callable[[], redis.Redis],
+    checks: int,
+) -> Result:
+    admin = new_client()
+    admin.flushall()
+    commands_before = _server_commands(admin)
+
+    per_client = checks // scenario.clients
+    latencies: List[List[float]] = [[] for _ in range(scenario.clients)]
+    counters: List[CommandCounter] = []
+
+    def worker(index: int):
+        client = new_client()
+        counter = CommandCounter(client)
+        counters.append(counter)
+        check = _make_check(mode, client, scenario.limit)
+        samples = latencies[index]
+        offset = index * per_client
+
+        async def run():
+            # Warm up on a key outside the scenario so script loads aren't counted
+            await check(scenario.keys)
+            counter.count = 0
+            for n in range(per_client):
+                start = time.perf_counter()
+                await check((offset + n) % scenario.keys)
+                samples.append(time.perf_counter() - start)
+
+        asyncio.run(run())
+
+    threads = [
+        threading.Thread(target=worker, args=(i,)) for i in range(scenario.clients)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    done = per_client * scenario.clients
+    merged = sorted(sample for samples in latencies for sample in samples)
+    commands_after = _server_commands(admin)
+    server_commands = None
+    if commands_before is not None and commands_after is not None:
+        server_commands = (commands_after - commands_before) / done
+
+    return Result(
+        mode=mode,
+        scenario=scenario.name,
+        checks_per_sec=done / elapsed,
+        p50_ms=merged[len(merged) // 2] * 1000,
+        p99_ms=merged[int(len(merged) * 0.99)] * 1000,
+        round_trips_per_check=sum(counter.count for counter in counters) / done,
+        server_commands_per_check=server_commands,
+        bytes_per_key=_bytes_per_key(admin, _sample_keys(mode, scenario.keys)),
+    )
+
+
+def run_suite(
+    new_client: Callable[[], redis.Redis],
+    checks: int = 5000,
+    modes=MODES,
+    scenarios=SCENARIOS,
+) -> List[Result]:
+    return [
+        run_scenario(mode, scenario, new_client, checks)
+        for mode in modes
+        for scenario in scenarios
+    ]
+
+
+def compare(
+    results: List[Result], baseline: Dict[str, dict], tolerance: float
+) -> List[str]:
+    """Describe every result that regressed against ``baseline``."""
+    regressions = []
+    for result in results:
+        before = baseline.get(f"{result.mode}/{result.scenario}")
+        if before is None:
+            continue
+        name = f"{result.mode}/{result.scenario}"
+        if result.checks_per_sec < before["checks_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result.checks_per_sec:.0f} checks/sec, "
+                f"baseline {before['checks_per_sec']:.0f}"
+            )
+        if result.p99_ms > before["p99_ms"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: p99 {result.p99_ms:.3f}ms, baseline {before['p99_ms']:.3f}ms"
+            )
+        if result.round_trips_per_check > before["round_trips_per_check"]:
+            regressions.append(
+                f"{name}: {result.round_trips_per_check:.2f} round trips/check, "
+                f"baseline {before['round_trips_per_check']:.2f}"
+            )
+    return regressions
+
+
+def _format(value: Optional[float], spec: str) -> str:
+    return "n/a" if value is None else format(value, spec)
+
+
+def print_results(results: List[Result]):
+    header = (
+        f"{'mode':<15} {'scenario':<11} {'checks/s':>10} {'p50 ms':>8} "
+        f"{'p99 ms':>8} {'trips':>6} {'cmds':>6} {'B/key':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r.mode:<15} {r.scenario:<11} {r.checks_per_sec:>10.0f} "
+            f"{r.p50_ms:>8.3f} {r.p99_ms:>8.3f} {r.round_trips_per_check:>6.2f} "
+            f"{_format(r.server_commands_per_check, '.2f'):>6} "
+            f"{_format(r.bytes_per_key, '.0f'):>8}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--checks", type=int, default=5000)
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument(
+        "--redis-server",
+        action="store_true",
+        help="Spawn a local redis-server instead of using an in-process fake",
+    )
+    parser.add_argument("--base-port", type=int, default=7500)
+    parser.add_argument("--save", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Fail on regressions against this file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    with ExitStack() as stack:
+        if args.redis_server:
+            if not has_redis_server():
+                raise SystemExit("redis-server not found")
+            (url,) = stack.enter_context(redis_servers(1, args.base_port))
+
+            def new_client() -> redis.Redis:
+                return redis.Redis.from_url(url)
+
+        else:
+            import fakeredis
+
+            server = fakeredis.FakeServer()
+
+            def new_client() -> redis.Redis:
+                return fakeredis.FakeRedis(server=server)
+
+        results = run_suite(new_client, args.checks, args.modes.split(","))
+
+    print_results(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(
+                {f"{r.mode}/{r.scenario}": r._asdict() for r in results}, f, indent=2
+            )
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
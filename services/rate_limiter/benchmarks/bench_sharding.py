@@ -0,0 +1,84 @@
+"""Throughput of the rate limiter as the Redis key space is sharded.
+
+Spawns ``redis-server`` processes on consecutive ports (or uses the URLs given
+with ``--urls``) and drives ``RateLimiter.check_rate_limit`` from several
+worker processes, once per node count, so the scaling from one Redis core to
+many is visible.
+
+    python -m benchmarks.bench_sharding --max-nodes 4 --workers 8
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import time
+from typing import List
+
+from app.rate_limiter import RateLimiter
+from app.sharding import ShardedRedis, make_key
+
+from .common import redis_servers
+
+
+def _worker(urls: List[str], worker_id: int, users: int, duration: float, queue):
+    backend = ShardedRedis(urls)
+    limiter = RateLimiter(backend, limit=1_000_000, window=60)
+
+    async def run() -> int:
+        checks = 0
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            user_id = f"w{worker_id}-u{checks % users}"
+            await limiter.check_rate_limit(make_key(user_id, "bench"))
+            checks += 1
+        return checks
+
+    queue.put(asyncio.run(run()))
+    backend.close()
+
+
+def measure(urls: List[str], workers: int, users: int, duration: float) -> float:
+    for client in ShardedRedis(urls).clients.values():
+        client.flushall()
+    queue: multiprocessing.Queue = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=_worker, args=(urls, i, users, duration, queue))
+        for i in range(workers)
+    ]
+    for proc in procs:
+        proc.start()
+    total = sum(queue.get() for _ in procs)
+    for proc in procs:
+        proc.join()
+    return total / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--max-nodes", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--base-port", type=int, default=7400)
+    parser.add_argument(
+        "--urls", help="Comma-separated existing Redis nodes instead of spawning"
+    )
+    args = parser.parse_args()
+
+    print(f"{'nodes':>5}  {'checks/sec':>12}  {'speedup':>7}")
+    baseline = None
+    for count in range(1, args.max_nodes + 1):
+        if args.urls:
+            available = args.urls.split(",")
+            if count > len(available):
+                break
+            rate = measure(available[:count], args.workers, args.users, args.duration)
+        else:
+            with redis_servers(count, args.base_port) as urls:
+                rate = measure(urls, args.workers, args.users, args.duration)
+        baseline = baseline or rate
+        print(f"{count:>5}  {rate:>12.0f}  {rate / baseline:>6.2f}x")
+
+
+if __name__ == "__main__":
+    main()
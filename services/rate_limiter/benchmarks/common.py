@@ -0,0 +1,66 @@
+"""Shared helpers for the rate limiter benchmarks."""
+
+import shutil
+import subprocess
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import redis
+
+
+def has_redis_server() -> bool:
+    return shutil.which("redis-server") is not None
+
+
+@contextmanager
+def redis_servers(count: int, base_port: int) -> Iterator[List[str]]:
+    if not has_redis_server():
+        raise SystemExit("redis-server not found; pass --urls instead")
+    procs = []
+    urls = []
+    try:
+        for port in range(base_port, base_port + count):
+            procs.append(
+                subprocess.Popen(
+                    [
+                        "redis-server",
+                        "--port",
+                        str(port),
+                        "--save",
+                        "",
+                        "--appendonly",
+                        "no",
+                    ],
+                    stdout=subprocess.DEVNULL,
+                )
+            )
+            urls.append(f"redis://127.0.0.1:{port}")
+        for url in urls:
+            client = redis.Redis.from_url(url)
+            for _ in range(50):
+                try:
+                    client.ping()
+                    break
+                except redis.ConnectionError:
+                    time.sleep(0.1)
+            client.close()
+        yield urls
+    finally:
+        for proc in procs:
+            proc.terminate()
+            proc.wait()
+
+
+class CommandCounter:
+    """Count round trips made through ``client`` by wrapping ``execute_command``."""
+
+    def __init__(self, client):
+        self.count = 0
+        original = client.execute_command
+
+        def execute_command(*args, **kwargs):
+            self.count += 1
+            return original(*args, **kwargs)
+
+        client.execute_command = execute_command
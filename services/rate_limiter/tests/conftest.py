@@ -0,0 +1,18 @@
+import fakeredis
+import pytest
+from app.fallback import MemoryRateLimiter, degraded_limiter
+
+
+@pytest.fixture
+def redis_client():
+    client = fakeredis.FakeRedis()
+    yield client
+    client.flushall()
+
+
+@pytest.fixture(autouse=True)
+def reset_degraded_limiter(monkeypatch):
+    # Slow first script loads in the fake must not trip the shared breaker
+    monkeypatch.setattr(degraded_limiter, "latency_threshold", 10.0)
+    monkeypatch.setattr(degraded_limiter, "degraded", False)
+    monkeypatch.setattr(degraded_limiter, "memory", MemoryRateLimiter())
@@ -0,0 +1,33 @@
+import fakeredis
+import pytest
+from benchmarks.bench_limiter import SCENARIOS, compare, run_suite
+
+
+@pytest.fixture(scope="module")
+def results():
+    server = fakeredis.FakeServer()
+    results = run_suite(lambda: fakeredis.FakeRedis(server=server), checks=200)
+    return {(r.mode, r.scenario): r for r in results}
+
+
+@pytest.mark.parametrize("scenario", [s.name for s in SCENARIOS])
+@pytest.mark.parametrize(
+    "mode, round_trips",
+    [("sliding_window", 1), ("hierarchy", 1), ("concurrency", 2), ("memory", 0)],
+)
+def test_round_trips_per_check(results, mode, scenario, round_trips):
+    assert results[(mode, scenario)].round_trips_per_check == round_trips
+
+
+def test_compare_flags_regressions(results):
+    result = results[("sliding_window", "hot_key")]
+    baseline = {
+        "sliding_window/hot_key": {
+            **result._asdict(),
+            "checks_per_sec": result.checks_per_sec * 2,
+            "round_trips_per_check": 0.5,
+        }
+    }
+    regressions = compare([result], baseline, tolerance=0.2)
+    assert len(regressions) == 2
+    assert compare([result], {"sliding_window/hot_key": result._asdict()}, 0.2) == []
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+from app.concurrency import ConcurrencyLimiter, make_concurrency_key
+from app.fallback import FAIL_OPEN, degraded_limiter
+
+KEY = make_concurrency_key("user", "u1", "llm")
+
+
+def test_acquire_up_to_limit(redis_client):
+    limiter = ConcurrencyLimiter(redis_client, limit=2, ttl=30)
+    first = asyncio.run(limiter.acquire(KEY))
+    second = asyncio.run(limiter.acquire(KEY))
+    third = asyncio.run(limiter.acquire(KEY))
+    assert first.acquired and second.acquired
+    assert first.lease_id != second.lease_id
+    assert not third.acquired
+    assert abs(third.expires_at - first.expires_at) < 0.01
+
+
+def test_release_frees_slot(redis_client):
+    limiter = ConcurrencyLimiter(redis_client, limit=1, ttl=30)
+    lease = asyncio.run(limiter.acquire(KEY))
+    assert asyncio.run(limiter.release(KEY, lease.lease_id))
+    assert not asyncio.run(limiter.release(KEY, lease.lease_id))
+    assert asyncio.run(limiter.acquire(KEY)).acquired
+
+
+def test_expired_lease_is_reclaimed(redis_client):
+    limiter = ConcurrencyLimiter(redis_client, limit=1, ttl=30)
+    lease = asyncio.run(limiter.acquire(KEY))
+    # Simulate a holder that crashed long ago
+    redis_client.zadd(KEY, {lease.lease_id: time.time() - 1})
+    assert asyncio.run(limiter.in_flight(KEY)) == 0
+    assert not asyncio.run(limiter.renew(KEY, lease.lease_id))
+    assert asyncio.run(limiter.acquire(KEY)).acquired
+
+
+def test_renew_extends_lease(redis_client):
+    limiter = ConcurrencyLimiter(redis_client, limit=1, ttl=30)
+    lease = asyncio.run(limiter.acquire(KEY))
+    assert asyncio.run(
+        ConcurrencyLimiter(redis_client, ttl=300).renew(KEY, lease.lease_id)
+    )
+    assert redis_client.zscore(KEY, lease.lease_id) > lease.expires_at
+
+
+def test_short_leases_never_shorten_the_key_expiry(redis_client):
+    long_lease = asyncio.run(
+        ConcurrencyLimiter(redis_client, limit=2, ttl=300).acquire(KEY)
+    )
+    short = ConcurrencyLimiter(redis_client, limit=2, ttl=1)
+    short_lease = asyncio.run(short.acquire(KEY))
+    assert asyncio.run(short.renew(KEY, short_lease.lease_id))
+    assert redis_client.pttl(KEY) > 299000
+
+    # The long lease still holds its slot once the short one has expired
+    time.sleep(1.1)
+    assert asyncio.run(short.in_flight(KEY)) == 1
+    assert asyncio.run(short.acquire(KEY)).acquired
+    assert not asyncio.run(short.acquire(KEY)).acquired
+    assert redis_client.zscore(KEY, long_lease.lease_id)
+
+
+def test_fails_closed_or_open_while_redis_is_down():
+    server = fakeredis.FakeServer()
+    server.connected = False
+    redis_client = fakeredis.FakeRedis(server=server)
+
+    closed = ConcurrencyLimiter(redis_client, limit=1, ttl=30)
+    assert asyncio.run(closed.acquire(KEY)) == (False, None, None)
+    assert degraded_limiter.degraded
+    assert not asyncio.run(closed.renew(KEY, "lease"))
+    assert not asyncio.run(closed.release(KEY, "lease"))
+
+    open_ = ConcurrencyLimiter(redis_client, limit=1, ttl=30, failure_mode=FAIL_OPEN)
+    assert all(asyncio.run(open_.acquire(KEY)).acquired for _ in range(3))
+    assert asyncio.run(open_.renew(KEY, "lease"))
+
+    with pytest.raises(ValueError):
+        ConcurrencyLimiter(redis_client, failure_mode="local")
@@ -0,0 +1,123 @@
+import asyncio
+
+import fakeredis
+import pytest
+from app import rate_limiter
+from app.fallback import (FAIL_CLOSED, FAIL_OPEN, DegradedModeLimiter,
+                          MemoryRateLimiter, degraded_limiter,
+                          parse_failure_modes)
+from app.rate_limiter import check_limit
+from app.sharding import ShardedRedis, make_key
+from redis.client import Pipeline
+from redis.exceptions import RedisClusterException
+
+
+def test_memory_limiter_enforces_limit():
+    memory = MemoryRateLimiter()
+    results = [memory.check("k", limit=3, window=60, now=0) for _ in range(5)]
+    assert results == [True, True, True, False, False]
+
+
+def test_memory_limiter_slides_into_next_window():
+    memory = MemoryRateLimiter()
+    for _ in range(4):
+        memory.check("k", limit=4, window=60, now=0)
+    # Halfway through the next window half of the previous count still applies
+    assert memory.check("k", limit=4, window=60, now=90)
+    assert memory.check("k", limit=4, window=60, now=90)
+    assert not memory.check("k", limit=4, window=60, now=90)
+
+
+def test_memory_limiter_evicts_least_recently_used():
+    memory = MemoryRateLimiter(max_keys=2)
+    memory.check("a", limit=1, window=60, now=0)
+    memory.check("b", limit=1, window=60, now=0)
+    memory.check("a", limit=1, window=60, now=0)
+    memory.check("c", limit=1, window=60, now=0)
+    assert len(memory) == 2
+    # "b" was evicted, so it starts with a fresh quota
+    assert memory.check("b", limit=1, window=60, now=0)
+
+
+def test_parse_failure_modes():
+    assert parse_failure_modes("login:closed, search:open") == {
+        "login": FAIL_CLOSED,
+        "search": FAIL_OPEN,
+    }
+    with pytest.raises(ValueError):
+        parse_failure_modes("login:maybe")
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture
+def redis_client(server):
+    return fakeredis.FakeRedis(server=server)
+
+
+def check(redis_client, action, limit):
+    key = make_key("u1", action)
+    return asyncio.run(check_limit(redis_client, key, action, limit)).allowed
+
+
+def test_falls_back_to_memory_when_redis_fails(server, redis_client):
+    server.connected = False
+    assert [check(redis_client, "upload", 2) for _ in range(3)] == [True, True, False]
+    assert degraded_limiter.degraded
+
+
+def test_failure_mode_per_action(server, redis_client, monkeypatch):
+    server.connected = False
+    monkeypatch.setattr(degraded_limiter, "action_modes", {"login": FAIL_CLOSED})
+    assert not check(redis_client, "login", 100)
+
+    monkeypatch.setattr(degraded_limiter, "default_mode", FAIL_OPEN)
+    assert check(redis_client, "read", 0)
+
+
+def test_cluster_errors_engage_the_fallback(redis_client, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise RedisClusterException("Cluster is unreachable")
+
+    monkeypatch.setattr(rate_limiter, "run_script", unreachable)
+    assert check(redis_client, "upload", 1)
+    assert not check(redis_client, "upload", 1)
+    assert degraded_limiter.degraded
+
+
+def test_recovery_reconciles_local_counts(server, redis_client, monkeypatch):
+    monkeypatch.setattr(degraded_limiter, "retry_interval", 0)
+    server.connected = False
+    check(redis_client, "upload", 3)
+    check(redis_client, "upload", 3)
+
+    server.connected = True
+    assert check(redis_client, "upload", 3)
+    assert not degraded_limiter.degraded
+    # Two requests counted locally plus the one that just went through Redis
+    assert redis_client.zcard(make_key("u1", "upload")) == 3
+    assert not check(redis_client, "upload", 3)
+
+
+def test_recovery_writes_one_pipeline_per_node(monkeypatch):
+    sharded = ShardedRedis([f"redis://node{i}:6379" for i in range(2)])
+    servers = {}
+    for url in sharded.clients:
+        servers[url] = fakeredis.FakeServer()
+        sharded.clients[url] = fakeredis.FakeRedis(server=servers[url])
+    degraded = DegradedModeLimiter()
+    keys = [make_key(f"u{i}", "upload") for i in range(50)]
+    for key in keys:
+        degraded.memory.check(key, limit=10, window=60)
+
+    executed = []
+    execute = Pipeline.execute
+    monkeypatch.setattr(
+        Pipeline, "execute", lambda pipe: executed.append(pipe) or execute(pipe)
+    )
+    degraded.reconcile(sharded, degraded.recover())
+    assert len(executed) == 2
+    assert all(sharded.get_client(key).zcard(key) == 1 for key in keys)
@@ -0,0 +1,66 @@
+import random
+from collections import Counter
+
+from app.heavy_hitters import HeavyHitters, SpaceSaving
+
+
+def test_space_saving_finds_heavy_keys_in_bounded_memory():
+    sketch = SpaceSaving(capacity=10)
+    for i in range(1000):
+        sketch.add(f"cold-{i}")
+        if i % 4 == 0:
+            sketch.add("hot")
+    assert len(sketch) == 10
+    top = sketch.top(1)[0]
+    assert top.key == "hot"
+    # Overestimated by at most the inherited error
+    assert top.count - top.error <= 250 <= top.count
+
+
+def test_space_saving_bounds_hold_through_evictions_and_decay():
+    rng = random.Random(7)
+    sketch = SpaceSaving(capacity=20)
+    true_counts = Counter()
+    for step in range(5000):
+        key = f"k{min(int(rng.paretovariate(1.2)), 500)}"
+        sketch.add(key)
+        true_counts[key] += 1
+        if step == 2500:
+            sketch.decay(0.5)
+            true_counts = Counter({k: c * 0.5 for k, c in true_counts.items()})
+    assert len(sketch) == 20
+    for hitter in sketch.top(20):
+        assert hitter.count - hitter.error <= true_counts[hitter.key] <= hitter.count
+    # The evicted counter was always the smallest one
+    assert min(h.count for h in sketch.top(20)) <= sum(true_counts.values()) / 20
+
+
+def test_rejections_tracked_separately():
+    hitters = HeavyHitters(capacity=5, decay_interval=0)
+    for _ in range(3):
+        hitters.record("a", allowed=True)
+    hitters.record("b", allowed=False)
+    snapshot = hitters.snapshot()
+    assert snapshot["checks"][0].key == "a"
+    assert [h.key for h in snapshot["rejections"]] == ["b"]
+
+
+def test_counts_decay_over_time():
+    hitters = HeavyHitters(capacity=5, decay_interval=60)
+    for _ in range(4):
+        hitters.record("a", allowed=True, now=0)
+    hitters.record("a", allowed=True, now=61)
+    assert hitters.checks.top(1)[0].count == 3
+
+
+def test_metrics_exposition():
+    hitters = HeavyHitters(capacity=5, decay_interval=0)
+    hitters.record('rate_limit:{u"1}:upload', allowed=False)
+    metrics = hitters.metrics()
+    assert (
+        'rate_limit_heavy_hitter_rejections{key="rate_limit:{u\\"1}:upload"} 1'
+        in metrics
+    )
+
+    hitters.record("rate_limit:{u\n1}:upload", allowed=True)
+    assert 'key="rate_limit:{u\\n1}:upload"} 1' in hitters.metrics()
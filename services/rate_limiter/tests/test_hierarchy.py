@@ -0,0 +1,109 @@
+import asyncio
+
+import fakeredis
+from app.fallback import DegradedModeLimiter
+from app.hierarchy import (HierarchicalRateLimiter, LimitLevel, build_levels,
+                           tenant_key, user_key)
+from app.rate_limiter import ACTION_WINDOW, check_limit
+from app.sharding import ShardedRedis, hash_tag, make_key
+
+
+def _levels(tenant_limit=3, user_limit=2, action_limit=10, tenant="acme"):
+    return [
+        LimitLevel("tenant", tenant_key(tenant), tenant_limit, 60),
+        LimitLevel("user", user_key("u1"), user_limit, 60),
+        LimitLevel("action", make_key("u1", "upload"), action_limit, 60),
+    ]
+
+
+def test_build_levels_skips_disabled_levels(monkeypatch):
+    monkeypatch.setenv("TENANT_RATE_LIMIT", "10000")
+    monkeypatch.setenv("USER_RATE_LIMIT", "100")
+    monkeypatch.delenv("GLOBAL_RATE_LIMIT", raising=False)
+    levels = build_levels("u1", "upload", 60, tenant_id="acme")
+    assert [level.name for level in levels] == ["tenant", "user", "action"]
+    assert [level.limit for level in levels] == [10000, 100, 60]
+
+
+def test_user_keys_do_not_depend_on_the_tenant(monkeypatch):
+    monkeypatch.setenv("TENANT_RATE_LIMIT", "100")
+    monkeypatch.setenv("USER_RATE_LIMIT", "100")
+    with_tenant = build_levels("u1", "upload", 60, tenant_id="acme")
+    without_tenant = build_levels("u1", "upload", 60)
+    assert [level.key for level in with_tenant[1:]] == [
+        level.key for level in without_tenant
+    ]
+    # The action level counts against the same key as /check
+    assert without_tenant[-1].key == make_key("u1", "upload")
+    assert {hash_tag(level.key) for level in without_tenant} == {"u1"}
+
+
+def test_action_level_shares_check_window(redis_client, monkeypatch):
+    monkeypatch.setenv("USER_RATE_LIMIT", "100")
+    monkeypatch.setenv("RATE_LIMIT_WINDOW", "10")
+    user, action = build_levels("u1", "upload", 2)
+    assert user.window == 10
+    assert action.window == ACTION_WINDOW
+
+    # Requests counted by /check count against the action level too
+    key = make_key("u1", "upload")
+    for _ in range(2):
+        asyncio.run(check_limit(redis_client, key, "upload", 10, ACTION_WINDOW))
+    limiter = HierarchicalRateLimiter(redis_client, DegradedModeLimiter())
+    result = asyncio.run(limiter.check([user, action], "upload"))
+    assert not result.allowed and result.level == "action"
+
+
+def test_user_cap_holds_with_and_without_tenant(redis_client, monkeypatch):
+    monkeypatch.setenv("TENANT_RATE_LIMIT", "100")
+    monkeypatch.setenv("USER_RATE_LIMIT", "3")
+    limiter = HierarchicalRateLimiter(redis_client, DegradedModeLimiter())
+
+    def check(tenant_id):
+        levels = build_levels("u1", "upload", 100, tenant_id=tenant_id)
+        return asyncio.run(limiter.check(levels, "upload"))
+
+    assert all(check(t).allowed for t in ("acme", None, "other"))
+    for tenant_id in ("acme", None, "another"):
+        result = check(tenant_id)
+        assert not result.allowed and result.level == "user"
+
+
+def test_rejecting_level_is_reported(redis_client):
+    limiter = HierarchicalRateLimiter(redis_client, DegradedModeLimiter())
+    levels = _levels()
+    assert asyncio.run(limiter.check(levels, "upload")).allowed
+    assert asyncio.run(limiter.check(levels, "upload")).allowed
+
+    result = asyncio.run(limiter.check(levels, "upload"))
+    assert not result.allowed
+    assert result.level == "user"
+    assert result.reset is not None
+
+
+def test_rejection_consumes_no_quota(redis_client):
+    limiter = HierarchicalRateLimiter(redis_client, DegradedModeLimiter())
+    levels = _levels(tenant_limit=1, user_limit=5)
+    assert asyncio.run(limiter.check(levels, "upload")).allowed
+    assert asyncio.run(limiter.check(levels, "upload")).level == "tenant"
+
+    # The rejected request was not counted against the inner levels
+    assert redis_client.zcard(levels[1].key) == 1
+    assert redis_client.zcard(levels[2].key) == 1
+
+
+def test_levels_on_other_nodes_are_taken_back_on_rejection():
+    sharded = ShardedRedis([f"redis://node{i}:6379" for i in range(2)])
+    for url in sharded.clients:
+        sharded.clients[url] = fakeredis.FakeRedis()
+    user_node = sharded.ring.get_node("u1")
+    tenant = next(
+        f"t{i}" for i in range(100) if sharded.ring.get_node(f"t{i}") != user_node
+    )
+    limiter = HierarchicalRateLimiter(sharded, DegradedModeLimiter())
+    levels = _levels(tenant_limit=10, user_limit=1, tenant=tenant)
+    assert asyncio.run(limiter.check(levels, "upload")).allowed
+    assert asyncio.run(limiter.check(levels, "upload")).level == "user"
+
+    tenant_level = levels[0]
+    assert sharded.get_client(tenant_level.key).zcard(tenant_level.key) == 1
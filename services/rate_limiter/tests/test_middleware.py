@@ -0,0 +1,79 @@
+import pytest
+from app.middleware import RateLimit, RateLimitMiddleware
+from app.sharding import make_key
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+from starlette.authentication import (AuthCredentials, AuthenticationBackend,
+                                      SimpleUser)
+from starlette.middleware.authentication import AuthenticationMiddleware
+
+
+class HeaderAuth(AuthenticationBackend):
+    """Stands in for a backend that verifies the caller's token."""
+
+    async def authenticate(self, conn):
+        if "x-user" in conn.headers:
+            return AuthCredentials(["authenticated"]), SimpleUser(
+                conn.headers["x-user"]
+            )
+
+
+@pytest.fixture
+def client(redis_client, monkeypatch):
+    monkeypatch.setattr("app.middleware.get_redis", lambda: iter([redis_client]))
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, action="api", limit=3)
+    # Added last so it runs first and the limiter sees the verified user
+    app.add_middleware(AuthenticationMiddleware, backend=HeaderAuth())
+
+    @app.get("/items")
+    async def items():
+        return {"ok": True}
+
+    @app.get("/login", dependencies=[Depends(RateLimit("login", limit=1))])
+    async def login():
+        return {"ok": True}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    return TestClient(app)
+
+
+def test_middleware_sets_headers_and_rejects(client):
+    responses = [client.get("/items") for _ in range(4)]
+    assert [r.status_code for r in responses] == [200, 200, 200, 429]
+    assert responses[0].headers["RateLimit-Limit"] == "3"
+    assert responses[0].headers["RateLimit-Remaining"] == "2"
+    assert responses[2].headers["RateLimit-Remaining"] == "0"
+    assert "Retry-After" in responses[3].headers
+
+
+def test_exempt_paths_are_not_limited(client):
+    assert all(client.get("/health").status_code == 200 for _ in range(5))
+
+
+def test_dependency_limits_route(client):
+    assert client.get("/login").status_code == 200
+    response = client.get("/login")
+    assert response.status_code == 429
+    assert response.json() == {"detail": "Too many requests"}
+    assert response.headers["RateLimit-Remaining"] == "0"
+
+
+def test_unverified_tokens_do_not_get_fresh_quotas(client):
+    responses = [
+        client.get("/items", headers={"Authorization": f"Bearer random-{i}"})
+        for i in range(4)
+    ]
+    assert [r.status_code for r in responses] == [200, 200, 200, 429]
+
+
+def test_authenticated_users_share_check_keys(client, redis_client):
+    for _ in range(3):
+        assert client.get("/items", headers={"X-User": "u1"}).status_code == 200
+    assert client.get("/items", headers={"X-User": "u1"}).status_code == 429
+    assert client.get("/items", headers={"X-User": "u2"}).status_code == 200
+    # The same key /check?userId=u1&action=api counts against
+    assert redis_client.zcard(make_key("u1", "api")) == 3
@@ -0,0 +1,63 @@
+from collections import Counter
+
+import pytest
+from app.sharding import HashRing, ShardedRedis, hash_tag, make_key
+from redis.crc import key_slot
+
+NODES = [f"redis://node{i}:6379" for i in range(4)]
+KEYS = [f"user-{i}" for i in range(20000)]
+
+
+def test_hash_tag():
+    assert hash_tag("rate_limit:{u1}:upload") == "u1"
+    assert hash_tag("{a}{b}") == "a"
+    assert hash_tag("rate_limit:{}:upload") == "rate_limit:{}:upload"
+    assert hash_tag("rate_limit:{u1:upload") == "rate_limit:{u1:upload"
+    assert hash_tag("rate_limit:u1:upload") == "rate_limit:u1:upload"
+
+
+def test_user_keys_share_a_cluster_slot():
+    slots = {key_slot(make_key("u1", action).encode()) for action in ("a", "b", "c")}
+    assert len(slots) == 1
+    assert key_slot(make_key("u1", "a").encode()) == key_slot(b"u1")
+
+
+def test_ring_spreads_keys_evenly():
+    ring = HashRing(NODES)
+    counts = Counter(ring.get_node(key) for key in KEYS)
+    assert set(counts) == set(NODES)
+    mean = len(KEYS) / len(NODES)
+    assert all(abs(count - mean) < mean * 0.2 for count in counts.values())
+
+
+def test_adding_a_node_only_moves_keys_onto_it():
+    before = HashRing(NODES)
+    after = HashRing(NODES + ["redis://node4:6379"])
+    moved = [key for key in KEYS if before.get_node(key) != after.get_node(key)]
+    assert {after.get_node(key) for key in moved} == {"redis://node4:6379"}
+    # About 1/5 of the keys, not a reshuffle
+    assert 0.1 < len(moved) / len(KEYS) < 0.3
+
+
+def test_removing_a_node_only_moves_its_keys():
+    before = HashRing(NODES)
+    after = HashRing(NODES[1:])
+    for key in KEYS:
+        if before.get_node(key) != NODES[0]:
+            assert after.get_node(key) == before.get_node(key)
+
+
+def test_ring_requires_nodes():
+    with pytest.raises(ValueError):
+        HashRing([])
+
+
+def test_sharded_client_routes_by_hash_tag():
+    sharded = ShardedRedis(NODES)
+    clients = {id(sharded.get_client(make_key("u1", a))) for a in ("a", "b", "c")}
+    assert len(clients) == 1
+    assert (
+        sharded.get_client(make_key("u1", "a"))
+        is sharded.clients[sharded.ring.get_node("u1")]
+    )
+    assert len({id(sharded.get_client(make_key(u, "a"))) for u in KEYS[:200]}) == 4
@@ -9,6 +9,11 @@ class Settings(BaseSettings):
     REDIS_URL: str = "redis://redis:6379"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     EVENT_CHANNEL: str = "subscription.events"
+    # Snapshots are rebuilt on every change; the TTL bounds how long one can
+    # outlive a change made outside the service, or one whose rebuild and
+    # invalidation both failed because Redis was unreachable
+    ENTITLEMENT_SNAPSHOT_TTL: int = 300
+    ENTITLEMENT_REBUILD_BATCH_SIZE: int = 1000
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,129 @@
+"""Per-user entitlement snapshots, materialized in Redis.
+
+A snapshot holds everything ``/entitlements`` returns for a user: the plan,
+the subscription status, ``valid_until`` and the features in effect (all off
+unless the subscription is active). It is rebuilt whenever a subscription is
+created or canceled, read through from the database on a miss, and can be
+rebuilt for every user with:
+
+    python -m app.core.entitlements rebuild
+"""
+
+import argparse
+import asyncio
+import logging
+from itertools import islice
+from typing import Optional
+
+from app import crud, models
+from app.core.config import settings
+from app.core.redis import redis_client
+from redis.exceptions import RedisError
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+
+def build_snapshot(subscription: models.Subscription, plan: models.Plan) -> dict:
+    has_active_access = subscription.status == "active"
+    return {
+        "features": {
+            k: (v and has_active_access)
+            for k, v in crud.get_plan_features(plan).items()
+        },
+        "plan_id": plan.id,
+        "plan_name": plan.name,
+        "subscription_status": subscription.status,
+        "valid_until": (
+            subscription.end_date.isoformat() if subscription.end_date else None
+        ),
+    }
+
+
+def load_snapshot(db: Session, user_id: int) -> Optional[dict]:
+    """User's snapshot from the database, None without any subscription."""
+    row = crud.get_entitlement_subscription(db, user_id=user_id)
+    return build_snapshot(*row) if row else None
+
+
+async def refresh_snapshot(db: Session, user_id: int) -> Optional[dict]:
+    """Rebuild a user's snapshot after their subscriptions changed.
+
+    The change is already committed, so a Redis failure doesn't fail the
+    caller: the old snapshot is deleted instead, and the next read goes
+    through to the database. If Redis can't be reached at all, the old
+    snapshot lives until ``ENTITLEMENT_SNAPSHOT_TTL`` runs out.
+    """
+    snapshot = load_snapshot(db, user_id)
+    if snapshot:
+        try:
+            await redis_client.set_entitlements({user_id: snapshot})
+        except RedisError as e:
+            logger.warning(f"Refreshing entitlements of user {user_id} failed: {e}")
+            try:
+                await redis_client.delete_entitlements(user_id)
+            except RedisError as e:
+                logger.error(
+                    f"Entitlements of user {user_id} are stale for up to "
+                    f"{settings.ENTITLEMENT_SNAPSHOT_TTL}s: {e}"
+                )
+    return snapshot
+
+
+async def get_snapshot(db: Session, user_id: int) -> Optional[dict]:
+    """User's snapshot from Redis, falling back to the database on a miss."""
+    snapshot = await redis_client.get_entitlements(user_id)
+    if snapshot:
+        return snapshot
+
+    snapshot = load_snapshot(db, user_id)
+    if snapshot:
+        # Only if missing, so a snapshot rebuilt since we read the database wins
+        await redis_client.add_entitlements(user_id, snapshot)
+    return snapshot
+
+
+async def rebuild_all(db: Session, batch_size: int) -> int:
+    """Rebuild the snapshot of every user with a subscription."""
+    rows = crud.iter_entitlement_subscriptions(db, batch_size=batch_size)
+    rebuilt = 0
+    while batch := list(islice(rows, batch_size)):
+        await redis_client.set_entitlements(
+            {
+                subscription.user_id: build_snapshot(subscription, plan)
+                for subscription, plan in batch
+            }
+        )
+        rebuilt += len(batch)
+    return rebuilt
+
+
+async def _rebuild(batch_size: int) -> int:
+    from app.database import SessionLocal
+
+    await redis_client.connect()
+    db = SessionLocal()
+    try:
+        return await rebuild_all(db, batch_size)
+    finally:
+        db.close()
+        await redis_client.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage entitlement snapshots")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser(
+        "rebuild", help="Rebuild the snapshot of every user from the database"
+    )
+    rebuild.add_argument(
+        "--batch-size", type=int, default=settings.ENTITLEMENT_REBUILD_BATCH_SIZE
+    )
+    args = parser.parse_args()
+
+    if args.command == "rebuild":
+        print(f"Rebuilt {asyncio.run(_rebuild(args.batch_size))} snapshots")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 import json
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 
 import redis.asyncio as redis
 from app.core.config import settings
@@ -28,5 +28,54 @@ class RedisClient:
         }
         await self.redis.publish(settings.EVENT_CHANNEL, json.dumps(event))
 
+    @staticmethod
+    def _entitlements_key(user_id: int) -> str:
+        return f"entitlements:{user_id}"
+
+    async def get_entitlements(self, user_id: int) -> Optional[dict]:
+        """User's entitlement snapshot, or None if there is none or Redis fails."""
+        if not self.redis:
+            return None
+        try:
+            snapshot = await self.redis.get(self._entitlements_key(user_id))
+        except redis.RedisError:
+            return None
+        return json.loads(snapshot) if snapshot else None
+
+    async def set_entitlements(self, snapshots: Dict[int, dict]):
+        """Store entitlement snapshots by user id in one round trip."""
+        if not self.redis:
+            raise RuntimeError("Redis client not connected")
+
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for user_id, snapshot in snapshots.items():
+                pipe.set(
+                    self._entitlements_key(user_id),
+                    json.dumps(snapshot),
+                    ex=settings.ENTITLEMENT_SNAPSHOT_TTL,
+                )
+            await pipe.execute()
+
+    async def add_entitlements(self, user_id: int, snapshot: dict):
+        """Store a snapshot unless the user has one, ignoring Redis failures."""
+        if not self.redis:
+            return
+        try:
+            await self.redis.set(
+                self._entitlements_key(user_id),
+                json.dumps(snapshot),
+                ex=settings.ENTITLEMENT_SNAPSHOT_TTL,
+                nx=True,
+            )
+        except redis.RedisError:
+            pass
+
+    async def delete_entitlements(self, user_id: int):
+        """Drop a user's snapshot, so the next read goes to the database."""
+        if not self.redis:
+            raise RuntimeError("Redis client not connected")
+
+        await self.redis.delete(self._entitlements_key(user_id))
+
 
 redis_client = RedisClient()
@@ -1,9 +1,15 @@
 import json
-from typing import List, Optional
+from datetime import datetime
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from app import models, schemas
+from sqlalchemy import case
 from sqlalchemy.orm import Session
 
+# Parsed plan features by plan id, with the plan's updated_at they were parsed at
+_plan_features: Dict[int, Tuple[datetime, Dict[str, Any]]] = {}
+
 
 def get_plan(db: Session, plan_id: int) -> Optional[models.Plan]:
     return db.query(models.Plan).filter(models.Plan.id == plan_id).first()
@@ -85,21 +91,67 @@ def update_subscription_status(
     return db_sub
 
 
-def get_user_entitlements(db: Session, user_id: int) -> dict:
-    """Get user's feature entitlements based on active subscription"""
-    active_sub = get_active_user_subscription(db, user_id)
-    if not active_sub or active_sub.status != "active":
-        return {}
+def _entitlement_subscriptions(db: Session):
+    # Per user, the subscription that decides entitlements comes first
+    return (
+        db.query(models.Subscription, models.Plan)
+        .join(models.Plan, models.Plan.id == models.Subscription.plan_id)
+        .order_by(
+            models.Subscription.user_id,
+            case((models.Subscription.status == "active", 0), else_=1),
+            models.Subscription.created_at.desc(),
+            models.Subscription.id.desc(),
+        )
+    )
 
-    plan = get_plan(db, active_sub.plan_id)
-    if not plan:
-        return {}
+
+def get_entitlement_subscription(
+    db: Session, user_id: int
+) -> Optional[Tuple[models.Subscription, models.Plan]]:
+    """User's subscription that decides entitlements, with its plan.
+
+    That is the active subscription if there is one, otherwise the most recent.
+    """
+    return (
+        _entitlement_subscriptions(db)
+        .filter(models.Subscription.user_id == user_id)
+        .first()
+    )
+
+
+def iter_entitlement_subscriptions(
+    db: Session, batch_size: int = 1000
+) -> Iterator[Tuple[models.Subscription, models.Plan]]:
+    """get_entitlement_subscription for every user, fetched in batches."""
+    rows = _entitlement_subscriptions(db).yield_per(batch_size)
+    for _, user_rows in groupby(rows, key=lambda row: row[0].user_id):
+        yield next(user_rows)
+
+
+def get_plan_features(plan: models.Plan) -> Dict[str, Any]:
+    """Plan's feature flags, parsed once per version of the plan.
+
+    The returned dict is shared between callers and must not be modified.
+    """
+    cached = _plan_features.get(plan.id)
+    if cached and cached[0] == plan.updated_at:
+        return cached[1]
 
     # Parse JSON features string
     try:
-        return json.loads(plan.features)
+        features = json.loads(plan.features) if plan.features else {}
     except (json.JSONDecodeError, TypeError):
+        features = {}
+    _plan_features[plan.id] = (plan.updated_at, features)
+    return features
+
+
+def get_user_entitlements(db: Session, user_id: int) -> dict:
+    """Get user's feature entitlements based on active subscription"""
+    row = get_entitlement_subscription(db, user_id)
+    if not row or row[0].status != "active":
         return {}
+    return dict(get_plan_features(row[1]))
 
 
 def check_user_feature_access(db: Session, user_id: int, feature: str) -> bool:
@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
 
 from app import crud, models, schemas
+from app.core.entitlements import refresh_snapshot
 from app.core.redis import redis_client
 from app.database import get_db
 from fastapi import APIRouter, Depends, HTTPException, status
@@ -41,6 +42,7 @@ async def create_subscription(
     # Calculate end date based on plan duration
     end_date = datetime.utcnow() + timedelta(days=db_plan.duration_days)
     new_sub = crud.create_subscription(db, subscription=subscription, end_date=end_date)
+    await refresh_snapshot(db, subscription.user_id)
 
     # Publish subscription created event
     await redis_client.publish_event(
@@ -92,6 +94,7 @@ async def cancel_subscription(subscription_id: int, db: Session = Depends(get_db
     updated_sub = crud.update_subscription_status(
         db, subscription_id=subscription_id, status="canceled"
     )
+    await refresh_snapshot(db, updated_sub.user_id)
 
     # Publish subscription canceled event
     await redis_client.publish_event(
@@ -44,17 +44,31 @@ def client(session):
         async def publish_event(self, event_type, data):
             pass
 
+        # No snapshots, so entitlements are always read from the database
+        async def get_entitlements(self, user_id):
+            return None
+
+        async def set_entitlements(self, snapshots):
+            pass
+
+        async def add_entitlements(self, user_id, snapshot):
+            pass
+
+        async def delete_entitlements(self, user_id):
+            pass
+
     # Override dependencies
     app.dependency_overrides[get_db] = override_get_db
 
     # Mock Redis for subscription events
-    from app.core import redis
+    from app.core import entitlements, redis
     from app.routers import subscriptions
 
     original_redis_client = getattr(redis, "redis_client", None)
     mock_redis = MockRedisClient()
     redis.redis_client = mock_redis
     subscriptions.redis_client = mock_redis  # Also override in subscriptions module
+    entitlements.redis_client = mock_redis
 
     def create_test_client():
         import asyncio
@@ -122,3 +136,4 @@ def client(session):
     app.dependency_overrides.clear()
     if original_redis_client:
         redis.redis_client = original_redis_client
+        entitlements.redis_client = original_redis_client
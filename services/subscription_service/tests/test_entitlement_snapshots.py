@@ -0,0 +1,159 @@
+import asyncio
+
+import pytest
+from app import crud, schemas
+from app.core import entitlements
+from app.models import Plan
+from app.routers import subscriptions
+from fastapi import status
+from redis.exceptions import ConnectionError as RedisConnectionError
+from sqlalchemy.orm import Session
+
+
+class SnapshotStore:
+    def __init__(self):
+        self.snapshots = {}
+        self.events = []
+
+    async def publish_event(self, event_type, data):
+        self.events.append((event_type, data))
+
+    async def get_entitlements(self, user_id):
+        return self.snapshots.get(user_id)
+
+    async def set_entitlements(self, snapshots):
+        self.snapshots.update(snapshots)
+
+    async def add_entitlements(self, user_id, snapshot):
+        self.snapshots.setdefault(user_id, snapshot)
+
+    async def delete_entitlements(self, user_id):
+        self.snapshots.pop(user_id, None)
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = SnapshotStore()
+    monkeypatch.setattr(entitlements, "redis_client", store)
+    monkeypatch.setattr(subscriptions, "redis_client", store)
+    return store
+
+
+@pytest.fixture
+def feature_plan(session: Session):
+    plan = schemas.PlanCreate(
+        name="Feature Plan",
+        price=9.99,
+        duration_days=30,
+        features='{"premium_feature": true}',
+    )
+    return crud.create_plan(session, plan=plan)
+
+
+def test_snapshot_is_rebuilt_on_create_and_cancel(
+    client, store, session, feature_plan: Plan
+):
+    plan_id = feature_plan.id
+    response = client.post("/subscriptions/", json={"user_id": 1, "plan_id": plan_id})
+    assert response.status_code == status.HTTP_201_CREATED
+    sub = response.json()
+    assert store.snapshots[1] == {
+        "features": {"premium_feature": True},
+        "plan_id": plan_id,
+        "plan_name": "Feature Plan",
+        "subscription_status": "active",
+        "valid_until": sub["end_date"],
+    }
+
+    # Served from the snapshot, not the database
+    store.snapshots[1]["plan_name"] = "From Redis"
+    response = client.get("/entitlements/1?feature=premium_feature")
+    assert response.json()["has_access"] is True
+    assert response.json()["plan_name"] == "From Redis"
+
+    client.patch(f"/subscriptions/{sub['id']}/cancel")
+    assert store.snapshots[1]["subscription_status"] == "canceled"
+    response = client.get("/entitlements/1")
+    assert response.json()["features"] == {"premium_feature": False}
+
+
+def test_failed_refresh_drops_the_snapshot_and_still_publishes(
+    client, store, monkeypatch, feature_plan: Plan
+):
+    response = client.post(
+        "/subscriptions/", json={"user_id": 1, "plan_id": feature_plan.id}
+    )
+    sub = response.json()
+    assert store.snapshots[1]["subscription_status"] == "active"
+
+    async def unavailable(snapshots):
+        raise RedisConnectionError("Redis is down")
+
+    monkeypatch.setattr(store, "set_entitlements", unavailable)
+    response = client.patch(f"/subscriptions/{sub['id']}/cancel")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["status"] == "canceled"
+    # No stale "active" snapshot left behind; reads go to the database
+    assert 1 not in store.snapshots
+    response = client.get("/entitlements/1")
+    assert response.json()["features"] == {"premium_feature": False}
+    assert [data["action"] for _, data in store.events] == ["created", "updated"]
+
+
+def test_unreachable_redis_does_not_fail_a_committed_cancel(
+    client, store, monkeypatch, feature_plan: Plan
+):
+    response = client.post(
+        "/subscriptions/", json={"user_id": 1, "plan_id": feature_plan.id}
+    )
+    sub = response.json()
+
+    async def unavailable(*args):
+        raise RedisConnectionError("Redis is down")
+
+    monkeypatch.setattr(store, "set_entitlements", unavailable)
+    monkeypatch.setattr(store, "delete_entitlements", unavailable)
+    response = client.patch(f"/subscriptions/{sub['id']}/cancel")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert [data["action"] for _, data in store.events] == ["created", "updated"]
+
+
+def test_programming_errors_are_not_swallowed(store, session, feature_plan: Plan):
+    crud.create_subscription(
+        session,
+        subscription=schemas.SubscriptionCreate(user_id=1, plan_id=feature_plan.id),
+        end_date=None,
+    )
+
+    async def broken(snapshots):
+        raise TypeError("not serializable")
+
+    store.set_entitlements = broken
+    with pytest.raises(TypeError):
+        asyncio.run(entitlements.refresh_snapshot(session, user_id=1))
+
+
+def test_missing_snapshots_are_read_through_and_rebuilt(
+    store, session, feature_plan: Plan
+):
+    for user_id in (1, 2, 3):
+        crud.create_subscription(
+            session,
+            subscription=schemas.SubscriptionCreate(
+                user_id=user_id, plan_id=feature_plan.id
+            ),
+            end_date=None,
+        )
+    crud.update_subscription_status(session, subscription_id=3, status="canceled")
+
+    snapshot = asyncio.run(entitlements.get_snapshot(session, user_id=1))
+    assert snapshot["features"] == {"premium_feature": True}
+    assert store.snapshots == {1: snapshot}
+    assert asyncio.run(entitlements.get_snapshot(session, user_id=4)) is None
+
+    assert asyncio.run(entitlements.rebuild_all(session, batch_size=2)) == 3
+    assert sorted(store.snapshots) == [1, 2, 3]
+    assert store.snapshots[3]["features"] == {"premium_feature": False}
+    assert store.snapshots[3]["valid_until"] is None
@@ -1,7 +1,10 @@
+import json
+
 import pytest
 from app import crud, schemas
 from app.models import Plan, Subscription
 from fastapi import status
+from sqlalchemy import event
 from sqlalchemy.orm import Session
 
 
@@ -65,3 +68,71 @@ def test_entitlements_api(client, session, feature_plan: Plan, no_feature_plan:
     crud.update_subscription_status(session, subscription_id=sub.id, status="canceled")
     response = client.get("/entitlements/1?feature=premium_feature")
     assert response.json()["has_access"] is False
+
+
+def test_entitlements_prefer_active_then_latest_subscription(
+    client, session, feature_plan: Plan, no_feature_plan: Plan
+):
+    feature_plan_id, no_feature_plan_id = feature_plan.id, no_feature_plan.id
+    active = crud.create_subscription(
+        session,
+        subscription=schemas.SubscriptionCreate(user_id=1, plan_id=feature_plan_id),
+        end_date=None,
+    )
+    crud.create_subscription(
+        session,
+        subscription=schemas.SubscriptionCreate(
+            user_id=1, plan_id=no_feature_plan_id, status="canceled"
+        ),
+        end_date=None,
+    )
+
+    response = client.get("/entitlements/1")
+    assert response.json()["plan_id"] == feature_plan_id
+    assert response.json()["subscription_status"] == "active"
+
+    # Without an active subscription the most recent one applies
+    crud.update_subscription_status(
+        session, subscription_id=active.id, status="canceled"
+    )
+    response = client.get("/entitlements/1")
+    assert response.json()["plan_id"] == no_feature_plan_id
+    assert response.json()["features"] == {
+        "premium_feature": False,
+        "basic_feature": False,
+    }
+
+    assert client.get("/entitlements/2").status_code == status.HTTP_404_NOT_FOUND
+
+
+def test_plan_features_are_parsed_once_per_plan_version(
+    session: Session, feature_plan: Plan, monkeypatch
+):
+    parsed = []
+    loads = json.loads
+    monkeypatch.setattr(crud, "_plan_features", {})
+    monkeypatch.setattr(json, "loads", lambda s: parsed.append(s) or loads(s))
+    statements = []
+
+    def count_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    crud.create_subscription(
+        session,
+        subscription=schemas.SubscriptionCreate(user_id=1, plan_id=feature_plan.id),
+        end_date=None,
+    )
+
+    event.listen(session.bind, "before_cursor_execute", count_statement)
+    try:
+        for _ in range(3):
+            assert crud.get_user_entitlements(session, user_id=1)["premium_feature"]
+    finally:
+        event.remove(session.bind, "before_cursor_execute", count_statement)
+    assert len(statements) == 3
+    assert len(parsed) == 1
+
+    feature_plan.features = '{"premium_feature": false}'
+    session.commit()
+    assert crud.get_user_entitlements(session, user_id=1) == {"premium_feature": False}
+    assert len(parsed) == 2